@@ -0,0 +1,194 @@
+import numpy as np
+
+# Geometry columns, in YOLO order
+FIELDS = ('x_center', 'y_center', 'width', 'height')
+FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+class AnnotationRecord:
+    """
+    Dict-like view of one row of an AnnotationStore.
+
+    Reads and writes go straight to the store's arrays. The view refers to a
+    row number, so it should not be kept across deletions.
+    """
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == 'class_id':
+            return self.store.class_ids[self.store._codes[self.index]]
+        return float(self.store._boxes[self.index, FIELD_INDEX[key]])
+
+    def __setitem__(self, key, value):
+        if key == 'class_id':
+            self.store._codes[self.index] = self.store.class_code(value)
+        else:
+            self.store._boxes[self.index, FIELD_INDEX[key]] = value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class AnnotationStore:
+    """
+    Column-oriented annotations of one image.
+
+    Class ids are interned: every box stores an int32 code into class_ids and
+    its geometry lives in one float64 row (x_center, y_center, width, height,
+    normalized). Rows are appended with amortized growth, so a box costs 36
+    bytes instead of a dict per annotation, and projections, clamping and
+    class changes run as single NumPy operations.
+
+    Indexing returns an AnnotationRecord, so code that reads or edits one
+    annotation keeps using annotation['x_center'] etc.
+    """
+
+    def __init__(self, annotations=()):
+        self.class_ids = []  # code -> class id (str)
+        self._class_codes = {}
+        self._codes = np.empty(0, dtype=np.int32)
+        self._boxes = np.empty((0, 4), dtype=np.float64)
+        self._count = 0
+        self.extend(annotations)
+
+    # -- container protocol -------------------------------------------------
+
+    def __len__(self):
+        return self._count
+
+    def _check_index(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("annotation index out of range")
+        return index
+
+    def __getitem__(self, index):
+        return AnnotationRecord(self, self._check_index(index))
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield AnnotationRecord(self, i)
+
+    def __delitem__(self, index):
+        index = self._check_index(index)
+        n = self._count
+        self._codes[index:n - 1] = self._codes[index + 1:n]
+        self._boxes[index:n - 1] = self._boxes[index + 1:n]
+        self._count -= 1
+
+    def _reserve(self, capacity):
+        if capacity <= len(self._codes):
+            return
+        capacity = max(capacity, 2 * len(self._codes), 16)
+        codes = np.empty(capacity, dtype=np.int32)
+        boxes = np.empty((capacity, 4), dtype=np.float64)
+        codes[:self._count] = self.codes
+        boxes[:self._count] = self.boxes
+        self._codes, self._boxes = codes, boxes
+
+    def class_code(self, class_id):
+        """Interned code of a class id, added on first use."""
+        class_id = str(class_id)
+        code = self._class_codes.get(class_id)
+        if code is None:
+            code = self._class_codes[class_id] = len(self.class_ids)
+            self.class_ids.append(class_id)
+        return code
+
+    def append(self, annotation):
+        """Add one annotation given as a dict (class_id, x_center, y_center, width, height)."""
+        self._reserve(self._count + 1)
+        self._codes[self._count] = self.class_code(annotation['class_id'])
+        self._boxes[self._count] = [annotation[name] for name in FIELDS]
+        self._count += 1
+
+    def extend(self, annotations):
+        annotations = list(annotations)
+        if not annotations:
+            return
+        n = len(annotations)
+        self._reserve(self._count + n)
+        self._codes[self._count:self._count + n] = [self.class_code(a['class_id']) for a in annotations]
+        self._boxes[self._count:self._count + n] = [[a[name] for name in FIELDS] for a in annotations]
+        self._count += n
+
+    @classmethod
+    def from_labels(cls, labels):
+        """Build a store from yolo_labels arrays (LabelArrays or (class_ids, boxes))."""
+        store = cls()
+        class_ids, boxes = labels[0], labels[1]
+        unique, codes = np.unique(np.asarray(class_ids, dtype=str), return_inverse=True)
+        store.class_ids = unique.tolist()
+        store._class_codes = {cid: i for i, cid in enumerate(store.class_ids)}
+        store._codes = codes.astype(np.int32).reshape(-1)
+        store._boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        store._count = len(store._codes)
+        return store
+
+    def clear(self):
+        self._count = 0
+
+    def copy(self):
+        other = AnnotationStore()
+        other.class_ids = list(self.class_ids)
+        other._class_codes = dict(self._class_codes)
+        other._codes = self.codes.copy()
+        other._boxes = self.boxes.copy()
+        other._count = self._count
+        return other
+
+    @property
+    def codes(self):
+        """Class code per box (view)."""
+        return self._codes[:self._count]
+
+    @property
+    def boxes(self):
+        """(n, 4) normalized x_center, y_center, width, height (view)."""
+        return self._boxes[:self._count]
+
+    @property
+    def nbytes(self):
+        return self._codes.nbytes + self._boxes.nbytes
+
+    # -- vectorized transforms ----------------------------------------------
+
+    def pixel_boxes(self, image_width, image_height):
+        """(n, 4) x1, y1, x2, y2 in image pixels."""
+        boxes = self.boxes
+        centers = boxes[:, :2] * (image_width, image_height)
+        half = boxes[:, 2:] * (image_width / 2.0, image_height / 2.0)
+        return np.hstack([centers - half, centers + half])
+
+    def pixel_box(self, index, image_width, image_height):
+        """x1, y1, x2, y2 of one box in image pixels (same arithmetic as pixel_boxes)."""
+        xc, yc, w, h = self._boxes[self._check_index(index)].tolist()
+        cx, cy = xc * image_width, yc * image_height
+        hw, hh = w * (image_width / 2.0), h * (image_height / 2.0)
+        return cx - hw, cy - hh, cx + hw, cy + hh
+
+    def clamp(self):
+        """Clip every field to [0, 1] in place."""
+        np.clip(self.boxes, 0.0, 1.0, out=self.boxes)
+
+    def reassign_class(self, old_class_id, new_class_id):
+        """Give every box of old_class_id the class new_class_id; returns how many changed."""
+        old_code = self._class_codes.get(str(old_class_id))
+        if old_code is None:
+            return 0
+        mask = self.codes == old_code
+        self.codes[mask] = self.class_code(new_class_id)
+        return int(mask.sum())
+
+    def label_arrays(self):
+        """(class_ids, boxes) in the form yolo_labels.write_labels takes."""
+        return np.asarray(self.class_ids, dtype=str)[self.codes], self.boxes
@@ -0,0 +1,101 @@
+import queue
+import threading
+
+
+class WriteJob:
+    """A unit of work queued on a BackgroundWriter."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, fn, args, description=""):
+        self.fn = fn
+        self.args = args
+        self.description = description
+        self.state = WriteJob.PENDING
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+
+class BackgroundWriter:
+    """
+    Runs encoding and disk I/O jobs on worker threads, in submission order.
+
+    With the default single worker, jobs run strictly FIFO, so a later job can
+    rely on an earlier one (e.g. label lines are appended in order). Jobs
+    that have not started yet can be cancelled. Failed jobs are collected in
+    the errors queue so the GUI thread can report them; worker threads never
+    touch Tk.
+    """
+
+    def __init__(self, workers=1, name="writer"):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.errors = queue.Queue()
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, description=""):
+        job = WriteJob(fn, args, description)
+        self._queue.put(job)
+        return job
+
+    def cancel(self, job):
+        """Cancel a job that has not started yet. Returns True if it will never run."""
+        with self._lock:
+            if job.state == WriteJob.PENDING:
+                job.state = WriteJob.CANCELLED
+                job._done.set()
+                return True
+            return job.state == WriteJob.CANCELLED
+
+    def pending_count(self):
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        """Block until every submitted job has finished (or was cancelled)."""
+        self._queue.join()
+
+    def close(self):
+        """Flush all pending jobs and stop the worker threads."""
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                with self._lock:
+                    if job.state != WriteJob.PENDING:
+                        continue
+                    job.state = WriteJob.RUNNING
+                try:
+                    job.fn(*job.args)
+                    job.state = WriteJob.DONE
+                except Exception as e:
+                    job.error = e
+                    job.state = WriteJob.FAILED
+                    self.errors.put(job)
+                finally:
+                    job._done.set()
+            finally:
+                self._queue.task_done()
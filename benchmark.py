@@ -0,0 +1,385 @@
+"""
+Benchmarks for the hot paths of the toolkit on synthetic datasets.
+
+    python benchmark.py --files 1000 100000 --boxes 10 --editor-boxes 1 100 5000 -o bench.json
+
+For every --files/--boxes combination a dataset of small PNG images and
+YOLO labels is generated in a temporary folder (or --workdir), then these
+are timed:
+
+    get_files_info      merge.py's listing, by directory scan and through a cold/warm DatasetIndex
+    copy_files          split.py's parallel transfer of images and labels (per --modes)
+    remap_directory     convert-labels' rewrite of text labels, first run and re-run
+                        (the old convert_labels no longer exists; remap_directory
+                        is what the command runs now, so it is timed in its place)
+    build_yolo_folder   the editor's "Create YOLO folder", cold and warm caches
+
+For every --editor-boxes count the editor is opened on a hidden Tk root with
+one large image holding that many boxes, and load_annotations, update_canvas
+(zoom and pan) and find_annotation_at_point are timed. Without a display the
+editor group is reported as skipped.
+
+The results are written as JSON (stdout or -o) so runs of different versions
+can be compared.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import contextlib
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from yolo_labels import format_labels
+from dataset_index import DatasetIndex, INDEX_FILENAME
+from label_cache import CACHE_DIRNAME
+from label_remap import remap_directory
+import dataset_ops
+import merge
+import split
+
+NUM_CLASSES = 10
+IMAGE_SIZE = (64, 48)
+EDITOR_IMAGE_SIZE = (1920, 1080)
+
+
+# -- synthetic data -------------------------------------------------------------
+
+def random_boxes(rng, count):
+    """(count, 4) normalized YOLO boxes of assorted sizes, fully inside the image."""
+    wh = rng.uniform(0.005, 0.1, size=(count, 2))
+    centers = rng.uniform(wh / 2, 1 - wh / 2)
+    return np.hstack([centers, wh])
+
+
+def random_labels(rng, count):
+    class_ids = rng.integers(0, NUM_CLASSES, size=count).astype(str)
+    return format_labels(class_ids, random_boxes(rng, count))
+
+
+def encoded_images(size, variants=8, seed=0):
+    """PNG bytes of a few distinct noise images; files cycle through them."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(variants):
+        pixels = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def generate_dataset(root, n_files, boxes_per_image, jobs=8, seed=0):
+    """
+    Writes root/flat/NNNNNN.{png,txt} (images beside labels, as the editor
+    expects) and root/split/{images,labels} hardlinked to the same files.
+    boxes_per_image varies by +-50% around the given count (at least 1).
+    """
+    flat = os.path.join(root, 'flat')
+    images_dir = os.path.join(root, 'split', 'images')
+    labels_dir = os.path.join(root, 'split', 'labels')
+    for directory in (flat, images_dir, labels_dir):
+        os.makedirs(directory, exist_ok=True)
+    images = encoded_images(IMAGE_SIZE, seed=seed)
+    width = max(6, len(str(n_files)))
+
+    def write_chunk(start):
+        rng = np.random.default_rng((seed, start))
+        for i in range(start, min(start + 1000, n_files)):
+            name = f"{i:0{width}d}"
+            count = max(1, int(rng.integers(boxes_per_image // 2, boxes_per_image * 3 // 2 + 1)))
+            for data, ext, directory in ((images[i % len(images)], '.png', images_dir),
+                                         (random_labels(rng, count).encode('ascii'), '.txt', labels_dir)):
+                path = os.path.join(flat, name + ext)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                try:
+                    os.link(path, os.path.join(directory, name + ext))
+                except OSError:
+                    shutil.copy2(path, os.path.join(directory, name + ext))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(write_chunk, range(0, n_files, 1000)))
+
+    # Fresh directories count as "racy" for the DatasetIndex; age them so warm runs are warm
+    past = time.time() - 60
+    for directory in (flat, images_dir, labels_dir):
+        os.utime(directory, (past, past))
+    return flat, images_dir, labels_dir
+
+
+# -- timing -----------------------------------------------------------------------
+
+def timed(fn, repeat=1, setup=None):
+    """Runs fn repeat times (setup before each, untimed); returns the list of seconds."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def result(benchmark, times, items=None, **params):
+    entry = {'benchmark': benchmark, **params,
+             'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'runs': len(times)}
+    if items:
+        entry['items'] = items
+        entry['us_per_item'] = min(times) / items * 1e6
+    return entry
+
+
+def quiet():
+    """Keeps the modules' own progress prints out of the JSON on stdout."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+# -- dataset benchmarks -------------------------------------------------------------
+
+def bench_files_info(root, images_dir, n_files, params, repeat):
+    results = [result('get_files_info', timed(lambda: merge.get_files_info(images_dir), repeat),
+                      n_files, source='listdir', **params)]
+
+    def drop_index():
+        if os.path.exists(os.path.join(root, 'split', '.dataset_index.sqlite')):
+            os.remove(os.path.join(root, 'split', '.dataset_index.sqlite'))
+
+    def with_index():
+        index = DatasetIndex(os.path.join(root, 'split'))
+        merge.get_files_info(images_dir, index)
+        index.close()
+
+    results.append(result('get_files_info', timed(with_index, repeat, drop_index), n_files,
+                          source='index-cold', **params))
+    results.append(result('get_files_info', timed(with_index, repeat), n_files, source='index-warm', **params))
+    return results
+
+
+def bench_copy_files(root, images_dir, labels_dir, n_files, params, modes, jobs, repeat):
+    dest_dir = os.path.join(root, 'split_out')
+    folders = dict(images_dir=images_dir, labels_dir=labels_dir, dest_base_dir=dest_dir)
+    base_names = sorted(os.path.splitext(f)[0] for f in os.listdir(images_dir))
+    image_files = {name: name + '.png' for name in base_names}
+
+    def clean():
+        shutil.rmtree(dest_dir, ignore_errors=True)
+
+    results = []
+    for mode in modes:
+        def run():
+            split.copy_files(base_names, 'images', 'train', image_files, mode=mode, jobs=jobs, **folders)
+            split.copy_files(base_names, 'labels', 'train', mode=mode, jobs=jobs, **folders)
+        with quiet():
+            times = timed(run, repeat, clean)
+        results.append(result('copy_files', times, 2 * n_files, mode=mode, jobs=jobs, **params))
+    clean()
+    return results
+
+
+def bench_remap(root, labels_dir, n_files, params, jobs, repeat):
+    work = os.path.join(root, 'remap_labels')
+    to_names = {str(i): f"class{i}" for i in range(NUM_CLASSES)}
+
+    def fresh_copy():
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.copytree(labels_dir, work, copy_function=shutil.copyfile)
+
+    results = [result('remap_directory', timed(lambda: remap_directory(work, to_names, workers=jobs),
+                                               repeat, fresh_copy), n_files, run='first', jobs=jobs, **params),
+               result('remap_directory', timed(lambda: remap_directory(work, to_names, workers=jobs), repeat),
+                      n_files, run='rerun', jobs=jobs, **params)]
+    shutil.rmtree(work, ignore_errors=True)
+    return results
+
+
+def bench_yolo_folder(root, flat, n_files, params, jobs, repeat):
+    class_mapping = {str(i): f"class{i}" for i in range(NUM_CLASSES)}
+
+    def clean_output():
+        shutil.rmtree(os.path.join(flat, 'analiz'), ignore_errors=True)
+
+    def clean_all():
+        clean_output()
+        # build_yolo_folder keeps its label cache inside the source folder
+        shutil.rmtree(os.path.join(flat, CACHE_DIRNAME), ignore_errors=True)
+        for name in os.listdir(flat):
+            if name.startswith(INDEX_FILENAME):
+                os.remove(os.path.join(flat, name))
+
+    def run():
+        dataset_ops.build_yolo_folder(flat, 20, class_mapping, jobs=jobs, seed=0)
+
+    with quiet():
+        cold = timed(run, repeat, clean_all)
+        warm = timed(run, repeat, clean_output)
+    clean_output()
+    return [result('build_yolo_folder', cold, n_files, caches='cold', jobs=jobs, **params),
+            result('build_yolo_folder', warm, n_files, caches='warm', jobs=jobs, **params)]
+
+
+# -- editor benchmarks ----------------------------------------------------------------
+
+def bench_editor(root, box_counts, repeat, points=2000):
+    """Times the editor on a hidden Tk root; returns [] plus a skip entry if there is no display."""
+    import tkinter as tk
+    try:
+        tk_root = tk.Tk()
+    except tk.TclError as e:
+        return [{'benchmark': 'editor', 'skipped': str(e)}]
+    tk_root.withdraw()
+
+    from edit import YOLOAnnotationEditor
+
+    folder = os.path.join(root, 'editor')
+    os.makedirs(folder, exist_ok=True)
+    pixels = np.random.default_rng(0).integers(0, 256, size=(EDITOR_IMAGE_SIZE[1], EDITOR_IMAGE_SIZE[0], 3),
+                                               dtype=np.uint8)
+    Image.fromarray(pixels).save(os.path.join(folder, 'image.png'))
+
+    # The editor keeps its config files in the working directory
+    cwd = os.getcwd()
+    os.chdir(folder)
+    results = []
+    try:
+        app = YOLOAnnotationEditor(tk_root)
+        app.class_mapping = {str(i): f"class{i}" for i in range(NUM_CLASSES)}
+        image_path = os.path.join(folder, 'image.png')
+        app.images_list = [image_path]
+        app.current_image_index = 0
+        app.labels_folder = folder
+        for count in box_counts:
+            rng = np.random.default_rng(count)
+            with open(os.path.join(folder, 'image.txt'), 'w') as f:
+                f.write(random_labels(rng, count))
+            with quiet():
+                app.load_image(image_path)
+                tk_root.update_idletasks()
+                results.append(result('load_annotations', timed(app.load_annotations, repeat), count, boxes=count))
+
+            zooms = [0.5, 0.75, 1.0, 1.5, 2.0]
+
+            def zoom_cycle():
+                for zoom in zooms:
+                    app.zoom_level = zoom
+                    app.update_canvas()
+                tk_root.update_idletasks()
+
+            def pan_cycle():
+                for step in range(10):
+                    app.pan_offset_x = -step * 20
+                    app.update_canvas(interactive=True)
+                tk_root.update_idletasks()
+
+            results.append(result('update_canvas', timed(zoom_cycle, repeat), len(zooms), boxes=count, change='zoom'))
+            results.append(result('update_canvas', timed(pan_cycle, repeat), 10, boxes=count, change='pan'))
+            app.reset_view()
+
+            xs = rng.uniform(0, app.image_width, points)
+            ys = rng.uniform(0, app.image_height, points)
+
+            def hit_test():
+                for x, y in zip(xs, ys):
+                    app.find_annotation_at_point(x, y)
+
+            results.append(result('find_annotation_at_point', timed(hit_test, repeat), points, boxes=count))
+        app.prefetcher.shutdown()
+    finally:
+        os.chdir(cwd)
+        tk_root.destroy()
+    return results
+
+
+# -- driver ---------------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    root = args.workdir or tempfile.mkdtemp(prefix='collect_bench_')
+    results = []
+    try:
+        for n_files in args.files:
+            for boxes in args.boxes:
+                params = {'files': n_files, 'boxes_per_image': boxes}
+                data_root = os.path.join(root, f"data_{n_files}_{boxes}")
+                print(f"Generating {n_files} images with ~{boxes} boxes...", file=sys.stderr)
+                start = time.perf_counter()
+                flat, images_dir, labels_dir = generate_dataset(data_root, n_files, boxes, args.jobs)
+                results.append(result('generate', [time.perf_counter() - start], n_files, **params))
+
+                for name, run in (
+                        ('get_files_info', lambda: bench_files_info(data_root, images_dir, n_files, params, args.repeat)),
+                        ('copy_files', lambda: bench_copy_files(data_root, images_dir, labels_dir, n_files, params,
+                                                                args.modes, args.jobs, args.repeat)),
+                        ('remap_directory', lambda: bench_remap(data_root, labels_dir, n_files, params,
+                                                                args.jobs, args.repeat)),
+                        ('build_yolo_folder', lambda: bench_yolo_folder(data_root, flat, n_files, params,
+                                                                        args.jobs, args.repeat))):
+                    if args.only and name not in args.only:
+                        continue
+                    print(f"  {name}", file=sys.stderr)
+                    results.extend(run())
+                if not args.keep:
+                    shutil.rmtree(data_root, ignore_errors=True)
+
+        if args.editor_boxes and (not args.only or 'editor' in args.only):
+            print("Editor...", file=sys.stderr)
+            results.extend(bench_editor(root, args.editor_boxes, args.repeat))
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'revision': git_revision(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {'files': args.files, 'boxes': args.boxes, 'editor_boxes': args.editor_boxes,
+                     'modes': args.modes, 'jobs': args.jobs, 'repeat': args.repeat},
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the toolkit's hot paths on synthetic datasets.")
+    parser.add_argument('--files', type=int, nargs='+', default=[1000], help="dataset sizes (images)")
+    parser.add_argument('--boxes', type=int, nargs='+', default=[10], help="average boxes per image")
+    parser.add_argument('--editor-boxes', type=int, nargs='*', default=[1, 100, 5000],
+                        help="boxes on the editor's test image (none to skip the editor)")
+    parser.add_argument('--modes', nargs='+', default=['copy', 'hardlink'], help="transfer modes for copy_files")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 8)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark; the fastest is reported")
+    parser.add_argument('--only', nargs='+', choices=['get_files_info', 'copy_files', 'remap_directory',
+                                                      'build_yolo_folder', 'editor'])
+    parser.add_argument('--workdir', help="generate datasets here instead of a temporary folder")
+    parser.add_argument('--keep', action='store_true', help="keep the generated datasets")
+    parser.add_argument('--output', '-o', help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import io
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from file_ops import atomic_write
+from sequence_allocator import discard_placeholder
+
+try:
+    import mss
+except ImportError:  # Optional; pyautogui.screenshot is used instead
+    mss = None
+
+# JPEG quality of burst frames
+BURST_JPEG_QUALITY = 90
+
+# Frames that may wait for encoding before new ones are dropped
+MAX_PENDING_FRAMES = 64
+
+
+class ScreenGrabber:
+    """
+    Grabs one screen region as an RGB PIL image, with mss when it is
+    installed (several times faster) and pyautogui.screenshot otherwise.
+    mss handles are per thread, so use a grabber from one thread only.
+    """
+
+    def __init__(self, region, backend=None):
+        x1, y1, x2, y2 = region
+        self.region = (x1, y1, x2 - x1, y2 - y1)
+        self.backend = backend or ('mss' if mss is not None else 'pyautogui')
+        self._mss = None
+
+    def grab(self):
+        left, top, width, height = self.region
+        if self.backend == 'mss':
+            if self._mss is None:
+                self._mss = mss.mss()
+            shot = self._mss.grab({'left': left, 'top': top, 'width': width, 'height': height})
+            return Image.frombuffer('RGB', shot.size, shot.bgra, 'raw', 'BGRX', 0, 1)
+        import pyautogui
+        return pyautogui.screenshot(region=self.region)
+
+    def close(self):
+        if self._mss is not None:
+            self._mss.close()
+            self._mss = None
+
+
+def encode_jpeg(image, quality=BURST_JPEG_QUALITY):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class BurstCapture:
+    """
+    Captures a screen region at a fixed rate on its own thread.
+
+    Frames are JPEG-encoded on a thread pool (PIL releases the GIL while
+    encoding). With keep_seconds == 0 every frame is written to a new file
+    from allocate_path(); otherwise only the encoded frames of the last
+    keep_seconds are kept in a ring buffer and written by save_ring(), e.g.
+    right after something interesting happened.
+
+    When grabbing falls behind the frame interval, the missed slots are
+    counted as dropped instead of being caught up; frames are also dropped
+    while MAX_PENDING_FRAMES are still waiting for the encoder. Write errors
+    are collected in errors as (path, exception).
+    """
+
+    def __init__(self, region, fps, allocate_path, keep_seconds=0, workers=4, backend=None):
+        self.region = region
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.allocate_path = allocate_path
+        self.keep_seconds = keep_seconds
+        self.backend = backend
+        self.ring = deque(maxlen=max(1, math.ceil(fps * keep_seconds))) if keep_seconds > 0 else None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="burst")
+        self.errors = []
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self._slots = threading.BoundedSemaphore(MAX_PENDING_FRAMES)
+        self._lock = threading.Lock()
+        self._name_lock = threading.Lock()  # allocate_path is called from two threads
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="burst-grab", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """Stop grabbing; with wait, also let the queued frames be written."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.executor.shutdown(wait=wait)
+
+    def _allocate(self):
+        with self._name_lock:
+            return self.allocate_path()
+
+    def _run(self):
+        grabber = ScreenGrabber(self.region, self.backend)
+        try:
+            next_time = time.perf_counter()
+            while not self._stop.is_set():
+                if self._slots.acquire(blocking=False):
+                    try:
+                        self._submit(grabber.grab(), time.time())
+                    except Exception:
+                        self._slots.release()
+                        raise
+                else:
+                    self.dropped += 1
+
+                next_time += self.interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    # Behind schedule: skip the missed slots instead of bursting to catch up
+                    missed = int(-delay / self.interval)
+                    self.dropped += missed
+                    next_time += missed * self.interval
+        except Exception as e:
+            # Grabbing failed (screen locked, backend missing, ...); running turns False
+            self.errors.append(("screen grab", e))
+        finally:
+            grabber.close()
+
+    def _submit(self, image, timestamp):
+        self.captured += 1
+        if self.ring is None:
+            path = self._allocate()
+            self.executor.submit(self._encode_and_write, image, path)
+        else:
+            future = self.executor.submit(self._encode, image)
+            with self._lock:
+                self.ring.append((timestamp, future))
+
+    def _encode(self, image):
+        try:
+            return encode_jpeg(image)
+        finally:
+            self._slots.release()
+
+    def _encode_and_write(self, image, path):
+        try:
+            self._write(path, self._encode(image))
+        except Exception as e:
+            discard_placeholder(path)
+            self.errors.append((path, e))
+
+    def _write(self, path, data):
+        atomic_write(path, data)
+        with self._lock:
+            self.written += 1
+
+    def save_ring(self):
+        """Write the frames in the ring buffer, oldest first, and empty it. Returns how many."""
+        if self.ring is None:
+            return 0
+        with self._lock:
+            frames = list(self.ring)
+            self.ring.clear()
+        for _, future in frames:
+            self.executor.submit(self._write_encoded, future, self._allocate())
+        return len(frames)
+
+    def _write_encoded(self, future, path):
+        try:
+            self._write(path, future.result())
+        except Exception as e:
+            discard_placeholder(path)
+            self.errors.append((path, e))
+
+    def ring_seconds(self):
+        """Time span of the frames currently in the ring buffer."""
+        with self._lock:
+            if self.ring is None or len(self.ring) < 2:
+                return 0.0
+            return self.ring[-1][0] - self.ring[0][0]
@@ -1,10 +1,19 @@
 import tkinter as tk
 import pyautogui
+import io
 import os
-from PIL import Image, ImageTk
-import datetime
+import numpy as np
+from PIL import Image
 from tkinter import messagebox, simpledialog
 import time
+import threading
+from sequence_allocator import SequenceAllocator, discard_placeholder
+from background_writer import BackgroundWriter
+from yolo_labels import read_labels, parse_labels, write_labels, report_errors
+from dedup import DuplicateFinder, file_hashes
+from file_ops import atomic_write
+from dataset_index import DatasetIndex
+from burst_capture import BurstCapture, ScreenGrabber
 
 class ScreenCapture:
     def __init__(self, root):
@@ -26,8 +35,16 @@ class ScreenCapture:
         self.annotation_rects_ids = []
         self.overlay_rect_ids = []
         self.current_target_basename = None
+        # Onaylanan hedef bölgenin pikselleri (RGB, bellekte). İşaretleme kırpımları
+        # ekrandan tekrar yakalanmak yerine bu tampondan kopyasız dilimlenir.
+        self.crop_from_target_buffer = True
+        self.target_pixels = None
         # Son yapılan işaretleme bilgilerini saklamak için (Geri Alma işlemi için)
-        self.last_annotation_details = None # {'img_path': ..., 'lbl_path': ..., 'lbl_line': ..., 'canvas_id': ...}
+        self.last_annotation_details = None # {'img_path': ..., 'lbl_path': ..., 'lbl_line': ..., 'canvas_id': ..., 'job': ...}
+
+        # ----- Arka Plan Yazıcı -----
+        # JPEG kodlama ve disk yazma Tk iş parçacığını bekletmesin diye kuyruğa alınır
+        self.writer = BackgroundWriter()
 
         # ----- Klasör Yönetimi -----
         self.main_folder = "ekran_goruntusu"
@@ -36,8 +53,31 @@ class ScreenCapture:
         self.annotation_subfolder = ""
         self.annotation_subfolder_path = ""
         self.last_annotation_subfolder = ""
+        self.filename_allocators = {} # (klasör, basamak, uzantı) -> SequenceAllocator
         self.setup_base_folders()
 
+        # ----- Tekrar Eden Yakalamalar -----
+        # Aynı pikselli bir hedef tekrar 'S' ile onaylanırsa yeni resim kaydedilmez,
+        # işaretlemeler mevcut resme eklenir. Neredeyse aynı (dHash farkı en fazla
+        # near_duplicate_distance bit) hedefler kaydedilir ama durum satırında uyarılır.
+        self.skip_exact_duplicate_captures = True
+        self.near_duplicate_distance = 4 # 0: sadece birebir aynılar
+        self.duplicate_finder = DuplicateFinder(self.near_duplicate_distance)
+        self.duplicate_finder_lock = threading.Lock()
+        self.target_aliases = {} # atlanan hedefin adı -> kullanılan mevcut hedefin adı (uzantısız)
+        # Mevcut hedef resimlerin özetleri arka planda (paralel) hesaplanır
+        threading.Thread(target=self.load_capture_hashes, daemon=True).start()
+
+        # ----- Seri Çekim -----
+        # 'B' onaylanan hedef bölgeyi burst_fps hızında sürekli yakalar (mss kuruluysa
+        # onunla, değilse pyautogui ile); kodlama ve yazma arka plan havuzunda yapılır.
+        # burst_keep_seconds > 0 ise kareler yazılmaz, sadece son N saniye bellekte
+        # (JPEG olarak) tutulur ve 'K' ile o an kaydedilir.
+        self.burst_fps = 10
+        self.burst_keep_seconds = 0
+        self.burst_workers = 4
+        self.burst = None
+
         # ----- Arayüz Elemanları -----
         self.canvas = tk.Canvas(root, cursor="cross", highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
@@ -64,7 +104,14 @@ class ScreenCapture:
         self.root.bind("<KeyPress-A>", self.prompt_annotation_subfolder)
         self.root.bind("<KeyPress-z>", self.undo_last_annotation) # Geri alma tuşu
         self.root.bind("<KeyPress-Z>", self.undo_last_annotation) # Geri alma tuşu
+        self.root.bind("<KeyPress-b>", self.toggle_burst)
+        self.root.bind("<KeyPress-B>", self.toggle_burst)
+        self.root.bind("<KeyPress-k>", self.save_burst_ring)
+        self.root.bind("<KeyPress-K>", self.save_burst_ring)
         self.root.bind("<Escape>", self.exit_program)
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_program)
+
+        self.poll_writer_errors()
 
     def setup_base_folders(self):
         os.makedirs(self.main_folder, exist_ok=True)
@@ -79,10 +126,12 @@ class ScreenCapture:
     # ----- Mod Değiştirme Fonksiyonları -----
 
     def enter_target_selection_mode(self, event=None):
+        self.stop_burst()
         self.mode = 'selecting_target'
         self.target_region = None
         self.potential_target_coords = None
         self.current_target_basename = None
+        self.target_pixels = None
         self.last_annotation_details = None # Yeni hedefte geri alınacak bir şey yok
         self.root.attributes('-alpha', 0.1)
         self.root.configure(cursor="cross")
@@ -118,7 +167,10 @@ class ScreenCapture:
             screenshot = pyautogui.screenshot(region=(tx1, ty1, width, height))
             file_name = self.generate_filename(self.target_image_folder, 5, ".jpg")
             file_path = os.path.join(self.target_image_folder, file_name)
-            screenshot.save(file_path)
+            # Kodlama, özet ve tekrar kontrolü arka planda; arayüz hemen işaretlemeye hazır
+            self.writer.submit(self.write_target, file_path, screenshot, description=file_path)
+            if self.crop_from_target_buffer:
+                self.target_pixels = np.asarray(screenshot.convert("RGB"))
 
             self.current_target_basename = os.path.splitext(file_name)[0]
             self.mode = 'annotating'
@@ -279,9 +331,12 @@ class ScreenCapture:
                  self.start_x, self.start_y = None, None
                  return
 
-            self.root.attributes('-alpha', 0.0)
-            self.root.update()
-            time.sleep(0.1)
+            # Tampon yoksa (eski mod) pencereyi gizleyip ekrandan yakalamak gerekir
+            grab_from_screen = self.target_pixels is None
+            if grab_from_screen:
+                self.root.attributes('-alpha', 0.0)
+                self.root.update()
+                time.sleep(0.1)
 
             annotation_saved = False
             label_written = False
@@ -291,11 +346,15 @@ class ScreenCapture:
             saved_canvas_id = self.current_annotation_rect_id # ID'yi sakla
 
             try:
-                # 1. Kaydet
-                screenshot = pyautogui.screenshot(region=(final_x1, final_y1, width, height))
+                # 1. Yakala (kaydetme arka planda yapılır)
+                if grab_from_screen:
+                    screenshot = pyautogui.screenshot(region=(final_x1, final_y1, width, height))
+                else:
+                    # Hedef resmin birebir aynı pikselleri; NumPy dilimi kopya oluşturmaz
+                    screenshot = self.target_pixels[final_y1 - target_y1:final_y2 - target_y1,
+                                                    final_x1 - target_x1:final_x2 - target_x1]
                 annotation_file_name = self.generate_filename(self.annotation_subfolder_path, 3, ".jpg")
                 annotation_file_path = os.path.join(self.annotation_subfolder_path, annotation_file_name)
-                screenshot.save(annotation_file_path)
                 annotation_saved = True
 
                 # 2. Hesapla
@@ -316,7 +375,9 @@ class ScreenCapture:
                 class_name = self.annotation_subfolder
                 label_file_path = os.path.join(self.labels_folder, f"{self.current_target_basename}.txt")
                 yolo_line = f"{class_name} {x_center_norm:.6f} {y_center_norm:.6f} {width_norm:.6f} {height_norm:.6f}\n"
-                with open(label_file_path, 'a', encoding='utf-8') as f: f.write(yolo_line)
+                # Resim + etiket satırı tek iş olarak sıraya girer; sıra korunur
+                write_job = self.writer.submit(self.write_annotation, screenshot, annotation_file_path,
+                                               label_file_path, yolo_line, description=annotation_file_path)
                 label_written = True
 
                 # Başarılıysa canvas'taki dikdörtgeni kalıcı yap (width=2)
@@ -328,12 +389,16 @@ class ScreenCapture:
                     'img_path': annotation_file_path,
                     'lbl_path': label_file_path,
                     'lbl_line': yolo_line, # Satır sonu karakteri dahil
-                    'canvas_id': saved_canvas_id
+                    'canvas_id': saved_canvas_id,
+                    'job': write_job
                 }
-                self.status_label.config(text=f"Kaydedildi: ...{os.path.basename(annotation_file_path)} | Etiket eklendi: {os.path.basename(label_file_path)} ('Z' ile Geri Al)")
+                self.status_label.config(text=f"Kaydediliyor: ...{os.path.basename(annotation_file_path)} | Etiket eklendi: {os.path.basename(label_file_path)} ('Z' ile Geri Al)")
 
             except Exception as e:
                 error_msg = f"İşaretleme kaydedilirken/etiketlenirken hata: {str(e)}"
+                if annotation_saved and not label_written:
+                    # Yazma işi sıraya hiç girmedi; ayrılan boş dosya kalmasın
+                    discard_placeholder(annotation_file_path)
                 if annotation_saved and not label_written: error_msg += f"\nResim kaydedildi ({annotation_file_path}) ancak etiket dosyası yazılamadı!"
                 elif not annotation_saved: error_msg += f"\nResim kaydedilemedi ({annotation_file_path})."
                 messagebox.showerror("Hata", error_msg)
@@ -347,6 +412,69 @@ class ScreenCapture:
                  self.current_annotation_rect_id = None # İşlem bitti, geçici ID'yi sıfırla
                  self.start_x, self.start_y = None, None
 
+    # ----- Seri Çekim Fonksiyonları -----
+
+    def toggle_burst(self, event=None):
+        if self.burst is not None:
+            self.stop_burst()
+            return
+        if self.mode != 'annotating' or not self.target_region:
+            messagebox.showwarning("Uyarı", "Seri çekim için önce bir hedef bölge onaylayın ('W' -> çiz -> 'S').")
+            return
+
+        self.root.attributes('-alpha', 1.0)
+        fps = simpledialog.askinteger("Seri Çekim", "Saniyedeki kare sayısı (FPS):", initialvalue=self.burst_fps,
+                                      minvalue=1, maxvalue=120, parent=self.root)
+        if fps is None:
+            self.root.attributes('-alpha', 0.3)
+            return
+        self.burst_fps = fps
+
+        def allocate_path():
+            return os.path.join(self.target_image_folder, self.generate_filename(self.target_image_folder, 5, ".jpg"))
+
+        # Pencere karelere girmesin diye çekim boyunca tamamen saydam
+        self.root.attributes('-alpha', 0.0)
+        self.root.update()
+        self.burst = BurstCapture(self.target_region, fps, allocate_path, keep_seconds=self.burst_keep_seconds,
+                                  workers=self.burst_workers)
+        self.burst.start()
+        backend = ScreenGrabber(self.target_region).backend
+        if self.burst_keep_seconds > 0:
+            self.status_label.config(text=f"Durum: Seri çekim ({fps} FPS, {backend}). Son {self.burst_keep_seconds} sn bellekte; 'K' kaydet, 'B' durdur.")
+        else:
+            self.status_label.config(text=f"Durum: Seri çekim ({fps} FPS, {backend}). Her kare kaydediliyor; 'B' durdur.")
+        self.root.after(500, self.poll_burst)
+
+    def poll_burst(self):
+        burst = self.burst
+        if burst is None:
+            return
+        if not burst.running:
+            # Yakalama hata ile durdu
+            self.stop_burst()
+            return
+        self.root.after(500, self.poll_burst)
+
+    def save_burst_ring(self, event=None):
+        if self.burst is None or self.burst.ring is None:
+            return
+        seconds = self.burst.ring_seconds()
+        count = self.burst.save_ring()
+        self.status_label.config(text=f"Durum: Son {seconds:.1f} sn ({count} kare) kaydediliyor. Seri çekim devam ediyor; 'B' durdur.")
+
+    def stop_burst(self):
+        burst, self.burst = self.burst, None
+        if burst is None:
+            return
+        # Sıradaki kareler yazılana kadar bekle; halka tamponda kalan kareler atılır
+        burst.stop(wait=True)
+        self.root.attributes('-alpha', 0.3)
+        self.status_label.config(text=f"Durum: Seri çekim bitti. {burst.captured} kare yakalandı, {burst.written} kare yazıldı, {burst.dropped} kare atlandı.")
+        if burst.errors:
+            target, error = burst.errors[0]
+            messagebox.showerror("Hata", f"Seri çekimde {len(burst.errors)} hata oluştu. İlki ({target}): {error}")
+
     # ----- Geri Alma Fonksiyonu -----
     def undo_last_annotation(self, event=None):
         """Son yapılan işaretlemeyi geri alır."""
@@ -363,6 +491,13 @@ class ScreenCapture:
         lbl_path = details['lbl_path']
         lbl_line_to_remove = details['lbl_line'] # Satır sonu dahil olmalı
         canvas_id = details['canvas_id']
+        job = details.get('job')
+
+        # Yazma henüz başlamadıysa iptal et; başladıysa bitmesini bekle
+        write_cancelled = job is not None and self.writer.cancel(job)
+        if job is not None and not write_cancelled:
+            job.wait()
+        lbl_path = self.resolve_label_path(lbl_path)
 
         # 1. Canvas'tan dikdörtgeni sil
         try:
@@ -382,13 +517,20 @@ class ScreenCapture:
         lines_kept = []
         line_removed = False
         try:
-            if os.path.exists(lbl_path):
-                with open(lbl_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                # Sondan başlayarak eşleşen ilk satırı atla (en son eklenen)
-                # VEYA daha basit: son satırı silmeyi dene (eğer bu son işlemse)
-                if lines and lines[-1] == lbl_line_to_remove:
-                     lines.pop() # Son satırı sil
+            if write_cancelled:
+                line_removed = True # Satır hiç yazılmadı
+            elif os.path.exists(lbl_path):
+                labels = read_labels(lbl_path)
+                expected = parse_labels(lbl_line_to_remove)
+                # Son satır eklediğimiz satırla aynıysa (sayısal karşılaştırma) onu sil
+                last_matches = (len(labels.class_ids) > 0 and len(expected.class_ids) == 1
+                                and labels.class_ids[-1] == expected.class_ids[0]
+                                and np.allclose(labels.boxes[-1], expected.boxes[0], atol=1e-6))
+                if labels.errors:
+                     # Bozuk satırlar yeniden yazarken kaybolmasın diye dosyaya dokunma
+                     report_errors(labels.errors)
+                     print(f"Uyarı: Etiket dosyasında ({lbl_path}) bozuk satırlar var, geri alma dosyayı değiştirmedi.")
+                elif last_matches:
                      line_removed = True
                 else:
                      # Eğer son satır eşleşmiyorsa, belki manuel editlendi.
@@ -398,8 +540,8 @@ class ScreenCapture:
                      print(f"Uyarı: Etiket dosyasındaki ({lbl_path}) son satır geri alınmak istenenle ({lbl_line_to_remove.strip()}) eşleşmiyor.")
 
                 if line_removed:
-                    with open(lbl_path, 'w', encoding='utf-8') as f:
-                        f.writelines(lines)
+                    # Kalan satırlar tek seferde yazılır
+                    write_labels(lbl_path, labels.class_ids[:-1], labels.boxes[:-1], clip=False)
             else:
                  print(f"Uyarı: Etiket dosyası ({lbl_path}) bulunamadı.")
 
@@ -413,6 +555,7 @@ class ScreenCapture:
             if os.path.exists(img_path):
                 os.remove(img_path)
                 img_deleted = True
+                self.release_filename(img_path, 3, ".jpg")
             else:
                 print(f"Uyarı: İşaretleme resmi ({img_path}) bulunamadı.")
         except Exception as e:
@@ -431,20 +574,116 @@ class ScreenCapture:
 
     # ----- Yardımcı Fonksiyonlar -----
     def generate_filename(self, folder_path, num_digits, extension=".jpg"):
-        os.makedirs(folder_path, exist_ok=True)
-        files = os.listdir(folder_path)
-        pattern = f"{{:0{num_digits}d}}{extension}"
-        numeric_files = [f for f in files if f.endswith(extension) and len(f) == num_digits + len(extension) and f[:num_digits].isdigit()]
-        if not numeric_files: next_number = 1
+        # Klasör oturum başında bir kez taranır (veya sayaç dosyası okunur), sonrası O(1)
+        key = (os.path.abspath(folder_path), num_digits, extension)
+        allocator = self.filename_allocators.get(key)
+        if allocator is None:
+            allocator = SequenceAllocator(folder_path, num_digits, extension)
+            self.filename_allocators[key] = allocator
+        return allocator.allocate()
+
+    def release_filename(self, file_path, num_digits, extension=".jpg"):
+        # Geri alınan son dosya numarası tekrar kullanılabilsin
+        folder_path, file_name = os.path.split(file_path)
+        allocator = self.filename_allocators.get((os.path.abspath(folder_path), num_digits, extension))
+        if allocator is not None:
+            allocator.release(file_name)
+
+    def write_target(self, img_path, screenshot):
+        # Arka plan iş parçacığında çalışır. Özet, diske yazılacak JPEG'in çözülmüş
+        # hâlinden alınır; indeksin önceki oturumlar için dosyalardan hesapladığı
+        # özetlerle ancak böyle eşleşir. Yazılamazsa ayrılan boş dosya silinir.
+        try:
+            buffer = io.BytesIO()
+            screenshot.save(buffer, format='JPEG')
+            jpeg_bytes = buffer.getvalue()
+            content_hash, dhash_value = file_hashes(io.BytesIO(jpeg_bytes))
+            with self.duplicate_finder_lock:
+                duplicate = self.duplicate_finder.find(content_hash, dhash_value)
+            if duplicate is not None and duplicate[1] == 'exact' and self.skip_exact_duplicate_captures:
+                # Aynı hedef zaten kayıtlı: yeni resim yazılmaz. Yazıcı sırayla çalıştığından
+                # bu hedefin sonraki etiket satırları mevcut resmin etiket dosyasına gider.
+                discard_placeholder(img_path)
+                self.target_aliases[self.target_basename(img_path)] = self.target_basename(duplicate[0])
+            else:
+                atomic_write(img_path, jpeg_bytes)
+                with self.duplicate_finder_lock:
+                    self.duplicate_finder.add(os.path.basename(img_path), content_hash, dhash_value)
+        except Exception:
+            discard_placeholder(img_path)
+            raise
+        if duplicate is not None:
+            self.root.after(0, self.report_duplicate_target, img_path, duplicate)
+
+    def report_duplicate_target(self, img_path, duplicate):
+        # Tk iş parçacığında çalışır; write_target'ın tekrar kontrolünün sonucu
+        file_name, kind, distance = duplicate
+        if kind == 'exact' and self.skip_exact_duplicate_captures:
+            self.release_filename(img_path, 5, ".jpg")
+            note = f"[Aynı hedef zaten kayıtlı, {file_name} kullanılıyor]"
+            if self.current_target_basename == self.target_basename(img_path):
+                self.current_target_basename = self.target_basename(file_name)
         else:
-            highest = 0
-            for f in numeric_files:
-                try: highest = max(highest, int(f[:num_digits]))
-                except ValueError: pass
-            next_number = highest + 1
-        return pattern.format(next_number)
+            note = f"[Uyarı: {os.path.basename(img_path)}, {file_name} ile neredeyse aynı ({distance} bit fark)]"
+        self.status_label.config(text=f"{self.status_label.cget('text')} {note}")
+
+    def target_basename(self, file_name):
+        return os.path.splitext(os.path.basename(file_name))[0]
+
+    def resolve_label_path(self, lbl_path):
+        # Tekrar eden bir hedefe yazılan etiket satırları mevcut resmin dosyasına yönlendirilir
+        alias = self.target_aliases.get(self.target_basename(lbl_path))
+        if alias is None:
+            return lbl_path
+        return os.path.join(os.path.dirname(lbl_path), f"{alias}.txt")
+
+    def write_annotation(self, screenshot, img_path, lbl_path, yolo_line):
+        # Arka plan iş parçacığında çalışır: önce resim, sonra etiket satırı
+        if isinstance(screenshot, np.ndarray):
+            # Hedef tamponundan gelen dilim; tek kopya burada, kodlama için yapılır
+            screenshot = Image.fromarray(np.ascontiguousarray(screenshot))
+        try:
+            screenshot.save(img_path)
+        except Exception:
+            # Resim yazılamadı: boş yer tutucu kalmasın, etiket satırı da eklenmez
+            discard_placeholder(img_path)
+            raise
+        with open(self.resolve_label_path(lbl_path), 'a', encoding='utf-8') as f: f.write(yolo_line)
+
+    def poll_writer_errors(self):
+        # Arka plan yazma hataları Tk iş parçacığında gösterilir
+        while not self.writer.errors.empty():
+            job = self.writer.errors.get()
+            messagebox.showerror("Hata", f"Kaydetme başarısız ({job.description}): {job.error}")
+        self.root.after(250, self.poll_writer_errors)
+
+    def load_capture_hashes(self):
+        """Mevcut hedef resimlerin özetlerini (indeksten, eksikler paralel hesaplanır) yükler."""
+        try:
+            index = DatasetIndex(self.main_folder)
+            hashes = index.image_hashes(self.target_image_folder)
+            index.close()
+        except Exception as e:
+            print(f"Uyarı: Tekrar eden yakalama kontrolü için özetler yüklenemedi: {e}")
+            return
+        finder = DuplicateFinder(self.near_duplicate_distance)
+        for name, (content_hash, dhash_value) in sorted(hashes.items()):
+            finder.add(name, content_hash, dhash_value)
+        with self.duplicate_finder_lock:
+            # Bu oturumda yakalananlar da kaybolmasın
+            for name, content_hash, dhash_value in self.duplicate_finder.entries():
+                if name not in hashes:
+                    finder.add(name, content_hash, dhash_value)
+            self.duplicate_finder = finder
 
     def exit_program(self, event=None):
+        self.stop_burst()
+        # Bekleyen tüm yazmalar bitmeden çıkma
+        pending = self.writer.pending_count()
+        if pending:
+            self.status_label.config(text=f"Durum: {pending} bekleyen kayıt diske yazılıyor...")
+            self.root.update()
+        self.writer.close()
         self.root.destroy()
 
 
@@ -1,46 +1,44 @@
 import os
-import glob
-
-def convert_labels(label_dir):
-    # Dictionary to map text labels to numeric indices
-    label_map = {
-        'b1': 0,  # bina
-    }
-    
-    # Get all text files in the label directory
-    label_files = glob.glob(os.path.join(label_dir, '*.txt'))
-    
-    for file_path in label_files:
-        # Read the current content
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-        
-        # Convert and write back
-        with open(file_path, 'w') as f:
-            for line in lines:
-                parts = line.strip().split(' ')
-                if parts[0] in label_map:
-                    # Replace the text label with numeric index
-                    parts[0] = str(label_map[parts[0]])
-                    f.write(' '.join(parts) + '\n')
-                else:
-                    # Keep the line unchanged if label not found in map
-                    f.write(line)
-        
-        print(f"Converted {file_path}")
+from concurrent.futures import ProcessPoolExecutor
+from label_remap import load_class_mapping, build_label_map, remap_directory, print_remap_report
+
+# Text labels are mapped to the class ids of the editor's config
+# (annotation_editor_config.json, class name -> id). Entries here are added on
+# top, e.g. short names written by older collect.py runs.
+label_map = {
+    'b1': 0,  # bina
+}
+config_file = 'annotation_editor_config.json'
 
 # Example usage:
 # Replace with the actual path to your label directories
 train_labels_dir = './datasets/my-bina/labels/train'
 val_labels_dir = './datasets/my-bina/labels/val'
 test_labels_dir = './datasets/my-bina/labels/test'
+label_dirs = [train_labels_dir, val_labels_dir, test_labels_dir]
+
+# Worker processes (None = one per CPU)
+num_workers = None
+
+# Only report what would change, don't write anything
+dry_run = False
+
+def main():
+    class_mapping = load_class_mapping(config_file)
+    mapping = build_label_map(class_mapping, label_map)
+    print("Label map: " + ", ".join(f"{k} -> {v}" for k, v in sorted(mapping.items())))
+
+    # One pool for all directories; files are rewritten atomically (temp file + rename)
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        for directory in label_dirs:
+            if os.path.exists(directory):
+                print(f"Converting labels in {directory}...")
+                summary = remap_directory(directory, mapping, dry_run=dry_run, pool=pool)
+                print_remap_report(directory, summary, class_mapping)
+            else:
+                print(f"Directory {directory} not found, skipping.")
 
-# Convert labels in each directory
-for directory in [train_labels_dir, val_labels_dir, test_labels_dir]:
-    if os.path.exists(directory):
-        print(f"Converting labels in {directory}...")
-        convert_labels(directory)
-    else:
-        print(f"Directory {directory} not found, skipping.")
+    print("Label conversion complete!")
 
-print("Label conversion complete!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import os
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from dedup import file_hashes, to_signed64, to_unsigned64
+
+INDEX_FILENAME = ".dataset_index.sqlite"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+# A directory whose mtime is this recent may still change within the same
+# timestamp tick, so it is not trusted and will be rescanned next time.
+RACY_MTIME_SECONDS = 2.0
+
+# Bump when the schema or what a scan records changes; older indexes are rescanned
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS subdirs (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (dir, name)
+);
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    PRIMARY KEY (dir, name)
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    content_hash TEXT,
+    dhash INTEGER,
+    PRIMARY KEY (dir, name)
+);
+"""
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def read_image_hashes(path):
+    """(content_hash, dhash) of an image, or None if it cannot be decoded."""
+    try:
+        return file_hashes(path)
+    except Exception:
+        return None
+
+
+class DatasetIndex:
+    """
+    Persistent SQLite index of the files below a dataset folder.
+
+    The index lives in INDEX_FILENAME inside the dataset root (beside the
+    images/ and labels/ folders). Every directory is listed once and only
+    rescanned when its mtime changes; a rescan only stats the files, their
+    contents are read on request (image_hashes()). Files rewritten in place
+    do not change their directory's mtime, so tools that write files should
+    call update_file() afterwards.
+
+    An index file that turns out to be damaged is deleted and rebuilt. If
+    it cannot be created (e.g. read-only share) an in-memory index is used,
+    which still avoids repeated scans within one session.
+    """
+
+    def __init__(self, root, max_workers=8):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, INDEX_FILENAME)
+        self.max_workers = max_workers
+        try:
+            self.conn = self._open(self.index_path)
+        except sqlite3.DatabaseError:
+            # Damaged index (e.g. a crash while it was written): start over
+            self._remove_index_files()
+            try:
+                self.conn = self._open(self.index_path)
+            except sqlite3.Error:
+                self.conn = self._open(":memory:")
+        except sqlite3.Error:
+            self.conn = self._open(":memory:")
+
+    def _open(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            # Crash-safe, and the journal file is created once and then kept, so
+            # later writes do not touch the root's mtime (WAL needs shared memory,
+            # which network shares do not provide)
+            conn.execute("PRAGMA journal_mode=PERSIST")
+            self._init_schema(conn)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _remove_index_files(self):
+        for suffix in ("", "-journal"):
+            try:
+                os.remove(self.index_path + suffix)
+            except OSError:
+                pass
+
+    def _init_schema(self, conn):
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version < SCHEMA_VERSION:
+            # Older files tables hold columns that are no longer written
+            conn.execute("DROP TABLE IF EXISTS files")
+        conn.executescript(SCHEMA)
+        if version < SCHEMA_VERSION:
+            # Forget directory mtimes so every directory is rescanned once
+            conn.execute("DELETE FROM dirs")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _key(self, dir_path):
+        return os.path.relpath(os.path.abspath(dir_path), self.root)
+
+    def refresh_dir(self, dir_path, force=False):
+        """Rescan dir_path if its mtime changed since the last scan."""
+        key = self._key(dir_path)
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            # Directory vanished
+            self.conn.execute("DELETE FROM files WHERE dir = ?", (key,))
+            self.conn.execute("DELETE FROM subdirs WHERE dir = ?", (key,))
+            self.conn.execute("DELETE FROM dirs WHERE path = ?", (key,))
+            self.conn.commit()
+            return
+
+        row = self.conn.execute("SELECT mtime FROM dirs WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[0] == dir_mtime and not force:
+            return
+
+        known = {
+            name: (size, mtime)
+            for name, size, mtime in self.conn.execute(
+                "SELECT name, size, mtime FROM files WHERE dir = ?", (key,))
+        }
+
+        changed = []
+        present = set()
+        subdirs = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.name.startswith(INDEX_FILENAME):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                present.add(entry.name)
+                if known.get(entry.name) != (st.st_size, st.st_mtime):
+                    changed.append((entry.name, st.st_size, st.st_mtime))
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            [(key, name, size, mtime) for name, size, mtime in changed])
+        self.conn.executemany(
+            "DELETE FROM files WHERE dir = ? AND name = ?",
+            [(key, name) for name in known if name not in present])
+        self.conn.execute("DELETE FROM subdirs WHERE dir = ?", (key,))
+        self.conn.executemany("INSERT INTO subdirs VALUES (?, ?)", [(key, name) for name in subdirs])
+
+        trusted_mtime = dir_mtime if time.time() - dir_mtime > RACY_MTIME_SECONDS else None
+        self.conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (key, trusted_mtime))
+        self.conn.commit()
+
+    def update_file(self, path):
+        """Re-read one file after it was written or removed by a tool."""
+        dir_path, name = os.path.split(os.path.abspath(path))
+        key = self._key(dir_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.conn.execute("DELETE FROM files WHERE dir = ? AND name = ?", (key, name))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (key, name, st.st_size, st.st_mtime))
+        self.conn.commit()
+
+    def list_files(self, dir_path, extensions=None):
+        """Sorted file names in dir_path, optionally filtered by extension (lowercase, with dot)."""
+        if not os.path.isdir(dir_path):
+            return []
+        self.refresh_dir(dir_path)
+        names = [name for (name,) in self.conn.execute(
+            "SELECT name FROM files WHERE dir = ? ORDER BY name", (self._key(dir_path),))]
+        if extensions:
+            extensions = tuple(extensions)
+            names = [name for name in names if name.lower().endswith(extensions)]
+        return names
+
+    def list_subdirs(self, dir_path):
+        """Sorted names of the directories directly inside dir_path."""
+        if not os.path.isdir(dir_path):
+            return []
+        self.refresh_dir(dir_path)
+        return [name for (name,) in self.conn.execute(
+            "SELECT name FROM subdirs WHERE dir = ? ORDER BY name", (self._key(dir_path),))]
+
+    def walk(self, top):
+        """Like os.walk (top-down), but served from the index: yields (dirpath, dirnames, filenames)."""
+        dirnames = self.list_subdirs(top)
+        yield top, dirnames, self.list_files(top)
+        for name in dirnames:
+            yield from self.walk(os.path.join(top, name))
+
+    def list_images(self, dir_path):
+        return self.list_files(dir_path, IMAGE_EXTENSIONS)
+
+    def image_hashes(self, dir_path):
+        """
+        {name: (content_hash, dhash)} for every image in dir_path (see dedup.py).
+
+        Hashes need a full decode, so they are only computed on request, in
+        parallel, and kept until the file's size or mtime changes.
+        Undecodable images are left out.
+        """
+        self.refresh_dir(dir_path)
+        key = self._key(dir_path)
+        files = {
+            name: (size, mtime)
+            for name, size, mtime in self.conn.execute(
+                "SELECT name, size, mtime FROM files WHERE dir = ?", (key,))
+            if is_image_name(name)
+        }
+        known = {
+            name: (size, mtime, content_hash, dhash)
+            for name, size, mtime, content_hash, dhash in self.conn.execute(
+                "SELECT name, size, mtime, content_hash, dhash FROM hashes WHERE dir = ?", (key,))
+        }
+
+        result = {}
+        missing = []
+        for name, stat in files.items():
+            row = known.get(name)
+            if row is not None and row[:2] == stat:
+                result[name] = (row[2], to_unsigned64(row[3]))
+            else:
+                missing.append(name)
+
+        paths = [os.path.join(dir_path, name) for name in missing]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            computed = list(pool.map(read_image_hashes, paths))
+
+        rows = []
+        for name, hashes in zip(missing, computed):
+            if hashes is None:
+                continue
+            result[name] = hashes
+            rows.append((key, name) + files[name] + (hashes[0], to_signed64(hashes[1])))
+        self.conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.execute(
+            "DELETE FROM hashes WHERE dir = ? AND name NOT IN (SELECT name FROM files WHERE dir = ?)", (key, key))
+        self.conn.commit()
+        return result
+
@@ -0,0 +1,101 @@
+"""
+Dataset operations of the annotation editor that need no display.
+
+edit.py calls these after asking for their arguments in dialogs;
+datatool.py exposes the same operations on the command line.
+"""
+import os
+
+from dataset_index import DatasetIndex, IMAGE_EXTENSIONS
+from file_ops import parallel_transfer
+from label_cache import CACHE_DIRNAME, open_label_cache
+from stratify import stratified_split
+
+
+def sorted_class_names(class_mapping):
+    """Class names ordered by id (numeric ids numerically), as written to dataset.yaml."""
+    keys = sorted(class_mapping.keys(), key=lambda x: (not str(x).isdigit(), int(x) if str(x).isdigit() else 0, str(x)))
+    return [class_mapping[k] for k in keys]
+
+
+def write_dataset_yaml(yaml_path, train_images, val_images, class_mapping):
+    names = sorted_class_names(class_mapping)
+    with open(yaml_path, "w") as f:
+        f.write(f"train: {train_images}\n")
+        f.write(f"val:   {val_images}\n")
+        f.write(f"nc: {len(names)}\n")
+        f.write("names:\n")
+        for i, name in enumerate(names):
+            f.write(f"  {i}: {name}\n")
+
+
+def build_yolo_folder(src_dir, test_pct, class_mapping, mode='copy', jobs=8, seed=None, progress=None):
+    """
+    Builds <src_dir>/analiz/{train,test}/{images,labels} and dataset.yaml
+    from a folder holding images with same-named .txt labels.
+
+    Only images that have a label file are used. The split is stratified
+    by class (stratify.py) so rare classes also reach the test set. Files
+    are transferred in parallel (file_ops.parallel_transfer, any of
+    LINK_MODES); progress(done, total) is called as files finish.
+
+    Raises ValueError if there is no image/label pair.
+    Returns a dict with 'dest_root', 'train', 'test' (image counts) and
+    'failed' ((src, error) tuples).
+    """
+    dest_root = os.path.join(src_dir, "analiz")
+
+    index = DatasetIndex(src_dir)
+    names = index.list_files(src_dir)
+    index.close()
+    txt_names = set(f for f in names if f.endswith(".txt"))
+    all_imgs = [f for f in names
+                if f.lower().endswith(IMAGE_EXTENSIONS) and os.path.splitext(f)[0] + ".txt" in txt_names]
+    if not all_imgs:
+        raise ValueError("No image-label pairs found. The source folder must contain "
+                         "both images and same-named .txt files.")
+
+    # Classes for the split come from the packed cache, kept inside the chosen
+    # folder; only changed .txt files are opened
+    label_cache = open_label_cache(src_dir, jobs, cache_dir=os.path.join(src_dir, CACHE_DIRNAME))
+
+    label_paths = [os.path.join(src_dir, os.path.splitext(img)[0] + ".txt") for img in all_imgs]
+    assignment, _, _ = stratified_split(label_paths, [100 - test_pct, test_pct], seed=seed, label_cache=label_cache)
+    splits = {
+        "train": [img for img, fold in zip(all_imgs, assignment) if fold == 0],
+        "test": [img for img, fold in zip(all_imgs, assignment) if fold == 1],
+    }
+
+    pairs = []
+    for split, files in splits.items():
+        os.makedirs(os.path.join(dest_root, split, "images"), exist_ok=True)
+        os.makedirs(os.path.join(dest_root, split, "labels"), exist_ok=True)
+        for img in files:
+            txt = os.path.splitext(img)[0] + ".txt"
+            pairs.append((os.path.join(src_dir, img), os.path.join(dest_root, split, "images", img)))
+            pairs.append((os.path.join(src_dir, txt), os.path.join(dest_root, split, "labels", txt)))
+
+    total = len(pairs)
+    result = parallel_transfer(pairs, mode, jobs,
+                               progress=(lambda done: progress(done, total)) if progress else None)
+
+    write_dataset_yaml(os.path.join(dest_root, "dataset.yaml"),
+                       os.path.join('analiz', 'train', 'images'),
+                       os.path.join('analiz', 'test', 'images'),
+                       class_mapping)
+    return {'dest_root': dest_root, 'train': len(splits['train']), 'test': len(splits['test']),
+            'failed': result['failed']}
+
+
+def classify_images(image_paths, base_dir, main, sub, mode='copy', jobs=8, progress=None):
+    """
+    Files images under <base_dir>/<main>/<sub> (copied by default, or linked).
+    Returns (target_folder, parallel_transfer result).
+    """
+    target = os.path.join(base_dir, main, sub)
+    os.makedirs(target, exist_ok=True)
+    pairs = [(path, os.path.join(target, os.path.basename(path))) for path in image_paths]
+    total = len(pairs)
+    result = parallel_transfer(pairs, mode, jobs,
+                               progress=(lambda done: progress(done, total)) if progress else None)
+    return target, result
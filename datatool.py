@@ -0,0 +1,242 @@
+"""
+Command line for the dataset operations, for machines without a display.
+
+    python datatool.py yolo-folder SRC --test-pct 20
+    python datatool.py classify IMAGE... --base-dir DIR --main M --sub S
+    python datatool.py split SRC DEST --ratios 0.7 0.2 0.1
+    python datatool.py merge SRC1 SRC2 ... --target DIR
+    python datatool.py convert LABEL_DIR... --map b1=0
+
+Every subcommand takes --jobs (parallel workers) and --mode (copy,
+hardlink, reflink or symlink where files are placed). With --json,
+stdout carries only JSON lines ({"event": "progress", "done": n,
+"total": N, ...} while working, one "result" line at the end) and the
+human readable messages go to stderr.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from file_ops import LINK_MODES
+from dedup import DEFAULT_MAX_DISTANCE
+from label_remap import CONFIG_FILE, load_class_mapping, build_label_map, remap_directory, print_remap_report
+from yolo_labels import report_errors
+import dataset_ops
+import merge
+import split
+
+
+class Reporter:
+    """Prints progress either as text or as JSON lines; progress lines are throttled."""
+
+    def __init__(self, json_mode, interval=0.5):
+        self.json_mode = json_mode
+        self.interval = interval
+        self._last = {}
+
+    def event(self, event, **fields):
+        if self.json_mode:
+            fields = {'event': event, 'time': round(time.time(), 3), **fields}
+            sys.stdout.write(json.dumps(fields, default=str) + "\n")
+            sys.stdout.flush()
+        elif event != 'progress':
+            details = ", ".join(f"{k}: {v}" for k, v in fields.items())
+            print(f"{event}: {details}" if details else event)
+
+    def progress(self, stage, done, total):
+        now = time.monotonic()
+        if done < total and now - self._last.get(stage, 0) < self.interval:
+            return
+        self._last[stage] = now
+        if self.json_mode:
+            self.event('progress', stage=stage, done=done, total=total)
+        else:
+            print(f"\r  {stage}: {done}/{total}", end="\n" if done >= total else "", flush=True)
+
+    def stage(self, stage):
+        """progress(done, total) callback for one stage."""
+        return lambda done, total: self.progress(stage, done, total)
+
+    def messages(self):
+        """Context that keeps the modules' own print output off the JSON stream."""
+        return contextlib.redirect_stdout(sys.stderr) if self.json_mode else contextlib.nullcontext()
+
+
+def failures(failed):
+    return [{'source': src, 'error': str(error)} for src, error in failed]
+
+
+def cmd_yolo_folder(args, reporter):
+    class_mapping = load_class_mapping(args.config)
+    with reporter.messages():
+        result = dataset_ops.build_yolo_folder(args.source, args.test_pct, class_mapping, mode=args.mode,
+                                               jobs=args.jobs, seed=args.seed,
+                                               progress=reporter.stage('transfer'))
+    reporter.event('result', command='yolo-folder', dest=result['dest_root'], train=result['train'],
+                   test=result['test'], failed=failures(result['failed']))
+    return 1 if result['failed'] else 0
+
+
+def cmd_classify(args, reporter):
+    target, result = dataset_ops.classify_images(args.images, args.base_dir, args.main, args.sub,
+                                                 mode=args.mode, jobs=args.jobs,
+                                                 progress=reporter.stage('transfer'))
+    reporter.event('result', command='classify', target=target, transferred=result['transferred'],
+                   failed=failures(result['failed']))
+    return 1 if result['failed'] else 0
+
+
+def cmd_split(args, reporter):
+    ratios = args.ratios + [0.0] * (3 - len(args.ratios))
+    if abs(sum(ratios) - 1.0) >= 1e-6:
+        print("Warning: Split ratios do not sum to 1. Adjusting test ratio.", file=sys.stderr)
+        ratios[2] = 1.0 - ratios[0] - ratios[1]
+
+    # A missing source or one without pairs raises ValueError (error event, exit code 2)
+    with reporter.messages():
+        complete = split.main(progress=reporter.progress, source_dir=args.source, dest_dir=args.dest,
+                              ratios=ratios, stratified=not args.random, seed=args.seed, mode=args.mode,
+                              jobs=args.jobs, resume_run=not args.no_resume, cache_labels=not args.no_label_cache)
+    reporter.event('result', command='split', dest=args.dest, complete=complete)
+    return 0 if complete else 1
+
+
+def cmd_merge(args, reporter):
+    with reporter.messages():
+        folders, operations = merge.plan_merge(args.sources, args.target, dedup=args.dedup,
+                                               max_distance=args.near_distance)
+        if args.plan_report:
+            merge.write_plan_report(operations, args.plan_report)
+    actions = {}
+    for op in operations:
+        actions[op['action']] = actions.get(op['action'], 0) + 1
+    reporter.event('plan', command='merge', folders=len(folders), actions=actions,
+                   duplicates=sum(1 for op in operations if op.get('duplicate_of')))
+    if args.dry_run:
+        reporter.event('result', command='merge', dry_run=True)
+        return 0
+
+    result = merge.execute_plan(folders, operations, args.target, args.mode, args.jobs,
+                                progress=reporter.stage('transfer'))
+    reporter.event('result', command='merge', target=args.target, transferred=result['transferred'],
+                   failed=failures(result['failed']))
+    return 1 if result['failed'] else 0
+
+
+def cmd_convert(args, reporter):
+    class_mapping = load_class_mapping(args.config)
+    extra = dict(item.split('=', 1) for item in args.map)
+    label_map = build_label_map(class_mapping, extra)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for done, directory in enumerate(args.label_dirs, 1):
+            if not os.path.isdir(directory):
+                reporter.event('missing', directory=directory)
+            else:
+                summary = remap_directory(directory, label_map, dry_run=args.dry_run, pool=pool)
+                failed += len(summary['failed'])
+                if reporter.json_mode:
+                    with reporter.messages():
+                        report_errors(summary['errors'])
+                    reporter.event('directory', directory=directory, remapped=summary['remapped'],
+                                   unchanged=summary['unchanged'], skipped=summary['skipped'],
+                                   failed=failures(summary['failed']), malformed=len(summary['errors']),
+                                   before=dict(summary['before']), after=dict(summary['after']))
+                else:
+                    print_remap_report(directory, summary, class_mapping)
+            reporter.progress('directories', done, len(args.label_dirs))
+    reporter.event('result', command='convert', dry_run=args.dry_run, failed=failed)
+    return 1 if failed else 0
+
+
+def ratio(value):
+    """argparse type of one split ratio: a float in [0, 1]."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value}")
+    if not 0.0 <= number <= 1.0:
+        raise argparse.ArgumentTypeError(f"ratio must be between 0 and 1: {value}")
+    return number
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 8,
+                        help="parallel workers (default: one per CPU)")
+    common.add_argument('--json', action='store_true', help="JSON-lines progress and result on stdout")
+
+    transfer = argparse.ArgumentParser(add_help=False)
+    transfer.add_argument('--mode', choices=LINK_MODES, default='copy', help="how files are placed")
+
+    parser = argparse.ArgumentParser(description="Dataset operations of the annotation editor, without a display.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('yolo-folder', parents=[common, transfer],
+                       help="build SRC/analiz/{train,test} and dataset.yaml from images with .txt labels")
+    p.add_argument('source')
+    p.add_argument('--test-pct', type=int, required=True, choices=range(0, 101), metavar='0-100')
+    p.add_argument('--config', default=CONFIG_FILE, help="editor config with the class names")
+    p.add_argument('--seed', type=int)
+    p.set_defaults(func=cmd_yolo_folder)
+
+    p = sub.add_parser('classify', parents=[common, transfer], help="file images under BASE_DIR/MAIN/SUB")
+    p.add_argument('images', nargs='+')
+    p.add_argument('--base-dir', required=True)
+    p.add_argument('--main', required=True)
+    p.add_argument('--sub', required=True)
+    p.set_defaults(func=cmd_classify)
+
+    p = sub.add_parser('split', parents=[common, transfer],
+                       help="split SRC/{images,labels} into DEST/{images,labels}/{train,val,test}")
+    p.add_argument('source')
+    p.add_argument('dest')
+    p.add_argument('--ratios', type=ratio, nargs='+', default=[0.7, 0.3, 0.0], metavar='R',
+                   help="train [val [test]] ratios")
+    p.add_argument('--random', action='store_true', help="plain random split instead of stratified")
+    p.add_argument('--seed', type=int)
+    p.add_argument('--no-resume', action='store_true', help="ignore the plan of an interrupted run")
+    p.add_argument('--no-label-cache', action='store_true')
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser('merge', parents=[common, transfer], help="merge numbered datasets into TARGET")
+    p.add_argument('sources', nargs='+')
+    p.add_argument('--target', required=True)
+    p.add_argument('--dedup', choices=('off', 'flag', 'skip', 'skip-near'), default='off',
+                   help="don't hash (default), flag duplicates in the plan, skip exact ones, or skip near ones too")
+    p.add_argument('--near-distance', type=int, default=DEFAULT_MAX_DISTANCE)
+    p.add_argument('--plan-report', help="write the planned operations as CSV")
+    p.add_argument('--dry-run', action='store_true')
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser('convert', parents=[common], help="rewrite class names in label files as class ids")
+    p.add_argument('label_dirs', nargs='+')
+    p.add_argument('--config', default=CONFIG_FILE, help="editor config with the class names")
+    p.add_argument('--map', action='append', default=[], metavar='NAME=ID', help="extra label, e.g. b1=0")
+    p.add_argument('--dry-run', action='store_true')
+    p.set_defaults(func=cmd_convert)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'split':
+        if len(args.ratios) > 3:
+            parser.error("split: --ratios takes at most three values (train, val, test)")
+        if sum(args.ratios[:2]) > 1.0 + 1e-6:
+            parser.error("split: the train and val ratios add up to more than 1")
+    reporter = Reporter(args.json)
+    try:
+        return args.func(args, reporter)
+    except (OSError, ValueError) as e:
+        reporter.event('error', command=args.command, message=str(e))
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import hashlib
+
+import numpy as np
+from PIL import Image
+
+# dHash grid: DHASH_SIZE x DHASH_SIZE gradient bits -> a 64-bit hash
+DHASH_SIZE = 8
+
+# Near duplicates differ in at most this many dHash bits (0 = exact only)
+DEFAULT_MAX_DISTANCE = 4
+
+
+def pixel_hash(image):
+    """
+    Content hash of an image's RGB pixels (hex). Byte-identical files and
+    re-encodings that decode to the same pixels hash the same.
+    """
+    rgb = image.convert("RGB")
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{rgb.width}x{rgb.height}".encode("ascii"))
+    h.update(rgb.tobytes())
+    return h.hexdigest()
+
+
+def dhash(image, size=DHASH_SIZE):
+    """Difference hash: sign of horizontal gradients of a (size+1) x size grayscale thumbnail, as an int."""
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def image_hashes(image):
+    """(content_hash, dhash) of a PIL image."""
+    return pixel_hash(image), dhash(image)
+
+
+def file_hashes(path):
+    """(content_hash, dhash) of an image file (path or file object), as decoded from disk."""
+    with Image.open(path) as image:
+        image.load()
+        return image_hashes(image)
+
+
+def to_signed64(value):
+    """dHash as a signed 64-bit int (how SQLite stores integers)."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned64(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming_distances(hashes, value):
+    """Bit distance between every hash in a uint64 array and one hash."""
+    diff = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class DuplicateFinder:
+    """
+    In-memory lookup of exact (same content hash) and near (dHash within
+    max_distance bits) duplicates. Near lookups compare against all known
+    hashes in one vectorized pass.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.by_content = {}
+        self.keys = []
+        self._content_hashes = []
+        self._dhashes = []
+        self._array = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, content_hash, dhash_value):
+        self.by_content.setdefault(content_hash, key)
+        self.keys.append(key)
+        self._content_hashes.append(content_hash)
+        self._dhashes.append(to_unsigned64(dhash_value))
+
+    def entries(self):
+        """(key, content_hash, dhash) of everything added, in order."""
+        return list(zip(self.keys, self._content_hashes, self._dhashes))
+
+    def find(self, content_hash, dhash_value):
+        """(key, 'exact' | 'near', distance) of a known duplicate, or None."""
+        key = self.by_content.get(content_hash)
+        if key is not None:
+            return key, 'exact', 0
+        if self.max_distance <= 0 or not self.keys:
+            return None
+        if len(self._array) != len(self._dhashes):
+            self._array = np.array(self._dhashes, dtype=np.uint64)
+        distances = hamming_distances(self._array, to_unsigned64(dhash_value))
+        best = int(np.argmin(distances))
+        if distances[best] <= self.max_distance:
+            return self.keys[best], 'near', int(distances[best])
+        return None
@@ -1,15 +1,34 @@
 import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox, ttk
 import os
-import shutil
-import cv2
-import numpy as np
-from PIL import Image, ImageTk
-import re
 import json
+import time
+import argparse
+from render import ViewportRenderer, ImagePyramid, PyramidCache
+from tile_store import TiledImage
+from prefetch import ImagePrefetcher
+from yolo_labels import read_labels, write_labels, report_errors
+from dataset_index import DatasetIndex
+from dataset_ops import build_yolo_folder, classify_images
+from spatial_index import GridIndex
+from scene import AnnotationScene
+from annotation_store import AnnotationStore
+from instrumentation import Instrumentation
+from background_writer import BackgroundWriter, WriteJob
+from thumbnails import ThumbnailGrid, THUMB_CACHE_DIRNAME
+
+# How often finished background label saves are checked (ms)
+SAVE_POLL_MS = 100
+
+# How often a background full resolution decode is checked (ms)
+FULL_DECODE_POLL_MS = 50
+
+# Memory for decoded tiles of very large (tiled) images
+TILE_CACHE_BYTES = 256 * 1024 * 1024
+
 
 class YOLOAnnotationEditor:
-    def __init__(self, root):
+    def __init__(self, root, instruments=None):
         self.root = root
         self.root.title("YOLO Annotation Editor v1.0")
         self.root.geometry("1200x800")
@@ -20,17 +39,29 @@ class YOLOAnnotationEditor:
         self.current_label_path = None
         self.images_list = []
         self.current_image_index = -1
-        self.annotations = []  # List of dicts: {'class_id': str, 'x_center': float, 'y_center': float, 'width': float, 'height': float}
+        self.annotations = AnnotationStore()  # Columnar boxes; items read like {'class_id': str, 'x_center': float, ...}
+        self.annotations_dirty = False  # Boxes of the current image differ from its label file
         self.selected_annotation_index = -1
+        self.annotation_grid = None  # GridIndex over the current image's boxes (pixel space)
         self.dragging = False
         self.drag_start_x = 0
         self.drag_start_y = 0
         self.class_colors = {}  # Will be populated with random colors for each class
+        self.image_loaded = False
         self.zoom_level = 1.0
         self.pan_offset_x = 0
         self.pan_offset_y = 0
         self.panning = False
         self.class_mapping = {}  # Maps class_id to class_name
+        self.pyramid_cache = PyramidCache()  # Reduced zoom levels shared across images (LRU)
+        self.tile_cache = PyramidCache(TILE_CACHE_BYTES)  # Tiles of very large images (LRU)
+        self.prefetcher = ImagePrefetcher()  # Decodes neighbouring images in the background
+        self.current_entry = None  # PrefetchedImage shown now (may be a reduced decode)
+        self.full_decode = None  # (image path, Future) of the full resolution decode in flight
+        self.tile_conversion = None  # (image path, Future) of the tile conversion in flight
+        self.instruments = instruments or Instrumentation()  # Opt-in stage/event timing (F12)
+        self.label_writer = BackgroundWriter(name="label-writer")  # Atomic label writes off the Tk thread
+        self.pending_label_saves = {}  # label path -> (WriteJob, box count, image path) not reported yet
         self.config_file = "annotation_editor_config.json"
         
         # Load class mapping and configuration
@@ -47,6 +78,10 @@ class YOLOAnnotationEditor:
         # Bind events
         self.bind_events()
         
+        # Report finished background saves; flush everything on exit
+        self.root.after(SAVE_POLL_MS, self.poll_label_saves)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
     def load_config(self):
         """Load configuration if exists, otherwise create default"""
         if os.path.exists(self.config_file):
@@ -115,6 +150,9 @@ class YOLOAnnotationEditor:
         btn_vit = tk.Button(self.toolbar, text="VİT Classify", command=self.open_classification_dialog)
         btn_vit.pack(side=tk.LEFT, padx=2, pady=2)
 
+        btn_thumbs = tk.Button(self.toolbar, text="Thumbnails", command=self.toggle_thumbnails)
+        btn_thumbs.pack(side=tk.LEFT, padx=2, pady=2)
+
 
         
         # Image navigation toolbar
@@ -158,6 +196,11 @@ class YOLOAnnotationEditor:
         self.content_frame = tk.Frame(self.main_frame)
         self.content_frame.pack(fill=tk.BOTH, expand=True)
         
+        # Thumbnail grid of the folder (hidden until toggled); only visible cells are drawn
+        self.thumbnail_grid = ThumbnailGrid(self.content_frame, self.on_thumbnail_select,
+                                            self.thumbnail_label_path, self.get_class_color)
+        self.thumbnails_visible = False
+        
         # Canvas for image display
         self.canvas_frame = tk.Frame(self.content_frame, bd=1, relief=tk.SUNKEN)
         self.canvas_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -166,6 +209,10 @@ class YOLOAnnotationEditor:
         self.canvas = tk.Canvas(self.canvas_frame, bg='gray', cursor="crosshair")
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
+        # Image layer renderer (only the visible viewport is resampled)
+        self.renderer = ViewportRenderer(self.canvas, self.instruments)
+        self.scene = AnnotationScene(self.canvas)
+        
         # Sidebar for annotations list
         self.sidebar_frame = tk.Frame(self.content_frame, width=250)
         self.sidebar_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=5)
@@ -188,38 +235,53 @@ class YOLOAnnotationEditor:
         # Bind listbox selection
         self.annotations_listbox.bind('<<ListboxSelect>>', self.on_annotation_select)
         
-        # Status bar
-        self.status_bar = tk.Label(self.main_frame, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
-        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        # Status bar; the frame-time readout on its right is shown while instrumentation is on
+        status_frame = tk.Frame(self.main_frame)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_bar = tk.Label(status_frame, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.frame_time_label = tk.Label(status_frame, text="", bd=1, relief=tk.SUNKEN, width=28, anchor=tk.E)
+        if self.instruments.enabled:
+            self.frame_time_label.pack(side=tk.RIGHT)
+            self.root.after(250, self.update_frame_readout)
     
     def bind_events(self):
         """Bind events to the canvas and root"""
         # Canvas event bindings
-        self.canvas.bind("<ButtonPress-1>", self.on_canvas_click)
-        self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
-        self.canvas.bind("<ButtonRelease-1>", self.on_canvas_release)
+        # Handlers are wrapped so each run can be timed when instrumentation is on
+        timed = lambda name, handler: self.instruments.wrap_event(name, handler, self.root)
+        self.canvas.bind("<ButtonPress-1>", timed('click', self.on_canvas_click))
+        self.canvas.bind("<B1-Motion>", timed('drag', self.on_canvas_drag))
+        self.canvas.bind("<ButtonRelease-1>", timed('release', self.on_canvas_release))
+        
+        # Re-render the visible region when the canvas is resized
+        self.canvas.bind("<Configure>", timed('resize', self.on_canvas_resize))
         
         # Right click for context menu
         self.canvas.bind("<ButtonPress-3>", self.show_context_menu)
         
         # Middle button (scroll wheel) for panning
         self.canvas.bind("<ButtonPress-2>", self.start_pan)
-        self.canvas.bind("<B2-Motion>", self.pan)
+        self.canvas.bind("<B2-Motion>", timed('pan', self.pan))
         self.canvas.bind("<ButtonRelease-2>", self.end_pan)
         
         # Mouse wheel for zooming
-        self.canvas.bind("<MouseWheel>", self.on_mousewheel)  # Windows
-        self.canvas.bind("<Button-4>", self.on_mousewheel)    # Linux scroll up
-        self.canvas.bind("<Button-5>", self.on_mousewheel)    # Linux scroll down
+        zoom = timed('zoom', self.on_mousewheel)
+        self.canvas.bind("<MouseWheel>", zoom)  # Windows
+        self.canvas.bind("<Button-4>", zoom)    # Linux scroll up
+        self.canvas.bind("<Button-5>", zoom)    # Linux scroll down
         
         # Keyboard shortcuts
-        self.root.bind("<Left>", lambda e: self.prev_image())
-        self.root.bind("<Right>", lambda e: self.next_image())
+        self.root.bind("<Left>", timed('navigate', lambda e: self.prev_image()))
+        self.root.bind("<Right>", timed('navigate', lambda e: self.next_image()))
         self.root.bind("<Delete>", lambda e: self.delete_selected_annotation())
         self.root.bind("<Control-s>", lambda e: self.save_annotations())
         self.root.bind("<Control-o>", lambda e: self.open_folder())
         self.root.bind("<Control-n>", lambda e: self.start_new_annotation())
         self.root.bind("<Escape>", lambda e: self.cancel_new_annotation())
+        self.root.bind("<Control-t>", lambda e: self.toggle_thumbnails())
+        self.root.bind("<F12>", lambda e: self.toggle_instrumentation())
+        self.root.bind("<Shift-F12>", lambda e: self.dump_instrumentation())
     
     def open_folder(self):
         """Open a folder containing images and labels (non-recursive)."""
@@ -227,6 +289,9 @@ class YOLOAnnotationEditor:
         if not folder_path:
             return
 
+        # The current folder is closed: write every unsaved change before switching
+        self.save_all_dirty()
+
         # Görüntü klasörü
         images_folder = os.path.join(folder_path, "images")
         if not os.path.exists(images_folder):
@@ -237,22 +302,21 @@ class YOLOAnnotationEditor:
         if not os.path.exists(labels_folder):
             labels_folder = images_folder
 
-        # ---- Burayı değiştirin: sadece tek dizindeki dosyaları al ----
-        image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-        self.images_list = []
-        for fname in os.listdir(images_folder):
-            full = os.path.join(images_folder, fname)
-            if os.path.isfile(full) and any(fname.lower().endswith(ext) for ext in image_extensions):
-                self.images_list.append(full)
+        # ---- Sadece tek dizindeki dosyaları al (kalıcı indeks üzerinden) ----
+        # Önceki klasörün SQLite bağlantısı kapatılır
+        self.close_dataset_index()
+        self.dataset_index = DatasetIndex(folder_path)
+        self.images_list = [os.path.join(images_folder, fname)
+                            for fname in self.dataset_index.list_images(images_folder)]
         # ----------------------------------------------------------------
 
         if not self.images_list:
             messagebox.showinfo("No Images", f"No images found in {images_folder}")
             return
 
-        self.images_list.sort()
         self.current_image_index = 0
         self.labels_folder = labels_folder
+        self.thumbnail_grid.set_images(self.images_list, os.path.join(folder_path, THUMB_CACHE_DIRNAME))
         self.load_image(self.images_list[0])
 
     
@@ -262,16 +326,12 @@ class YOLOAnnotationEditor:
             messagebox.showerror("Error", f"Image not found: {image_path}")
             return
         
-        # Reset view parameters
-        self.reset_view()
-        
         # Update image path
         self.current_image_path = image_path
         
         # Determine label path
         filename = os.path.basename(image_path)
-        basename = os.path.splitext(filename)[0]
-        self.current_label_path = os.path.join(self.labels_folder, f"{basename}.txt")
+        self.current_label_path = self.label_path_for(image_path)
         
         # Update UI
         self.image_path_label.config(text=image_path)
@@ -279,87 +339,107 @@ class YOLOAnnotationEditor:
         current = self.current_image_index + 1
         self.image_index_var.set(str(current))
         self.total_images_label.config(text=f"/{total}")
+        self.thumbnail_grid.set_current(self.current_image_index)
 
         
         # Load the image
         try:
-            # Use cv2 to load the image for better performance
-            cv_image = cv2.imread(image_path)
-            self.original_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-            self.image_height, self.image_width = self.original_image.shape[:2]
-            
-            # Create a PIL Image
-            self.pil_image = Image.fromarray(self.original_image)
-            self.photo_image = ImageTk.PhotoImage(self.pil_image)
+            # A save of this image's labels may still be queued; read what it writes
+            saving = self.wait_for_label_save(self.current_label_path)
+            
+            # Decoding normally already happened on a prefetch thread. JPEGs are
+            # decoded only as large as the canvas needs; the full image follows
+            # in the background when the user zooms in (ensure_full_resolution)
+            self.prefetcher.fit_size = self.renderer.canvas_size()
+            with self.instruments.stage('load_image.decode'):
+                prefetched = self.prefetcher.get(image_path, self.current_label_path)
+                if saving:
+                    prefetched.load_labels()
+            self.current_entry = prefetched
+            self.image_width, self.image_height = prefetched.full_size
+            self.image_loaded = True
+            
+            # Zoom pyramid; levels are built lazily and cached per (path, mtime).
+            # Very large images come as tiles read on demand for the viewport
+            pyramid_key = (image_path, os.path.getmtime(image_path))
+            with self.instruments.stage('load_image.pyramid'):
+                if prefetched.tiles is not None:
+                    self.pyramid = TiledImage(prefetched.tiles, self.tile_cache)
+                else:
+                    self.pyramid = ImagePyramid(prefetched.pil_image, pyramid_key, self.pyramid_cache,
+                                                full_size=prefetched.full_size)
             
-            # Clear canvas and display image
+            # Clear canvas and hand the image to the viewport renderer
             self.canvas.delete("all")
-            self.canvas_image = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image)
-            
-            # Configure canvas scrolling
-            self.canvas.config(scrollregion=self.canvas.bbox(tk.ALL))
+            self.renderer.reset()
+            self.scene.reset()
+            self.renderer.set_image(self.pyramid)
             
             # Load annotations
-            self.load_annotations()
+            self.load_annotations(prefetched.copy_annotations(), prefetched.labels.errors)
             
             # Update status
-            self.status_bar.config(text=f"Loaded {filename} ({self.image_width}x{self.image_height})")
+            status = f"Loaded {filename} ({self.image_width}x{self.image_height})"
+            if prefetched.tiles_pending:
+                # Converting a very large image takes a while; show the preview meanwhile
+                self.start_tile_conversion()
+                status += " - preview, converting to tiles in the background"
+            elif prefetched.reduced:
+                status += " - reduced preview, full resolution is decoded when zooming in"
+            self.status_bar.config(text=status)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+        
+        # Start decoding the neighbours of this image
+        self.prefetcher.prefetch_around(self.images_list, self.current_image_index, self.label_path_for)
     
-    def load_annotations(self):
-        """Load YOLO format annotations for the current image"""
-        self.annotations = []
+    def label_path_for(self, image_path):
+        """Label file path for an image in the current folder"""
+        basename = os.path.splitext(os.path.basename(image_path))[0]
+        return os.path.join(self.labels_folder, f"{basename}.txt")
+    
+    def load_annotations(self, annotations=None, errors=None):
+        """Load YOLO format annotations for the current image.
+        
+        If annotations is given (an AnnotationStore already parsed, e.g. by
+        the prefetcher) the label file is not read again; errors are the
+        malformed lines found while parsing it.
+        """
+        self.annotations = AnnotationStore()
+        self.annotations_dirty = False
         self.selected_annotation_index = -1
+        self.rebuild_annotation_grid()
         
         # Clear annotations listbox
         self.annotations_listbox.delete(0, tk.END)
         
-        if not os.path.exists(self.current_label_path):
+        if not annotations and not os.path.exists(self.current_label_path):
             self.status_bar.config(text=f"No label file found. Will create new file when saved.")
             self.update_canvas()
             return
         
         try:
-            with open(self.current_label_path, 'r') as f:
-                lines = f.readlines()
-                
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                parts = line.split()
-                if len(parts) < 5:
-                    continue
-                
-                class_id = parts[0]
-                x_center = float(parts[1])
-                y_center = float(parts[2])
-                width = float(parts[3])
-                height = float(parts[4])
-                
-                # Ensure values are within range [0, 1]
-                x_center = max(0, min(1, x_center))
-                y_center = max(0, min(1, y_center))
-                width = max(0, min(1, width))
-                height = max(0, min(1, height))
-                
-                self.annotations.append({
-                    'class_id': class_id,
-                    'x_center': x_center,
-                    'y_center': y_center,
-                    'width': width,
-                    'height': height
-                })
+            if annotations is None:
+                with self.instruments.stage('load_annotations.parse'):
+                    labels = read_labels(self.current_label_path)
+                    annotations, errors = AnnotationStore.from_labels(labels), labels.errors
+            # Ensure values are within range [0, 1]
+            annotations.clamp()
+            self.annotations = annotations
+            self.rebuild_annotation_grid()
             
             # Update the annotations listbox
-            self.update_annotations_listbox()
+            with self.instruments.stage('load_annotations.listbox'):
+                self.update_annotations_listbox()
             
             # Update canvas
             self.update_canvas()
             
-            self.status_bar.config(text=f"Loaded {len(self.annotations)} annotations from {os.path.basename(self.current_label_path)}")
+            status = f"Loaded {len(self.annotations)} annotations from {os.path.basename(self.current_label_path)}"
+            if errors:
+                report_errors(errors)
+                status += f" ({len(errors)} malformed lines skipped, first at line {errors[0].line_no})"
+            self.status_bar.config(text=status)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load annotations: {str(e)}")
     
@@ -367,99 +447,173 @@ class YOLOAnnotationEditor:
         """Update the annotations listbox with current annotations"""
         self.annotations_listbox.delete(0, tk.END)
         
-        for i, annotation in enumerate(self.annotations):
-            class_id = annotation['class_id']
-            class_name = self.class_mapping.get(class_id, class_id)
-            x_center = annotation['x_center']
-            y_center = annotation['y_center']
-            width = annotation['width']
-            height = annotation['height']
-            
-            # Calculate absolute coordinates for better display
-            abs_width = int(width * self.image_width)
-            abs_height = int(height * self.image_height)
-            
-            self.annotations_listbox.insert(tk.END, f"{class_name} ({abs_width}x{abs_height})")
-            
-            # Set background color for the annotation in the listbox
-            color = self.get_class_color(class_id)
-            hex_color = "#{:02x}{:02x}{:02x}".format(*color)
-            self.annotations_listbox.itemconfig(i, bg=hex_color)
+        store = self.annotations
+        names = [self.class_mapping.get(cid, cid) for cid in store.class_ids]
+        colors = ["#{:02x}{:02x}{:02x}".format(*self.get_class_color(cid)) for cid in store.class_ids]
+        sizes = (store.boxes[:, 2:] * (self.image_width, self.image_height)).astype(int).tolist()
+        codes = store.codes.tolist()
+        
+        self.annotations_listbox.insert(tk.END, *[
+            f"{names[code]} ({abs_width}x{abs_height})" for code, (abs_width, abs_height) in zip(codes, sizes)])
+        for i, code in enumerate(codes):
+            self.annotations_listbox.itemconfig(i, bg=colors[code])
     
-    def update_canvas(self):
-        """Update the canvas with current annotations"""
-        # Clear all annotation objects on canvas
-        self.canvas.delete("annotation")
+    def insert_listbox_entry(self, index):
+        """Insert the listbox row of one annotation at its position"""
+        annotation = self.annotations[index]
+        class_id = annotation['class_id']
+        class_name = self.class_mapping.get(class_id, class_id)
+        
+        # Calculate absolute coordinates for better display
+        abs_width = int(annotation['width'] * self.image_width)
+        abs_height = int(annotation['height'] * self.image_height)
+        
+        self.annotations_listbox.insert(index, f"{class_name} ({abs_width}x{abs_height})")
+        
+        # Set background color for the annotation in the listbox
+        color = self.get_class_color(class_id)
+        hex_color = "#{:02x}{:02x}{:02x}".format(*color)
+        self.annotations_listbox.itemconfig(index, bg=hex_color)
+    
+    def refresh_listbox_entry(self, index):
+        """Rewrite the listbox row of one annotation, keeping the selection"""
+        selected = index in self.annotations_listbox.curselection()
+        self.annotations_listbox.delete(index)
+        self.insert_listbox_entry(index)
+        if selected:
+            self.annotations_listbox.selection_set(index)
+    
+    def update_canvas(self, interactive=False):
+        """Update the canvas with the image layer and current annotations"""
+        if not self.image_loaded:
+            self.scene.clear()
+            return
+        
+        with self.instruments.stage('update_canvas.image'):
+            self.render_image_layer(interactive)
+        with self.instruments.stage('update_canvas.items'):
+            self.draw_annotations()
+    
+    def render_image_layer(self, interactive=False):
+        """Redraw the visible part of the image for the current zoom and pan.
         
-        if not hasattr(self, 'original_image'):
+        Interactive renders (wheel, pan) use a fast resampler and are refined
+        with LANCZOS once the interaction goes idle.
+        """
+        if not self.image_loaded:
             return
         
-        # Apply zoom
         display_width = int(self.image_width * self.zoom_level)
         display_height = int(self.image_height * self.zoom_level)
         
-        # Resize the image
-        if self.zoom_level != 1.0:
-            resized_image = self.pil_image.resize((display_width, display_height), Image.LANCZOS)
-            self.photo_image = ImageTk.PhotoImage(resized_image)
-            self.canvas.itemconfig(self.canvas_image, image=self.photo_image)
-        else:
-            self.photo_image = ImageTk.PhotoImage(self.pil_image)
-            self.canvas.itemconfig(self.canvas_image, image=self.photo_image)
+        # Only the region inside the canvas is cropped and resampled
+        self.renderer.render(self.zoom_level, self.pan_offset_x, self.pan_offset_y, interactive=interactive)
+        self.ensure_full_resolution()
         
         # Update canvas size
-        self.canvas.coords(self.canvas_image, self.pan_offset_x, self.pan_offset_y)
         self.canvas.config(scrollregion=(0, 0, display_width + self.pan_offset_x, display_height + self.pan_offset_y))
         
         # Update zoom label
         self.zoom_label.config(text=f"{int(self.zoom_level * 100)}%")
+    
+    def ensure_full_resolution(self):
+        """Decode the full image in the background once the zoom exceeds a reduced decode."""
+        if not self.pyramid.needs_full(self.zoom_level):
+            return
+        if self.current_entry is not None and self.current_entry.tiles_pending:
+            return  # Too large to decode whole; the tiles replace the preview
+        if self.full_decode is not None and self.full_decode[0] == self.current_image_path:
+            return
+        self.full_decode = (self.current_image_path, self.prefetcher.load_full(self.current_image_path))
+        self.root.after(FULL_DECODE_POLL_MS, self.check_full_resolution)
+    
+    def check_full_resolution(self):
+        """Swap the full resolution image in when its background decode is done."""
+        if self.full_decode is None:
+            return
+        image_path, future = self.full_decode
+        if not future.done():
+            self.root.after(FULL_DECODE_POLL_MS, self.check_full_resolution)
+            return
+        self.full_decode = None
+        if image_path != self.current_image_path or future.cancelled():
+            return
+        try:
+            image = future.result()
+        except IOError as e:
+            self.status_bar.config(text=f"Full resolution decode failed: {e}")
+            return
+        self.pyramid.set_full(image)
+        self.prefetcher.upgrade(self.current_entry, image)
+        self.renderer.invalidate()
+        self.render_image_layer()
+    
+    def start_tile_conversion(self):
+        """Convert the current very large image to tiles on the prefetch pool."""
+        if self.tile_conversion is not None and self.tile_conversion[0] == self.current_image_path:
+            return
+        self.tile_conversion = (self.current_image_path, self.prefetcher.load_tiles(self.current_image_path))
+        self.root.after(FULL_DECODE_POLL_MS, self.check_tile_conversion)
+    
+    def check_tile_conversion(self):
+        """Show the tiles instead of the preview once the conversion is done."""
+        if self.tile_conversion is None:
+            return
+        image_path, future = self.tile_conversion
+        if not future.done():
+            self.root.after(FULL_DECODE_POLL_MS, self.check_tile_conversion)
+            return
+        self.tile_conversion = None
+        if image_path != self.current_image_path or future.cancelled():
+            return
+        try:
+            store = future.result()
+        except (OSError, ValueError, MemoryError) as e:
+            self.status_bar.config(text=f"Tile conversion failed: {e}")
+            return
+        self.prefetcher.attach_tiles(self.current_entry, store)
+        self.pyramid = TiledImage(store, self.tile_cache)
+        self.renderer.set_image(self.pyramid)
+        self.render_image_layer()
+        self.status_bar.config(text=f"Loaded {os.path.basename(image_path)} ({self.image_width}x{self.image_height})")
+    
+    def on_canvas_resize(self, event):
+        """Re-render the image layer when the canvas size changes"""
+        self.render_image_layer()
+    
+    def draw_annotations(self):
+        """Bring the annotation overlays up to date without touching the image layer.
+        
+        Canvas items are kept per annotation; only the ones whose box, class
+        or selection changed are reconfigured.
+        """
+        if not self.image_loaded:
+            self.scene.clear()
+            return
         
-        # Draw annotations
-        for i, annotation in enumerate(self.annotations):
-            class_id = annotation['class_id']
-            x_center = annotation['x_center'] * self.image_width * self.zoom_level
-            y_center = annotation['y_center'] * self.image_height * self.zoom_level
-            width = annotation['width'] * self.image_width * self.zoom_level
-            height = annotation['height'] * self.image_height * self.zoom_level
-            
-            # Calculate absolute coordinates
-            x1 = x_center - width/2 + self.pan_offset_x
-            y1 = y_center - height/2 + self.pan_offset_y
-            x2 = x_center + width/2 + self.pan_offset_x
-            y2 = y_center + height/2 + self.pan_offset_y
-            
-            # Get color for this class
-            color = self.get_class_color(class_id)
-            hex_color = "#{:02x}{:02x}{:02x}".format(*color)
-            
-            # Draw rectangle
-            outline_width = 3 if i == self.selected_annotation_index else 2
-            rectangle_id = self.canvas.create_rectangle(
-                x1, y1, x2, y2,
-                outline=hex_color,
-                width=outline_width,
-                tags=("annotation", f"box_{i}")
-            )
-            
-            # Get class label (name or ID)
-            class_label = self.class_mapping.get(class_id, class_id)
-            
-            # Draw label background
-            text_bg = self.canvas.create_rectangle(
-                x1, y1 - 20, x1 + len(class_label) * 8, y1,
-                fill=hex_color,
-                outline="",
-                tags=("annotation", f"label_bg_{i}")
-            )
-            
-            # Draw label text
-            text_id = self.canvas.create_text(
-                x1 + 5, y1 - 10,
-                text=class_label,
-                fill="white",
-                anchor=tk.W,
-                tags=("annotation", f"text_{i}")
-            )
+        store = self.annotations
+        colors = ["#{:02x}{:02x}{:02x}".format(*self.get_class_color(cid)) for cid in store.class_ids]
+        labels = [self.class_mapping.get(cid, cid) for cid in store.class_ids]
+        boxes = store.pixel_boxes(self.image_width, self.image_height).tolist()
+        entries = [(tuple(box), colors[code], labels[code], 2)
+                   for box, code in zip(boxes, store.codes.tolist())]
+        if 0 <= self.selected_annotation_index < len(entries):
+            box, color, label, _ = entries[self.selected_annotation_index]
+            entries[self.selected_annotation_index] = (box, color, label, 3)
+        self.scene.sync(entries, self.zoom_level, self.pan_offset_x, self.pan_offset_y)
+    
+    def draw_annotation(self, index):
+        """Redraw a single annotation, e.g. while it is being dragged"""
+        self.scene.update(index, self.annotation_scene_entry(index))
+    
+    def annotation_scene_entry(self, index):
+        """(box, color, label, outline width) of an annotation for the scene layer"""
+        annotation = self.annotations[index]
+        class_id = annotation['class_id']
+        hex_color = "#{:02x}{:02x}{:02x}".format(*self.get_class_color(class_id))
+        outline_width = 3 if index == self.selected_annotation_index else 2
+        class_label = self.class_mapping.get(class_id, class_id)
+        return self.annotation_pixel_box(index), hex_color, class_label, outline_width
     
     def get_class_color(self, class_id):
         """Get a consistent color for a class ID"""
@@ -476,13 +630,13 @@ class YOLOAnnotationEditor:
         """Handle selection of an annotation in the listbox"""
         if not self.annotations_listbox.curselection():
             self.selected_annotation_index = -1
-            self.update_canvas()
+            self.draw_annotations()
             return
         
         self.selected_annotation_index = self.annotations_listbox.curselection()[0]
         
         # Update canvas to highlight selected annotation
-        self.update_canvas()
+        self.draw_annotations()
         
         # Show some details in status bar
         if 0 <= self.selected_annotation_index < len(self.annotations):
@@ -493,7 +647,7 @@ class YOLOAnnotationEditor:
     
     def on_canvas_click(self, event):
         """Handle click on canvas"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             return
 
         # Convert event coords → image coords
@@ -522,7 +676,7 @@ class YOLOAnnotationEditor:
             self.dragging = True
             self.drag_start_x = image_x
             self.drag_start_y = image_y
-            self.update_canvas()
+            self.draw_annotations()
         else:
             # Not over an existing box → do nothing until user presses Add Annotation
             return
@@ -530,7 +684,7 @@ class YOLOAnnotationEditor:
     
     def on_canvas_drag(self, event):
         """Handle drag on canvas"""
-        if not hasattr(self, 'original_image') or not self.dragging:
+        if not self.image_loaded or not self.dragging:
             return
         
         # Convert event coordinates to image coordinates, accounting for zoom and pan
@@ -595,13 +749,15 @@ class YOLOAnnotationEditor:
             
             annotation['x_center'] = new_x_center
             annotation['y_center'] = new_y_center
+            self.annotations_dirty = True
+            self.index_annotation(self.selected_annotation_index)
             
             # Update drag start point
             self.drag_start_x = image_x
             self.drag_start_y = image_y
             
-            # Update canvas
-            self.update_canvas()
+            # Only the dragged box moves
+            self.draw_annotation(self.selected_annotation_index)
     
     def on_canvas_release(self, event):
         """Handle release on canvas"""
@@ -648,9 +804,11 @@ class YOLOAnnotationEditor:
                                 'width': width,
                                 'height': height
                             })
+                            self.annotations_dirty = True
+                            self.index_annotation(len(self.annotations) - 1)
                             
                             # Update UI
-                            self.update_annotations_listbox()
+                            self.insert_listbox_entry(len(self.annotations) - 1)
                             self.selected_annotation_index = len(self.annotations) - 1
                             self.annotations_listbox.selection_clear(0, tk.END)
                             self.annotations_listbox.selection_set(self.selected_annotation_index)
@@ -664,7 +822,7 @@ class YOLOAnnotationEditor:
                 # Böylece yeni etiketleme modu kapanmıyor, üst üste çizmeye devam edebilirsiniz.
 
                 # Update canvas
-                self.update_canvas()
+                self.draw_annotations()
 
     
     def prompt_for_class(self):
@@ -858,27 +1016,42 @@ class YOLOAnnotationEditor:
         # Set focus on the ID entry
         id_entry.focus_set()
         
+    def annotation_pixel_box(self, index):
+        """(x1, y1, x2, y2) of an annotation in image pixels"""
+        return self.annotations.pixel_box(index, self.image_width, self.image_height)
+    
+    def rebuild_annotation_grid(self):
+        """Index all annotations of the current image for hit-testing"""
+        if not hasattr(self, 'image_width'):
+            self.annotation_grid = None
+            return
+        self.annotation_grid = GridIndex(self.image_width, self.image_height)
+        boxes = self.annotations.pixel_boxes(self.image_width, self.image_height).tolist()
+        for i, box in enumerate(boxes):
+            self.annotation_grid.insert(i, *box)
+    
+    def index_annotation(self, index):
+        """Add or move one annotation in the hit-test grid"""
+        if self.annotation_grid is None:
+            self.rebuild_annotation_grid()
+            return
+        self.annotation_grid.update(index, *self.annotation_pixel_box(index))
+    
     def find_annotation_at_point(self, x, y):
-        """Find if a point is inside an annotation"""
-        for i, annotation in enumerate(self.annotations):
-            x_center = annotation['x_center'] * self.image_width
-            y_center = annotation['y_center'] * self.image_height
-            width = annotation['width'] * self.image_width
-            height = annotation['height'] * self.image_height
-            
-            x1 = x_center - width/2
-            y1 = y_center - height/2
-            x2 = x_center + width/2
-            y2 = y_center + height/2
-            
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                return i
-        
-        return None
+        """Find the annotation under a point (image pixels).
+        
+        Where boxes overlap the smallest one wins, so a small box inside a
+        large one can still be selected.
+        """
+        if self.annotation_grid is None or len(self.annotation_grid.boxes) != len(self.annotations):
+            self.rebuild_annotation_grid()
+            if self.annotation_grid is None:
+                return None
+        return self.annotation_grid.smallest_at(x, y)
     
     def start_new_annotation(self):
         """Start creating a new annotation"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             messagebox.showinfo("No Image", "Please open an image first")
             return
         
@@ -903,59 +1076,131 @@ class YOLOAnnotationEditor:
         
         # Delete the annotation
         del self.annotations[self.selected_annotation_index]
+        self.annotations_dirty = True
+        if self.annotation_grid is not None:
+            self.annotation_grid.delete_index(self.selected_annotation_index)
+        self.scene.remove(self.selected_annotation_index)
         
         # Update UI
-        self.update_annotations_listbox()
+        self.annotations_listbox.delete(self.selected_annotation_index)
         self.selected_annotation_index = -1
-        self.update_canvas()
+        self.draw_annotations()
         
         self.status_bar.config(text="Annotation deleted")
     
     def save_annotations(self):
-        """Save annotations only if there is at least one box."""
+        """Save annotations only if there is at least one box (written in the background)."""
         if not self.current_label_path:
             messagebox.showinfo("No Label", "No label file path available")
             return
 
-        # Eğer hiç annotation yoksa, varsa eski .txt'i sil, yoksa geç
-        if len(self.annotations) == 0:
-            if os.path.exists(self.current_label_path):
-                try:
-                    os.remove(self.current_label_path)
-                    self.status_bar.config(
-                        text=f"No annotations—removed empty file {os.path.basename(self.current_label_path)}"
-                    )
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to remove empty label file: {e}")
-            else:
-                self.status_bar.config(text="No annotations—nothing to save")
+        # Eğer hiç annotation yoksa ve dosya da yoksa yazılacak bir şey yok
+        if (len(self.annotations) == 0 and not os.path.exists(self.current_label_path)
+                and self.current_label_path not in self.pending_label_saves):
+            self.annotations_dirty = False
+            self.status_bar.config(text="No annotations—nothing to save")
             return
 
-        # Etiket varsa, varolan dosyayı (veya yeni klasörü) oluşturup yaz
-        try:
-            os.makedirs(os.path.dirname(self.current_label_path), exist_ok=True)
-            with open(self.current_label_path, 'w') as f:
-                for ann in self.annotations:
-                    cid = ann['class_id']
-                    xc  = max(0, min(1, ann['x_center']))
-                    yc  = max(0, min(1, ann['y_center']))
-                    w   = max(0, min(1, ann['width']))
-                    h   = max(0, min(1, ann['height']))
-                    f.write(f"{cid} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n")
-            self.status_bar.config(
-                text=f"Saved {len(self.annotations)} annotations to {os.path.basename(self.current_label_path)}"
-            )
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save annotations: {e}")
+        self.queue_label_save()
+        self.status_bar.config(text=f"Saving {len(self.annotations)} annotations to "
+                                    f"{os.path.basename(self.current_label_path)}...")
+
+    def save_if_dirty(self):
+        """Queue a save of the current image's annotations if they were changed."""
+        if self.annotations_dirty and self.current_label_path:
+            self.queue_label_save()
+
+    def queue_label_save(self):
+        """Snapshot the current annotations and hand them to the background writer."""
+        path = self.current_label_path
+        class_ids, boxes = self.annotations.label_arrays()
+        pending = self.pending_label_saves.get(path)
+        if pending is not None:
+            # A newer snapshot makes a still queued one pointless
+            self.label_writer.cancel(pending[0])
+        job = self.label_writer.submit(self.write_label_file, path, class_ids, boxes.copy(), description=path)
+        self.pending_label_saves[path] = (job, len(class_ids), self.current_image_path)
+        self.annotations_dirty = False
+
+    def write_label_file(self, path, class_ids, boxes):
+        """Write (or, without boxes, remove) a label file. Runs on the writer thread."""
+        with self.instruments.stage('save_annotations.write'):
+            if len(class_ids) == 0:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Every field is clipped to [0, 1]; temp file + rename, so readers never see half a file
+            write_labels(path, class_ids, boxes, atomic=True)
+
+    def wait_for_label_save(self, path):
+        """Block until a queued save of path is written. Returns True if there was one."""
+        pending = self.pending_label_saves.get(path)
+        if pending is None:
+            return False
+        pending[0].wait()
+        return True
+
+    def poll_label_saves(self, reschedule=True):
+        """Report finished background saves on the Tk thread and keep the dataset index in sync."""
+        for path, (job, count, image_path) in list(self.pending_label_saves.items()):
+            if not job.finished:
+                continue
+            del self.pending_label_saves[path]
+            name = os.path.basename(path)
+            if job.state == WriteJob.DONE:
+                self.update_index_entry(path)
+                self.thumbnail_grid.refresh(image_path)
+                if path == self.current_label_path:
+                    self.status_bar.config(text=f"Saved {count} annotations to {name}" if count
+                                           else f"No annotations—removed empty file {name}")
+            elif job.state == WriteJob.FAILED:
+                if path == self.current_label_path:
+                    self.annotations_dirty = True  # Try again with the next save
+                messagebox.showerror("Error", f"Failed to save annotations to {path}: {job.error}")
+        # Failures were handled above through the job states
+        while not self.label_writer.errors.empty():
+            self.label_writer.errors.get()
+        if reschedule:
+            self.root.after(SAVE_POLL_MS, self.poll_label_saves)
 
+    def save_all_dirty(self):
+        """Write every unsaved change and wait for it, e.g. before the folder is closed."""
+        self.save_if_dirty()
+        pending = len(self.pending_label_saves)
+        if pending:
+            self.status_bar.config(text=f"Writing {pending} label files...")
+            self.status_bar.update_idletasks()
+        self.label_writer.flush()
+        self.poll_label_saves(reschedule=False)
+
+    def on_close(self):
+        """Flush pending label writes, then close the window."""
+        self.save_all_dirty()
+        self.label_writer.close()
+        self.close_dataset_index()
+        self.root.destroy()
+
+    def close_dataset_index(self):
+        """Close the SQLite connection of the current folder's dataset index"""
+        index = getattr(self, 'dataset_index', None)
+        if index is not None:
+            index.close()
+            self.dataset_index = None
+
+    def update_index_entry(self, path):
+        """Keep the dataset index in sync with a file the editor wrote or removed"""
+        index = getattr(self, 'dataset_index', None)
+        if index is not None:
+            index.update_file(path)
     
     def prev_image(self):
         """Load the previous image in the list"""
         if not self.images_list or self.current_image_index <= 0:
             return
         
-        # Save current annotations
-        self.save_annotations()
+        # Save current annotations (only if they were changed)
+        self.save_if_dirty()
         
         # Load previous image
         self.current_image_index -= 1
@@ -966,8 +1211,8 @@ class YOLOAnnotationEditor:
         if not self.images_list or self.current_image_index >= len(self.images_list) - 1:
             return
         
-        # Save current annotations
-        self.save_annotations()
+        # Save current annotations (only if they were changed)
+        self.save_if_dirty()
         
         # Load next image
         self.current_image_index += 1
@@ -1239,7 +1484,7 @@ class YOLOAnnotationEditor:
     
     def show_context_menu(self, event):
         """Show context menu on right click"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             return
         
         # Convert event coordinates to image coordinates
@@ -1258,7 +1503,7 @@ class YOLOAnnotationEditor:
             self.annotations_listbox.selection_clear(0, tk.END)
             self.annotations_listbox.selection_set(annotation_idx)
             self.annotations_listbox.see(annotation_idx)
-            self.update_canvas()
+            self.draw_annotations()
             
             # Menu for annotation
             annotation = self.annotations[annotation_idx]
@@ -1271,6 +1516,8 @@ class YOLOAnnotationEditor:
             # Change class
             context_menu.add_command(label="Change Class", 
                                     command=lambda: self.change_annotation_class(annotation_idx))
+            context_menu.add_command(label=f"Change Class of All '{class_name}'",
+                                    command=lambda: self.reassign_annotation_class(class_id))
             
             # Delete annotation
             context_menu.add_command(label="Delete Annotation", 
@@ -1308,13 +1555,30 @@ class YOLOAnnotationEditor:
         if new_class_id is not None and new_class_id != current_class_id:
             # Update annotation
             annotation['class_id'] = new_class_id
+            self.annotations_dirty = True
             
             # Update UI
-            self.update_annotations_listbox()
-            self.update_canvas()
+            self.refresh_listbox_entry(annotation_idx)
+            self.draw_annotation(annotation_idx)
             
             self.status_bar.config(text=f"Changed annotation class from {current_class_id} to {new_class_id}")
     
+    def reassign_annotation_class(self, class_id):
+        """Change the class of every annotation of class_id on this image"""
+        new_class_id = self.prompt_for_class()
+        
+        if new_class_id is not None and new_class_id != class_id:
+            changed = self.annotations.reassign_class(class_id, new_class_id)
+            self.annotations_dirty = self.annotations_dirty or changed > 0
+            
+            # Update UI
+            self.update_annotations_listbox()
+            if 0 <= self.selected_annotation_index < len(self.annotations):
+                self.annotations_listbox.selection_set(self.selected_annotation_index)
+            self.draw_annotations()
+            
+            self.status_bar.config(text=f"Changed {changed} annotations from {class_id} to {new_class_id}")
+    
     def start_pan(self, event):
         """Start panning the image"""
         self.panning = True
@@ -1339,7 +1603,7 @@ class YOLOAnnotationEditor:
         self.pan_start_y = event.y
         
         # Update the canvas
-        self.update_canvas()
+        self.update_canvas(interactive=True)
     
     def end_pan(self, event):
         """End panning the image"""
@@ -1347,7 +1611,7 @@ class YOLOAnnotationEditor:
     
     def on_mousewheel(self, event):
         """Handle mousewheel event for zooming"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             return
         
         # Determine scroll direction
@@ -1358,23 +1622,23 @@ class YOLOAnnotationEditor:
     
     def zoom_in(self):
         """Zoom in on the image"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             return
         
         self.zoom_level = min(5.0, self.zoom_level * 1.2)
-        self.update_canvas()
+        self.update_canvas(interactive=True)
     
     def zoom_out(self):
         """Zoom out from the image"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             return
         
         self.zoom_level = max(0.1, self.zoom_level / 1.2)
-        self.update_canvas()
+        self.update_canvas(interactive=True)
     
     def reset_view(self):
         """Reset the view to default"""
-        if not hasattr(self, 'original_image'):
+        if not self.image_loaded:
             return
         
         self.zoom_level = 1.0
@@ -1397,11 +1661,64 @@ class YOLOAnnotationEditor:
             self.image_index_var.set(str(self.current_image_index + 1))
             return
 
-        # Mevcut annot’ları kaydet ve yeni resme atla
-        self.save_annotations()
+        # Değiştiyse mevcut annot’ları kaydet ve yeni resme atla
+        self.save_if_dirty()
         self.current_image_index = idx
         self.load_image(self.images_list[idx])
 
+    def toggle_thumbnails(self):
+        """Show or hide the thumbnail grid beside the image (Ctrl+T)"""
+        if self.thumbnails_visible:
+            self.thumbnail_grid.pack_forget()
+            self.thumbnail_grid.set_active(False)
+        else:
+            self.thumbnail_grid.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 5), before=self.canvas_frame)
+            self.thumbnail_grid.set_active(True)
+            self.thumbnail_grid.set_current(self.current_image_index)
+        self.thumbnails_visible = not self.thumbnails_visible
+
+    def thumbnail_label_path(self, image_path):
+        """Label file drawn on a thumbnail (called from thumbnail worker threads)"""
+        if not hasattr(self, 'labels_folder'):
+            return None
+        return self.label_path_for(image_path)
+
+    def on_thumbnail_select(self, index):
+        """Jump to the image of a clicked thumbnail"""
+        if index == self.current_image_index:
+            return
+        self.save_if_dirty()
+        self.current_image_index = index
+        self.load_image(self.images_list[index])
+
+    def toggle_instrumentation(self):
+        """Switch stage/event timing and the frame-time readout on or off (F12)"""
+        self.instruments.enabled = not self.instruments.enabled
+        if self.instruments.enabled:
+            self.instruments.reset()
+            self.frame_time_label.pack(side=tk.RIGHT)
+            self.update_frame_readout()
+            self.status_bar.config(text="Instrumentation on (Shift+F12 writes a report)")
+        else:
+            self.frame_time_label.pack_forget()
+            self.status_bar.config(text="Instrumentation off")
+
+    def update_frame_readout(self):
+        """Refresh the frame-time readout a few times per second while instrumentation is on"""
+        if not self.instruments.enabled:
+            return
+        self.frame_time_label.config(text=self.instruments.readout())
+        self.root.after(250, self.update_frame_readout)
+
+    def dump_instrumentation(self, prefix=None):
+        """Write the latency summary (JSON) and a Chrome trace of the session so far (Shift+F12)"""
+        prefix = prefix or time.strftime("editor_profile_%Y%m%d_%H%M%S")
+        try:
+            self.instruments.dump_summary(prefix + "_summary.json")
+            count = self.instruments.dump_trace(prefix + "_trace.json")
+            self.status_bar.config(text=f"Wrote {prefix}_summary.json and {prefix}_trace.json ({count} events)")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to write the profile: {e}")
 
     def create_yolo_folder(self):
         # 2.1 Kaynak klasörü sor
@@ -1414,70 +1731,18 @@ class YOLOAnnotationEditor:
         if pct is None:
             return
 
-        # 2.3 Hedef kök klasörü: src_dir/analiz
-        dest_root = os.path.join(src_dir, "analiz")
-        subdirs = [
-            ("train", "images"),
-            ("train", "labels"),
-            ("test",  "images"),
-            ("test",  "labels"),
-        ]
-        for d1, d2 in subdirs:
-            os.makedirs(os.path.join(dest_root, d1, d2), exist_ok=True)
-
-        # 2.4 Dosyaları topla ve karıştır
-        # 2.4 Sadece .txt’si olan resimleri topla ve karıştır
-        exts = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
-        all_imgs = []
-        for f in os.listdir(src_dir):
-            if f.lower().endswith(exts):
-                base = os.path.splitext(f)[0]
-                txt_path = os.path.join(src_dir, base + ".txt")
-                # Sadece .txt dosyası varsa ekle
-                if os.path.exists(txt_path):
-                    all_imgs.append(f)
-
-        if not all_imgs:
+        # 2.3 src_dir/analiz altında sınıf oranlarını koruyarak böl, paralel kopyala, dataset.yaml yaz
+        try:
+            result = build_yolo_folder(src_dir, pct, self.class_mapping)
+        except ValueError:
             messagebox.showwarning("No Labeled Images",
                 "No image–label pairs found. Please make sure your source folder\n"
                 "contains both images and same-named .txt files.")
             return
 
-        np.random.shuffle(all_imgs)
-        split_idx = int(len(all_imgs) * (100 - pct) / 100)
-        splits = {
-            "train": all_imgs[:split_idx],
-            "test":  all_imgs[split_idx:]
-        }
-
-
-        # 2.5 Kopyala
-        for split, files in splits.items():
-            for img in files:
-                base = os.path.splitext(img)[0]
-                src_img = os.path.join(src_dir, img)
-                src_txt = os.path.join(src_dir, base + ".txt")
-
-                dst_img = os.path.join(dest_root, split, "images", img)
-                shutil.copy2(src_img, dst_img)
-
-                if os.path.exists(src_txt):
-                    dst_txt = os.path.join(dest_root, split, "labels", base + ".txt")
-                    shutil.copy2(src_txt, dst_txt)
-
-        # 2.6 dataset.yaml oluştur
-        yaml_path = os.path.join(dest_root, "dataset.yaml")
-        nc = len(self.class_mapping)
-        names = [self.class_mapping[k] for k in sorted(self.class_mapping.keys(), key=lambda x: int(x) if str(x).isdigit() else x)]
-        with open(yaml_path, "w") as f:
-            f.write(f"train: {os.path.join('analiz','train','images')}\n")
-            f.write(f"val:   {os.path.join('analiz','test','images')}\n")
-            f.write(f"nc: {nc}\n")
-            f.write("names:\n")
-            for i,name in enumerate(names):
-                f.write(f"  {i}: {name}\n")
-
-        messagebox.showinfo("Done", f"YOLO folders created in:\n{dest_root}")
+        if result['failed']:
+            messagebox.showwarning("Copy Errors", "\n".join(f"{src}: {e}" for src, e in result['failed'][:20]))
+        messagebox.showinfo("Done", f"YOLO folders created in:\n{result['dest_root']}")
     
     def load_classification_config(self):
         """Load or initialize classification categories."""
@@ -1585,13 +1850,12 @@ class YOLOAnnotationEditor:
         base_dir = getattr(self, 'dataset_folder', None)
         if not base_dir:
             base_dir = os.path.dirname(self.current_image_path)
-        target = os.path.join(base_dir, main, sub)
-        os.makedirs(target, exist_ok=True)
 
         # Resmi kopyala
-        dst = os.path.join(target, os.path.basename(self.current_image_path))
         try:
-            shutil.copy2(self.current_image_path, dst)
+            target, result = classify_images([self.current_image_path], base_dir, main, sub)
+            if result['failed']:
+                raise result['failed'][0][1]
             messagebox.showinfo("Classified", f"Copied to {target}")
         except Exception as e:
             messagebox.showerror("Error", f"Copy failed: {e}")
@@ -1602,9 +1866,27 @@ class YOLOAnnotationEditor:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="YOLO annotation editor")
+    parser.add_argument('--profile', action='store_true',
+                        help="time stages and events from the start (F12 toggles), print a summary on exit")
+    parser.add_argument('--trace', metavar='PATH', help="write a Chrome trace-format file of the session on exit")
+    parser.add_argument('--cprofile', metavar='PATH', help="run the session under cProfile and write its stats")
+    args = parser.parse_args()
+
+    instruments = Instrumentation(enabled=bool(args.profile or args.trace or args.cprofile))
+    if args.cprofile:
+        instruments.start_profiler()
+
     root = tk.Tk()
-    app = YOLOAnnotationEditor(root)
+    app = YOLOAnnotationEditor(root, instruments)
     root.mainloop()
+    app.prefetcher.shutdown()
+
+    instruments.stop_profiler(args.cprofile)
+    if args.trace:
+        instruments.dump_trace(args.trace)
+    if instruments.enabled:
+        print(instruments.format_summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
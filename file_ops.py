@@ -0,0 +1,174 @@
+import os
+import json
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# How files are placed at their destination
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+
+# Linux FICLONE ioctl (copy-on-write clone on btrfs/xfs/...)
+FICLONE = 0x40049409
+
+_reflink_supported = True
+
+# Errors of the FICLONE ioctl that mean the filesystem can't clone at all
+REFLINK_UNSUPPORTED_ERRNOS = (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL)
+
+
+def reflink_file(src, dst):
+    """Clone src to dst sharing data blocks. Raises OSError if the filesystem can't."""
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def atomic_write(path, data):
+    """Write data to path through a temporary file and rename, so a crash never leaves half a file."""
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.tmp-{os.getpid()}")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def transfer_file(src, dst, mode='copy'):
+    """
+    Place src at dst using the given mode. Link modes fall back to a plain
+    copy when the filesystem does not support them (e.g. hardlinks across
+    devices, reflinks on NTFS/ext4, symlinks on Windows without developer
+    mode). An existing dst is replaced, also when it is a link to src left
+    by an earlier run.
+    """
+    global _reflink_supported
+
+    if os.path.lexists(dst) and os.path.abspath(dst) != os.path.abspath(src):
+        os.remove(dst)
+
+    if mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    elif mode == 'symlink':
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return
+        except (OSError, NotImplementedError):
+            # Windows without developer mode, filesystems without symlinks
+            pass
+    elif mode == 'reflink' and _reflink_supported:
+        try:
+            reflink_file(src, dst)
+            return
+        except (OSError, ImportError) as e:
+            # Don't keep retrying on a filesystem without reflink support; other
+            # errors (ENOSPC, EACCES, ...) only concern this file
+            if isinstance(e, ImportError) or e.errno in REFLINK_UNSUPPORTED_ERRNOS:
+                _reflink_supported = False
+            if os.path.lexists(dst):
+                os.remove(dst)
+    elif mode not in LINK_MODES:
+        raise ValueError(f"Unknown transfer mode: {mode}")
+
+    shutil.copy2(src, dst)
+
+
+class TransferManifest:
+    """
+    Append-only JSON-lines log of completed transfers.
+
+    Each line records the destination together with the size and mtime of
+    the source it was made from and the transfer mode. A rerun skips
+    destinations that still exist, were made with the same mode and whose
+    source is unchanged, so an interrupted job resumes without recopying.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Partially written last line of an interrupted run
+                    self.done[entry['dst']] = (entry['size'], entry['mtime'], entry.get('mode'))
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, dst, st, mode):
+        return self.done.get(dst) == (st.st_size, st.st_mtime, mode) and os.path.exists(dst)
+
+    def record(self, dst, st, mode):
+        with self._lock:
+            self.done[dst] = (st.st_size, st.st_mtime, mode)
+            self._file.write(json.dumps({'dst': dst, 'size': st.st_size, 'mtime': st.st_mtime,
+                                         'mode': mode}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _transfer_one(src, dst, mode, manifest):
+    st = os.stat(src)
+    if manifest is not None and manifest.is_done(dst, st, mode):
+        return 'skipped'
+    transfer_file(src, dst, mode)
+    if manifest is not None:
+        manifest.record(dst, st, mode)
+    return 'transferred'
+
+
+def parallel_transfer(pairs, mode='copy', jobs=8, manifest=None, progress=None):
+    """
+    Transfer (src, dst) pairs on a thread pool.
+
+    Destination folders must already exist. Only a bounded number of
+    transfers is in flight at once, so millions of pairs don't build up
+    millions of futures. progress(done_count) is called from the calling
+    thread after each finished transfer.
+
+    Returns a dict with 'transferred', 'skipped' and 'failed' (a list of
+    (src, error) tuples).
+    """
+    result = {'transferred': 0, 'skipped': 0, 'failed': []}
+    max_in_flight = max(1, jobs) * 64
+    in_flight = {}
+    done_count = 0
+
+    def collect(finished):
+        nonlocal done_count
+        for future in finished:
+            src = in_flight.pop(future)
+            try:
+                result[future.result()] += 1
+            except Exception as e:
+                result['failed'].append((src, e))
+            done_count += 1
+            if progress is not None:
+                progress(done_count)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for src, dst in pairs:
+            if len(in_flight) >= max_in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight[pool.submit(_transfer_one, src, dst, mode, manifest)] = src
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(finished)
+
+    return result
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import bisect
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open ended)
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Trace events kept in memory; older ones are dropped first
+MAX_TRACE_EVENTS = 200000
+
+# Weight of the newest frame in the frame-time readout's moving average
+FRAME_SMOOTHING = 0.2
+
+_NULL_CONTEXT = nullcontext()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds) with exact count, mean, min and max."""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (capped by the observed max)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count, 'mean_ms': self.mean, 'min_ms': self.min, 'max_ms': self.max,
+                'p50_ms': self.percentile(50), 'p95_ms': self.percentile(95), 'p99_ms': self.percentile(99),
+                'buckets_ms': dict(zip([str(b) for b in self.bounds] + ['inf'], self.counts))}
+
+
+class Instrumentation:
+    """
+    Opt-in timing of the editor's stages and interactive events.
+
+    stage(name) times a block (e.g. 'load_image.decode'); event(name)
+    times one handler run (drag, pan, zoom, ...). Both feed a latency
+    histogram per name and, while enabled, a Chrome trace-format event
+    list (chrome://tracing, Perfetto). Disabled, stage() and event() cost
+    one attribute check.
+
+    Frame time is measured from the start of an event handler until Tk
+    gets idle again, i.e. including the redraw the handler caused.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.trace = deque(maxlen=MAX_TRACE_EVENTS)
+        self.frame = LatencyHistogram()
+        self.frame_ms = None  # Smoothed frame time for the status bar readout
+        self.profiler = None
+        self._origin = time.perf_counter()
+        self._frame_start = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.trace.clear()
+            self.frame = LatencyHistogram()
+            self.frame_ms = None
+
+    def record(self, name, start, end, category='stage'):
+        """Add one timed span (perf_counter seconds)."""
+        ms = (end - start) * 1000
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(ms)
+            self.trace.append((name, category, start, end, threading.get_ident()))
+
+    @contextmanager
+    def _span(self, name, category):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), category)
+
+    def stage(self, name):
+        """Context manager timing one stage of the work, e.g. 'save_annotations'."""
+        return self._span(name, 'stage') if self.enabled else _NULL_CONTEXT
+
+    def event(self, name):
+        """Context manager timing one run of an event handler, e.g. 'drag'."""
+        return self._span(f"event.{name}", 'event') if self.enabled else _NULL_CONTEXT
+
+    def wrap_event(self, name, handler, widget=None):
+        """
+        handler wrapped so each call is timed as event(name). With a Tk
+        widget the frame time until the next idle moment is measured too.
+        """
+        def wrapped(*args):
+            if not self.enabled:
+                return handler(*args)
+            if widget is not None and self._frame_start is None:
+                self._frame_start = time.perf_counter()
+                widget.after_idle(self._end_frame)
+            with self.event(name):
+                return handler(*args)
+        return wrapped
+
+    def _end_frame(self):
+        start, self._frame_start = self._frame_start, None
+        if start is None or not self.enabled:
+            return
+        end = time.perf_counter()
+        ms = (end - start) * 1000
+        with self._lock:
+            self.frame.add(ms)
+            self.frame_ms = ms if self.frame_ms is None else (1 - FRAME_SMOOTHING) * self.frame_ms + FRAME_SMOOTHING * ms
+            self.trace.append(('frame', 'frame', start, end, threading.get_ident()))
+
+    # -- reports and dumps -------------------------------------------------------------
+
+    def readout(self):
+        """Short frame-time text for the status bar."""
+        if self.frame_ms is None:
+            return "frame: -"
+        return f"frame: {self.frame_ms:.1f} ms (p95 {self.frame.percentile(95):.0f} ms)"
+
+    def summary(self):
+        """{name: histogram dict} of everything recorded, plus 'frame'."""
+        with self._lock:
+            result = {name: h.to_dict() for name, h in sorted(self.histograms.items())}
+            result['frame'] = self.frame.to_dict()
+        return result
+
+    def format_summary(self):
+        lines = ["stage".ljust(32) + "count".rjust(8) + "mean".rjust(10) + "p50".rjust(10)
+                 + "p95".rjust(10) + "p99".rjust(10) + "max".rjust(10) + "  (ms)"]
+        for name, h in self.summary().items():
+            if not h['count']:
+                continue
+            lines.append(name.ljust(32) + str(h['count']).rjust(8)
+                         + "".join(f"{h[k]:10.2f}" for k in ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+        return "\n".join(lines)
+
+    def dump_trace(self, path):
+        """Write the recorded spans as a Chrome trace-format JSON file."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.trace)
+        events = [{'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6}
+                  for name, category, start, end, tid in spans]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+    def dump_summary(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def start_profiler(self):
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profiler(self, path=None):
+        """Stop the cProfile session and write its stats (pstats format) to path."""
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
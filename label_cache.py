@@ -0,0 +1,243 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+from yolo_labels import LabelArrays, LabelBatch, MalformedLine, read_label_batch
+
+CACHE_DIRNAME = '.label_cache'
+
+# Bump when the on-disk layout changes; older caches are rebuilt
+CACHE_VERSION = 1
+
+
+def default_cache_dir(labels_dir):
+    """Cache location beside the labels folder: <parent>/.label_cache/<labels folder name>."""
+    labels_dir = os.path.abspath(labels_dir)
+    return os.path.join(os.path.dirname(labels_dir), CACHE_DIRNAME, os.path.basename(labels_dir))
+
+
+def _gather_rows(starts, lengths):
+    """Row numbers of the segments [start, start + length) concatenated."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, lengths) + np.arange(lengths.sum())
+
+
+class LabelCache:
+    """
+    Packed, memory-mapped copy of every .txt label file in one folder.
+
+    All boxes are stored as one float32 (rows, 4) array and the class of each
+    row as an int32 code into class_names; offsets[i]:offsets[i + 1] are the
+    rows of names[i]. Arrays are .npy files opened with mmap_mode='r', so
+    lookups read straight from the page cache without opening the label
+    files. refresh() stats the folder and re-parses only files whose size or
+    mtime changed (plus new ones), then rewrites the cache.
+
+    Malformed lines are skipped like yolo_labels does and remembered per
+    file, so callers that rewrite labels can still leave such files alone.
+    """
+
+    def __init__(self, labels_dir, cache_dir=None, workers=8):
+        self.labels_dir = labels_dir
+        self.cache_dir = cache_dir or default_cache_dir(labels_dir)
+        self.workers = workers
+        self._load()
+
+    # -- on-disk state --------------------------------------------------------
+
+    def _set_empty(self):
+        self.names = np.empty(0, dtype=str)
+        self.sizes = np.empty(0, dtype=np.int64)
+        self.mtimes = np.empty(0, dtype=np.float64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.codes = np.empty(0, dtype=np.int32)
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.class_names = []
+        self.errors = {}
+
+    def _load(self):
+        self._set_empty()
+        try:
+            with open(os.path.join(self.cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != CACHE_VERSION:
+                raise ValueError("old label cache")
+            self.names = np.load(os.path.join(self.cache_dir, 'names.npy'))
+            self.sizes = np.load(os.path.join(self.cache_dir, 'sizes.npy'))
+            self.mtimes = np.load(os.path.join(self.cache_dir, 'mtimes.npy'))
+            self.offsets = np.load(os.path.join(self.cache_dir, 'offsets.npy'), mmap_mode='r')
+            self.codes = np.load(os.path.join(self.cache_dir, 'codes.npy'), mmap_mode='r')
+            self.boxes = np.load(os.path.join(self.cache_dir, 'boxes.npy'), mmap_mode='r')
+            self.class_names = meta['class_names']
+            self.errors = meta['errors']
+        except (OSError, ValueError, KeyError):
+            # Missing, partial or outdated cache: start empty, refresh() rebuilds it
+            self._set_empty()
+        self._position = {name: i for i, name in enumerate(self.names.tolist())}
+
+    def _save(self, names, sizes, mtimes, offsets, codes, boxes, class_names, errors):
+        parent = os.path.dirname(self.cache_dir)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = f"{self.cache_dir}.tmp-{os.getpid()}"
+        old_dir = f"{self.cache_dir}.old-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, 'names.npy'), names)
+        np.save(os.path.join(tmp_dir, 'sizes.npy'), sizes)
+        np.save(os.path.join(tmp_dir, 'mtimes.npy'), mtimes)
+        np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+        np.save(os.path.join(tmp_dir, 'codes.npy'), codes)
+        np.save(os.path.join(tmp_dir, 'boxes.npy'), boxes)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'class_names': class_names, 'errors': errors}, f)
+
+        # Drop our own maps first (Windows cannot rename mapped files), then swap directories
+        self._set_empty()
+        if os.path.isdir(self.cache_dir):
+            os.replace(self.cache_dir, old_dir)
+        os.replace(tmp_dir, self.cache_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self._load()
+
+    # -- maintenance ------------------------------------------------------------
+
+    def _scan(self):
+        """{name: (size, mtime)} of the .txt files in the labels folder."""
+        current = {}
+        if not os.path.isdir(self.labels_dir):
+            return current
+        with os.scandir(self.labels_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.txt'):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                current[entry.name] = (st.st_size, st.st_mtime)
+        return current
+
+    def refresh(self):
+        """Bring the cache up to date; returns the number of label files (re-)parsed."""
+        current = self._scan()
+        names = sorted(current)
+        old_sizes = self.sizes.tolist()
+        old_mtimes = self.mtimes.tolist()
+
+        stale = []
+        for name in names:
+            pos = self._position.get(name)
+            if pos is None or (old_sizes[pos], old_mtimes[pos]) != current[name]:
+                stale.append(name)
+        removed = [name for name in self._position if name not in current]
+        if not stale and not removed and os.path.isdir(self.cache_dir):
+            return 0
+
+        batch = read_label_batch([os.path.join(self.labels_dir, name) for name in stale], self.workers)
+
+        # Class codes: keep the cached ones, append classes first seen now
+        class_names = list(self.class_names)
+        class_code = {cid: i for i, cid in enumerate(class_names)}
+        unique, inverse = np.unique(batch.class_ids, return_inverse=True)
+        for cid in unique.tolist():
+            class_code.setdefault(cid, len(class_names))
+            if class_code[cid] == len(class_names):
+                class_names.append(cid)
+        new_codes = np.array([class_code[cid] for cid in unique.tolist()], dtype=np.int32)[inverse.reshape(-1)]
+
+        # Pool the cached rows and the freshly parsed rows, then gather in name order
+        old_total = int(self.offsets[-1])
+        pool_codes = np.concatenate([np.asarray(self.codes), new_codes]).astype(np.int32)
+        pool_boxes = np.concatenate([np.asarray(self.boxes), batch.boxes.astype(np.float32)])
+        old_offsets = np.asarray(self.offsets)
+        stale_position = {name: i for i, name in enumerate(stale)}
+        starts = np.empty(len(names), dtype=np.int64)
+        lengths = np.empty(len(names), dtype=np.int64)
+        errors = {}
+        for i, name in enumerate(names):
+            j = stale_position.get(name)
+            if j is None:
+                pos = self._position[name]
+                starts[i] = old_offsets[pos]
+                lengths[i] = old_offsets[pos + 1] - old_offsets[pos]
+                if name in self.errors:
+                    errors[name] = self.errors[name]
+            else:
+                starts[i] = old_total + batch.offsets[j]
+                lengths[i] = batch.offsets[j + 1] - batch.offsets[j]
+        for error in batch.errors:
+            errors.setdefault(os.path.basename(error.path), []).append([error.line_no, error.reason, error.text])
+
+        rows = _gather_rows(starts, lengths)
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        self._save(np.array(names, dtype=str),
+                   np.array([current[n][0] for n in names], dtype=np.int64),
+                   np.array([current[n][1] for n in names], dtype=np.float64),
+                   offsets, pool_codes[rows], pool_boxes[rows], class_names, errors)
+        return len(stale)
+
+    # -- lookups ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._position
+
+    def label_names(self):
+        """Set of the cached label file names."""
+        return set(self._position)
+
+    def file_errors(self, name):
+        """MalformedLine list recorded for one label file."""
+        path = os.path.join(self.labels_dir, name)
+        return [MalformedLine(path, line_no, text, reason) for line_no, reason, text in self.errors.get(name, [])]
+
+    def get(self, name):
+        """LabelArrays of one label file; boxes are a read-only view into the map. None if not cached."""
+        pos = self._position.get(name)
+        if pos is None:
+            return None
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        class_ids = np.asarray(self.class_names, dtype=str)[self.codes[start:end]] if end > start else np.empty(0, dtype=str)
+        return LabelArrays(class_ids, self.boxes[start:end], self.file_errors(name))
+
+    def batch(self, paths):
+        """LabelBatch for label paths (matched by file name); files not in the cache are empty."""
+        paths = list(paths)
+        positions = [self._position.get(os.path.basename(path), -1) for path in paths]
+        positions = np.array(positions, dtype=np.int64)
+        present = positions >= 0
+        offsets = np.asarray(self.offsets)
+        starts = np.where(present, offsets[np.maximum(positions, 0)], 0)
+        lengths = np.where(present, offsets[np.maximum(positions, 0) + 1] - starts, 0)
+        rows = _gather_rows(starts, lengths)
+        batch_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=batch_offsets[1:])
+        class_array = np.asarray(self.class_names, dtype=str) if self.class_names else np.empty(0, dtype=str)
+        class_ids = class_array[np.asarray(self.codes)[rows]] if len(rows) else np.empty(0, dtype=str)
+        errors = [error for path in paths for error in self.file_errors(os.path.basename(path))]
+        return LabelBatch(paths, class_ids, np.asarray(self.boxes)[rows].astype(np.float64), batch_offsets, errors)
+
+    def iter_batches(self, paths, batch_size=100000):
+        """Like yolo_labels.iter_label_batches, but served from the cache."""
+        paths = list(paths)
+        for start in range(0, len(paths), batch_size):
+            yield self.batch(paths[start:start + batch_size])
+
+
+def open_label_cache(labels_dir, workers=8, cache_dir=None):
+    """LabelCache for labels_dir, refreshed; None if it cannot be written (e.g. read-only share)."""
+    cache = LabelCache(labels_dir, cache_dir=cache_dir, workers=workers)
+    try:
+        cache.refresh()
+    except OSError as e:
+        print(f"Warning: label cache for {labels_dir} unavailable ({e}), reading label files directly.")
+        return None
+    return cache
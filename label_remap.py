@@ -0,0 +1,218 @@
+import os
+import json
+import hashlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from file_ops import atomic_write
+from yolo_labels import MalformedLine, report_errors
+
+CONFIG_FILE = 'annotation_editor_config.json'
+STATE_FILE_NAME = '.label_remap_state.json'
+
+
+def load_class_mapping(config_path=CONFIG_FILE):
+    """{class_id: class_name} from the editor's config file ({} if it is missing)."""
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return {str(k): str(v) for k, v in json.load(f).get('class_mapping', {}).items()}
+
+
+def build_label_map(class_mapping, extra=None):
+    """
+    {text label: class id} for rewriting labels written by name.
+
+    Every class name of the editor config maps to its id; extra entries
+    (e.g. old short names such as 'b1') are added on top. Names that are
+    themselves a class id are left out so existing ids are never remapped.
+    """
+    label_map = {}
+    for class_id, class_name in class_mapping.items():
+        if class_name != class_id and class_name not in class_mapping:
+            label_map[class_name] = class_id
+    for label, class_id in (extra or {}).items():
+        label_map[str(label)] = str(class_id)
+    return label_map
+
+
+def mapping_digest(label_map):
+    return hashlib.sha1(json.dumps(sorted(label_map.items())).encode('utf-8')).hexdigest()
+
+
+def remap_bytes(data, label_map, path=None):
+    """
+    Replace the class token of every line found in label_map.
+
+    Works on the raw bytes so everything after the class token is kept
+    exactly as written; malformed lines are kept too and reported, but
+    not counted.
+    Returns (new_data, before_counts, after_counts, errors).
+    """
+    byte_map = {k.encode('utf-8'): v.encode('utf-8') for k, v in label_map.items()}
+    before = Counter()
+    after = Counter()
+    errors = []
+    out = []
+    for line_no, line in enumerate(data.splitlines(keepends=True), 1):
+        parts = line.split()
+        if not parts:
+            out.append(line)
+            continue
+        malformed = len(parts) < 5
+        if malformed:
+            errors.append(MalformedLine(path, line_no, line.decode('utf-8', 'replace'),
+                                        f"expected 5 fields, got {len(parts)}"))
+        token = parts[0]
+        new_token = byte_map.get(token)
+        if new_token is not None:
+            start = line.index(token)
+            line = line[:start] + new_token + line[start + len(token):]
+        # A malformed line's first token need not be a class at all
+        if not malformed:
+            before[token.decode('utf-8', 'replace')] += 1
+            after[(new_token or token).decode('utf-8', 'replace')] += 1
+        out.append(line)
+    return b''.join(out), before, after, errors
+
+
+def remap_file(path, label_map, known_hash=None, dry_run=False):
+    """
+    Remap one label file (runs in a worker process).
+
+    Returns a dict with 'status' ('remapped', 'unchanged', 'skipped-hash' or
+    'failed'), 'before'/'after' class counts, 'errors', the content 'hash'
+    after the run and the file's 'size'/'mtime_ns' afterwards.
+    """
+    result = {'path': path, 'status': 'failed', 'before': {}, 'after': {}, 'errors': [], 'hash': None}
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == known_hash:
+            # Touched but identical to what the last run left behind
+            result['status'] = 'skipped-hash'
+            result['hash'] = digest
+        else:
+            new_data, before, after, errors = remap_bytes(data, label_map, path)
+            result.update(before=dict(before), after=dict(after), errors=errors)
+            if new_data == data:
+                result['status'] = 'unchanged'
+                result['hash'] = digest
+            else:
+                if not dry_run:
+                    atomic_write(path, new_data)
+                result['status'] = 'remapped'
+                result['hash'] = hashlib.sha1(new_data).hexdigest()
+        st = os.stat(path)
+        result['size'], result['mtime_ns'] = st.st_size, st.st_mtime_ns
+    except OSError as e:
+        result['error'] = str(e)
+    return result
+
+
+def _remap_task(args):
+    return remap_file(*args)
+
+
+def _load_state(label_dir, digest):
+    state_path = os.path.join(label_dir, STATE_FILE_NAME)
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Results recorded under another mapping say nothing about this one
+    return state.get('files', {}) if state.get('mapping') == digest else {}
+
+
+def _save_state(label_dir, digest, files):
+    data = json.dumps({'mapping': digest, 'files': files}).encode('utf-8')
+    atomic_write(os.path.join(label_dir, STATE_FILE_NAME), data)
+
+
+def remap_directory(label_dir, label_map, workers=None, dry_run=False, pool=None):
+    """
+    Remap every .txt file in label_dir on a process pool.
+
+    A state file in the folder remembers size, mtime, content hash and
+    class counts of each file after the last run with the same mapping.
+    Files whose size and mtime still match are not opened at all; files
+    that were touched but hash the same are not rewritten.
+
+    Returns a summary dict: 'before'/'after' Counters over all files,
+    'remapped', 'unchanged', 'skipped' and 'failed' counts and 'errors'.
+    """
+    digest = mapping_digest(label_map)
+    state = _load_state(label_dir, digest)
+    summary = {'before': Counter(), 'after': Counter(), 'remapped': 0, 'unchanged': 0,
+               'skipped': 0, 'failed': [], 'errors': []}
+
+    tasks = []
+    new_state = {}
+    with os.scandir(label_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.txt') or not entry.is_file():
+                continue
+            st = entry.stat()
+            known = state.get(entry.name)
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+                summary['skipped'] += 1
+                summary['before'].update(known[3])
+                summary['after'].update(known[3])
+                new_state[entry.name] = known
+                continue
+            tasks.append((entry.path, label_map, known[2] if known else None, dry_run))
+
+    own_pool = pool is None and len(tasks) > 1
+    if own_pool:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        results = pool.map(_remap_task, tasks, chunksize=64) if pool else map(_remap_task, tasks)
+        for result in results:
+            name = os.path.basename(result['path'])
+            status = result['status']
+            if status == 'failed':
+                summary['failed'].append((result['path'], result.get('error')))
+                continue
+            if status == 'skipped-hash':
+                counts = state[name][3]
+                summary['before'].update(counts)
+                summary['after'].update(counts)
+                summary['skipped'] += 1
+            else:
+                counts = result['after']
+                summary['before'].update(result['before'])
+                summary['after'].update(counts)
+                summary[status] += 1
+                summary['errors'].extend(result['errors'])
+            if not dry_run:
+                new_state[name] = [result['size'], result['mtime_ns'], result['hash'], counts]
+    finally:
+        if own_pool:
+            pool.shutdown()
+        if not dry_run:
+            _save_state(label_dir, digest, new_state)
+    return summary
+
+
+def format_remap_summary(summary, class_mapping=None):
+    """Per-class table of box counts before and after a remap."""
+    class_mapping = class_mapping or {}
+    labels = sorted(set(summary['before']) | set(summary['after']),
+                    key=lambda x: (not x.isdigit(), int(x) if x.isdigit() else 0, x))
+    lines = ["class".ljust(20) + "name".ljust(20) + "before".rjust(10) + "after".rjust(10)]
+    for label in labels:
+        lines.append(label.ljust(20) + class_mapping.get(label, "").ljust(20)
+                     + str(summary['before'].get(label, 0)).rjust(10)
+                     + str(summary['after'].get(label, 0)).rjust(10))
+    return "\n".join(lines)
+
+
+def print_remap_report(label_dir, summary, class_mapping=None):
+    report_errors(summary['errors'])
+    for path, error in summary['failed']:
+        print(f"Error remapping {path}: {error}")
+    print(f"{label_dir}: {summary['remapped']} files remapped, {summary['unchanged']} unchanged, "
+          f"{summary['skipped']} skipped (already done), {len(summary['failed'])} failed")
+    print(format_remap_summary(summary, class_mapping))
@@ -1,173 +1,277 @@
 import os
-import shutil
 import re
+import csv
+from dataset_index import DatasetIndex
+from file_ops import parallel_transfer
+from dedup import DuplicateFinder, DEFAULT_MAX_DISTANCE
 
-def get_files_info(folder_path):
+NUMBERED_FILE_RE = re.compile(r'^(\d+)(\..+)$')
+
+def parse_numbered_files(file_names):
     """
-    Lists files in a folder, filters for numbered files (digits.extension),
-    sorts them numerically, and determines max number and observed padding width.
-    Returns a list of (number, filename) tuples, max number found, and common padding width.
+    Filters file names for numbered files (digits.extension), sorts them
+    numerically, and determines max number and observed padding width.
+    Returns the same tuple as get_files_info.
     """
-    files_info = []
-    max_num = 0
-    # We need padding per file potentially, but let's assume consistency and find the max
-    # Better: find the padding of the file with the max number from the source folder
-    observed_padding = 0
-    file_extension = ""
-
-    if os.path.isdir(folder_path):
-        # Get all potential numbered files first to find max num and padding reliably
-        potential_files = []
-        for f in os.listdir(folder_path):
-             if os.path.isfile(os.path.join(folder_path, f)):
-                match = re.match(r'^(\d+)(\..+)$', f)
-                if match:
-                    num = int(match.group(1))
-                    padding = len(match.group(1))
-                    ext = match.group(2)
-                    potential_files.append((num, f, padding, ext))
-
-        # Sort by number to easily find the max num and its padding
-        potential_files.sort(key=lambda x: x[0])
-
-        if potential_files:
-            # The last file in sorted list has the max number
-            max_num = potential_files[-1][0]
-            # Use the padding of the file with the max number from this source folder
-            observed_padding = potential_files[-1][2]
-            file_extension = potential_files[0][3] # Assume consistent extension
-
-            # Return the list of (number, filename) for sorted files
-            files_info = [(info[0], info[1]) for info in potential_files]
-
-
-    # Sort based on the integer part of the filename just to be sure
-    files_info.sort(key=lambda x: x[0])
+    potential_files = []
+    for f in file_names:
+        match = NUMBERED_FILE_RE.match(f)
+        if match:
+            num = int(match.group(1))
+            padding = len(match.group(1))
+            ext = match.group(2)
+            potential_files.append((num, f, padding, ext))
+
+    # Sort by number to easily find the max num and its padding
+    potential_files.sort(key=lambda x: x[0])
+
+    if not potential_files:
+        return [], 0, 0, ""
+
+    # The last file in sorted list has the max number
+    max_num = potential_files[-1][0]
+    # Use the padding of the file with the max number from this source folder
+    observed_padding = potential_files[-1][2]
+    file_extension = potential_files[0][3] # Assume consistent extension
 
     # Return sorted list of (number, filename), max number, observed padding, and common extension
+    files_info = [(info[0], info[1]) for info in potential_files]
     return files_info, max_num, observed_padding, file_extension
 
+def get_files_info(folder_path, index=None):
+    """
+    Lists files in a folder, filters for numbered files (digits.extension),
+    sorts them numerically, and determines max number and observed padding width.
+    If a DatasetIndex is given the listing comes from the index instead of a
+    directory scan.
+    Returns a list of (number, filename) tuples, max number found, and common padding width.
+    """
+    if not os.path.isdir(folder_path):
+        return [], 0, 0, ""
+    if index is not None:
+        file_names = index.list_files(folder_path)
+    else:
+        file_names = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
+    return parse_numbered_files(file_names)
+
 def get_min_padding_width_for_count(count):
     """Determines the minimum digits needed for zero-padding for a given count."""
     if count == 0:
         return 1 # Or 0, depending on desired output for empty folders
     return len(str(count))
 
-# Define the source and target directories
-source1_dir = 'ekran_goruntusu2'
-source2_dir = 'ekran_goruntusu'
-target_dir = 'merged_ekran_goruntusu'
-
-# --- Create the target directory structure based on source1_dir ---
-print(f"Creating target directory structure based on '{source1_dir}'...")
-if os.path.exists(target_dir):
-    # Optional: Remove existing target directory to start fresh if needed
-    # print(f"Removing existing target directory: {target_dir}")
-    # shutil.rmtree(target_dir)
-    pass # Keep existing if you want to potentially merge into it
-os.makedirs(target_dir, exist_ok=True)
-
-# Walk through the source1 directory structure to create directories
-for root, dirs, files in os.walk(source1_dir):
-    # Calculate the relative path from source1_dir
-    relative_path = os.path.relpath(root, source1_dir)
-    # Construct the corresponding path in the target directory
-    target_path = os.path.join(target_dir, relative_path)
-
-    # Create the directory in the target path if it doesn't exist
-    # os.walk provides directories first, so this should create them before processing files
-    if not os.path.exists(target_path):
-         os.makedirs(target_path)
-         # print(f"Created directory: {target_path}") # Uncomment for verbose output
-
-
-# --- Merge files into the target directory structure ---
-print("Merging files...")
-
-# Walk through the source1 directory structure again to process files
-for root, dirs, files in os.walk(source1_dir):
-    # Calculate the relative path
-    relative_path = os.path.relpath(root, source1_dir)
-    target_path = os.path.join(target_dir, relative_path)
-    source2_path = os.path.join(source2_dir, relative_path)
-
-    print(f"Processing folder: {relative_path}")
-
-    # Get file info from source1 directory
-    # files1_info is a list of (number, filename) tuples
-    files1_info, max_source1_number, source1_padding_width, source1_ext = get_files_info(root)
-
-    # Get file info from source2 directory if the corresponding directory exists
-    files2_info = [] # list of (number, filename) tuples
-    max_source2_number = 0
-    source2_padding_width = 0 # Not directly used for naming in this logic
-    source2_ext = ""
-
-    if os.path.isdir(source2_path):
-        files2_info, max_source2_number_unused, source2_padding_width_unused, source2_ext = get_files_info(source2_path)
-
-
-    # --- Copy files from source1 with original names ---
-    if files1_info:
-        print(f"  Copying {len(files1_info)} files from source1...")
-        for num, file in files1_info:
-            source_file = os.path.join(root, file)
-            target_file = os.path.join(target_path, file) # Copy with original name
-            # Ensure target file doesn't exist before copying (should be true if target was empty)
-            if not os.path.exists(target_file):
-                 shutil.copy2(source_file, target_file)
-                 # print(f"    Copied '{file}' from source1")
-            # else:
-                 # print(f"    Warning: Target file '{target_file}' already exists in target, skipping copy from source1.")
-
-
-    # --- Copy and re-number files from source2 ---
-    if files2_info:
-        print(f"  Copying and re-numbering {len(files2_info)} files from source2...")
-        # Determine the starting index for source2 files in the merged sequence
-        start_index = max_source1_number + 1
-
-        # Determine the final padding width for the new names from source2
-        # Use source1's padding if files were present in source1, otherwise use padding needed for files2 count
-        if source1_padding_width > 0:
-             final_padding = source1_padding_width
-        else:
-             # If source1 had no numbered files, calculate padding based on the number of files from source2
-             final_padding = get_min_padding_width_for_count(len(files2_info))
-
-        # Determine the effective extension for the new files
-        # Prefer source1 extension if files1 existed, otherwise use source2 extension
-        effective_ext = source1_ext if source1_ext else source2_ext
-
-        # Ensure we have an extension if possible
-        if not effective_ext and files2_info:
-             # Try to get extension from the first file in files2 if source1 had no numbered files
-             match = re.match(r'^(\d+)(\..+)$', files2_info[0][1])
-             if match:
-                 effective_ext = match.group(2)
-
-
-        file_index = start_index # Counter for source2 files in the merged sequence
-
-        for num, file in files2_info:
-            # Construct the new filename using the next index and determined padding/extension
-            new_name = f"{file_index:0{final_padding}d}{effective_ext}"
-            source_file = os.path.join(source2_path, file)
-            target_file = os.path.join(target_path, new_name)
-
-            # Check if the target file with the new name already exists (shouldn't if logic is right)
-            if not os.path.exists(target_file):
-                shutil.copy2(source_file, target_file)
-                # print(f"    Copied '{file}' from source2 to '{new_name}'")
-            else:
-                print(f"  Warning: Target file '{target_file}' already exists during source2 copy, skipping.")
-
-            file_index += 1
-    elif files1_info:
-        # Folder only had files in source1, they were copied with original names above
-        print(f"  Only {len(files1_info)} files found in source1.")
-    else:
-         print("  No numbered files found in either source for this folder.")
+def _paired_image_folder(relative_path):
+    """The images/ folder whose files pair by number with a labels/ folder, else None."""
+    head, tail = os.path.split(relative_path)
+    return os.path.join(head, 'images') if tail == 'labels' else None
 
+def find_duplicates(source_dirs, target_dir, listings, indexes, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Hashes every image of the target and of all sources (in parallel, cached
+    in each DatasetIndex) and returns {(source_no, relative_folder, number):
+    (duplicate_of, kind)} for numbered images of the second and later
+    sources that are exact or near duplicates of an image seen before them.
+    """
+    finder = DuplicateFinder(max_distance)
+    if os.path.isdir(target_dir):
+        target_index = DatasetIndex(target_dir)
+        try:
+            for root, dirs, files in target_index.walk(target_dir):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name, (content_hash, dhash) in target_index.image_hashes(root).items():
+                    finder.add(os.path.join(root, name), content_hash, dhash)
+        finally:
+            target_index.close()
+
+    duplicates = {}
+    for source_no, (source_dir, index, listing) in enumerate(zip(source_dirs, indexes, listings)):
+        for relative_path, files in listing.items():
+            folder = os.path.join(source_dir, relative_path)
+            hashes = index.image_hashes(folder)
+            for num, name in parse_numbered_files(files)[0]:
+                if name not in hashes:
+                    continue
+                content_hash, dhash = hashes[name]
+                match = finder.find(content_hash, dhash) if source_no > 0 else None
+                if match is not None:
+                    duplicates[(source_no, relative_path, num)] = (match[0], match[1])
+                else:
+                    finder.add(os.path.join(folder, name), content_hash, dhash)
+    return duplicates
+
+def plan_merge(source_dirs, target_dir, indexes=None, dedup='off', max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Plans a merge of any number of sources into target_dir in one pass.
+
+    Every source tree is listed once (through its DatasetIndex). For each
+    relative folder, files of the first source keep their names; numbered
+    files of every later source are renumbered to continue after the highest
+    number assigned so far, using the first source's padding and extension.
+    Files that already exist in the target are planned as skipped.
+
+    With dedup='flag', 'skip' or 'skip-near', images of later sources that
+    duplicate an image of the target or of an earlier source (see
+    find_duplicates) get 'duplicate_of' set. 'skip' also leaves exact
+    duplicates (and their same-numbered label files) out of the merge
+    without using up a number; 'skip-near' leaves out near duplicates too.
+
+    indexes defaults to a DatasetIndex per source, closed again before
+    returning; indexes passed in are left open.
+
+    Returns (folders, operations): the relative folders to create and a list
+    of dicts with 'action' ('copy', 'skip-exists' or 'skip-duplicate'),
+    'source', 'target' and 'duplicate_of'.
+    """
+    owned_indexes = indexes is None
+    if owned_indexes:
+        indexes = [DatasetIndex(d) for d in source_dirs]
+
+    try:
+        # One listing per source: {relative_folder: [file names]}
+        listings = []
+        folders = []
+        for source_dir, index in zip(source_dirs, indexes):
+            listing = {}
+            if os.path.isdir(source_dir):
+                for root, dirs, files in index.walk(source_dir):
+                    # Tool state such as .label_cache is not part of the dataset
+                    dirs[:] = [d for d in dirs if not d.startswith('.')]
+                    relative_path = os.path.relpath(root, source_dir)
+                    listing[relative_path] = files
+                    if relative_path not in folders:
+                        folders.append(relative_path)
+            listings.append(listing)
+
+        duplicates = {}
+        if dedup != 'off':
+            duplicates = find_duplicates(source_dirs, target_dir, listings, indexes, max_distance)
+
+        operations = []
+        for relative_path in folders:
+            target_path = os.path.join(target_dir, relative_path)
+            existing = set(os.listdir(target_path)) if os.path.isdir(target_path) else set()
+
+            infos = [parse_numbered_files(listing.get(relative_path, [])) for listing in listings]
+            first_files, first_max, first_padding, first_ext = infos[0]
+
+            # Files from the first source keep their original names
+            for num, file in first_files:
+                operations.append({
+                    'action': 'skip-exists' if file in existing else 'copy',
+                    'source': os.path.join(source_dirs[0], relative_path, file),
+                    'target': os.path.join(target_path, file),
+                    'duplicate_of': '',
+                })
+
+            # Later sources continue the numbering after the highest number so far
+            renumbered = [(i, info[0]) for i, info in enumerate(infos[1:], start=1) if info[0]]
+            if not renumbered:
+                continue
+            final_padding = next((info[2] for info in infos if info[2] > 0), 0)
+            if final_padding == 0:
+                final_padding = get_min_padding_width_for_count(sum(len(files) for _, files in renumbered))
+            effective_ext = next((info[3] for info in infos if info[3]), "")
+
+            paired_folder = _paired_image_folder(relative_path)
+            file_index = first_max + 1
+            for source_no, files_info in renumbered:
+                for num, file in files_info:
+                    source_path = os.path.join(source_dirs[source_no], relative_path, file)
+                    duplicate = duplicates.get((source_no, relative_path, num)) or \
+                        duplicates.get((source_no, paired_folder, num))
+                    duplicate_of = f"{duplicate[0]} ({duplicate[1]})" if duplicate else ''
+                    if duplicate and (dedup == 'skip-near' or (dedup == 'skip' and duplicate[1] == 'exact')):
+                        # The number is not used, so images/ and labels/ stay paired
+                        operations.append({'action': 'skip-duplicate', 'source': source_path,
+                                           'target': '', 'duplicate_of': duplicate_of})
+                        continue
+                    new_name = f"{file_index:0{final_padding}d}{effective_ext}"
+                    operations.append({
+                        'action': 'skip-exists' if new_name in existing else 'copy',
+                        'source': source_path,
+                        'target': os.path.join(target_path, new_name),
+                        'duplicate_of': duplicate_of,
+                    })
+                    file_index += 1
+
+        return folders, operations
+    finally:
+        if owned_indexes:
+            # Indexes passed in belong to the caller
+            for index in indexes:
+                index.close()
+
+def write_plan_report(operations, report_path):
+    """Writes the planned operations as CSV (action, source, target, duplicate_of)."""
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['action', 'source', 'target', 'duplicate_of'])
+        for op in operations:
+            writer.writerow([op['action'], op['source'], op['target'], op.get('duplicate_of', '')])
+
+def execute_plan(folders, operations, target_dir, mode='copy', jobs=8, progress=None):
+    """
+    Creates the folders and carries out the planned copies on a worker pool.
+    progress(done, total) is called as files finish.
+    """
+    for relative_path in folders:
+        os.makedirs(os.path.join(target_dir, relative_path), exist_ok=True)
+    pairs = [(op['source'], op['target']) for op in operations if op['action'] == 'copy']
+    total = len(pairs)
+    return parallel_transfer(pairs, mode, jobs, progress=(lambda done: progress(done, total)) if progress else None)
+
+# Define the source and target directories.
+# The first source keeps its file names; every later source is renumbered after it.
+source_dirs = ['ekran_goruntusu2', 'ekran_goruntusu']
+target_dir = 'merged_ekran_goruntusu'
 
-print("\nMerging complete!")
\ No newline at end of file
+# 'copy', 'hardlink', 'reflink' or 'symlink' (see file_ops.LINK_MODES)
+link_mode = 'copy'
+num_workers = 8
+
+# Duplicate images from the second and later sources (same pixels, or a dHash
+# within near_duplicate_distance bits of an earlier image):
+# 'flag' only marks them in the plan report, 'skip' leaves out exact duplicates,
+# 'skip-near' also near ones (e.g. consecutive video frames!), 'off' disables hashing.
+# Hashing decodes every image of every source and of the target the first time
+# (the hashes are then cached in each folder's index), so it is off by default.
+dedup = 'off'
+near_duplicate_distance = 4
+
+# Only write the plan report, don't touch the target
+dry_run = False
+plan_report_path = 'merge_plan.csv' # None to skip the report
+
+def main():
+    print(f"Planning merge of {', '.join(source_dirs)} into '{target_dir}'...")
+    folders, operations = plan_merge(source_dirs, target_dir, dedup=dedup, max_distance=near_duplicate_distance)
+
+    to_copy = sum(1 for op in operations if op['action'] == 'copy')
+    skipped = sum(1 for op in operations if op['action'] == 'skip-exists')
+    print(f"  {len(folders)} folders, {to_copy} files to copy, {skipped} already in target.")
+    flagged = sum(1 for op in operations if op.get('duplicate_of'))
+    if flagged:
+        dropped = sum(1 for op in operations if op['action'] == 'skip-duplicate')
+        print(f"  {flagged} duplicate files flagged, {dropped} of them skipped (see the plan report).")
+
+    if plan_report_path:
+        write_plan_report(operations, plan_report_path)
+        print(f"  Plan written to {plan_report_path}")
+
+    if dry_run:
+        print("\nDry run, nothing was copied.")
+        return
+
+    for op in operations:
+        if op['action'] == 'skip-exists':
+            print(f"  Warning: Target file '{op['target']}' already exists, skipping.")
+
+    print("Merging files...")
+    result = execute_plan(folders, operations, target_dir, link_mode, num_workers)
+    for source_file, error in result['failed']:
+        print(f"  Error copying '{source_file}': {error}")
+
+    print("\nMerging complete!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from yolo_labels import read_labels
+from annotation_store import AnnotationStore
+from tile_store import TileStore, needs_tiles, open_source
+
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Fill of the stand-in shown for a very large non-JPEG image until its tiles are ready
+PREVIEW_FILL = (128, 128, 128)
+
+
+def decode_image(image_path, fit_size=None):
+    """
+    Decode an image file into an RGB PIL image.
+
+    With fit_size (canvas width, height) a JPEG is decoded by the codec at
+    1/2, 1/4 or 1/8 scale (PIL draft mode), as long as the result is still
+    at least as large as the image fitted into that box. Other formats are
+    decoded at full size. The EXIF orientation is applied.
+
+    Returns (image, full_size); full_size is the size of the full
+    resolution image, equal to image.size when nothing was reduced.
+    """
+    try:
+        with Image.open(image_path) as image:
+            full_w, full_h = image.size
+            if fit_size is not None and image.format == 'JPEG':
+                scale = min(1.0, fit_size[0] / full_w, fit_size[1] / full_h)
+                image.draft('RGB', (math.ceil(full_w * scale), math.ceil(full_h * scale)))
+            orientation = image.getexif().get(0x0112, 1)
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                full_w, full_h = full_h, full_w
+            if orientation != 1:
+                image = ImageOps.exif_transpose(image)
+            rgb = image.convert('RGB') if image.mode != 'RGB' else image
+            rgb.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise IOError(f"Could not decode image: {image_path} ({e})")
+    return rgb, (full_w, full_h)
+
+
+def decode_preview(image_path, fit_size):
+    """
+    Stand-in for a very large image while its tiles are converted: a JPEG
+    is decoded at the smallest draft scale that still fills fit_size, other
+    formats cannot be decoded in part and get a blank image of that size.
+
+    Returns (image, full_size) like decode_image.
+    """
+    try:
+        with open_source(image_path) as image:
+            full_w, full_h = image.size
+            orientation = image.getexif().get(0x0112, 1)
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                full_w, full_h = full_h, full_w
+            fit_w, fit_h = fit_size or (1024, 1024)
+            scale = min(1.0, fit_w / full_w, fit_h / full_h)
+            preview_size = (max(1, math.ceil(full_w * scale)), max(1, math.ceil(full_h * scale)))
+            if image.format != 'JPEG':
+                return Image.new('RGB', preview_size, PREVIEW_FILL), (full_w, full_h)
+            image.draft('RGB', preview_size if orientation not in TRANSPOSED_ORIENTATIONS else preview_size[::-1])
+            if orientation != 1:
+                image = ImageOps.exif_transpose(image)
+            rgb = image.convert('RGB') if image.mode != 'RGB' else image
+            rgb.load()
+    except (OSError, ValueError) as e:
+        raise IOError(f"Could not decode image: {image_path} ({e})")
+    return rgb, (full_w, full_h)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class PrefetchedImage:
+    """
+    Decoded pixels and parsed labels of one image. pil_image may be a
+    reduced decode (see decode_image); full_size is the real image size.
+
+    Very large images are not decoded at all: tiles is their TileStore and
+    pil_image is None. Converting them is left to ImagePrefetcher.load_tiles();
+    until then (tiles_pending) pil_image is a preview from decode_preview().
+    """
+
+    def __init__(self, image_path, label_path, fit_size=None):
+        self.image_path = image_path
+        self.label_path = label_path
+        self.image_mtime = _mtime(image_path)
+        self.tiled = needs_tiles(image_path)
+        self.tiles = TileStore.cached(image_path) if self.tiled else None
+        if self.tiles is not None:
+            self.pil_image, self.full_size = None, self.tiles.size
+        elif self.tiled:
+            self.pil_image, self.full_size = decode_preview(image_path, fit_size)
+        else:
+            self.pil_image, self.full_size = decode_image(image_path, fit_size)
+        self.load_labels()
+
+    @property
+    def reduced(self):
+        return self.pil_image is not None and self.pil_image.size != self.full_size
+
+    @property
+    def tiles_pending(self):
+        return self.tiled and self.tiles is None
+
+    def load_labels(self):
+        self.label_mtime = _mtime(self.label_path)
+        self.labels = read_labels(self.label_path)
+
+    @property
+    def nbytes(self):
+        if self.pil_image is None:
+            return 0  # Tiles are memory-mapped; their cache has its own budget
+        width, height = self.pil_image.size
+        return width * height * len(self.pil_image.getbands())
+
+    def copy_annotations(self):
+        """Annotations the caller may freely modify, as an AnnotationStore."""
+        return AnnotationStore.from_labels(self.labels)
+
+
+class ByteBudgetCache:
+    """Thread-safe LRU cache that evicts entries once their nbytes exceed a budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = entry
+            self.current_bytes += entry.nbytes
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def discard(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+class ImagePrefetcher:
+    """
+    Decodes the images around the current one on a thread pool.
+
+    Decoded images live in a ByteBudgetCache keyed by image path. get()
+    returns a cached entry, waits for a decode already in flight, or decodes
+    synchronously as a last resort. Cached entries are revalidated against
+    the image/label mtimes so edits made since the prefetch are not lost.
+
+    With fit_size set (the canvas size), JPEGs are decoded at a reduced
+    resolution that still fills it; load_full() decodes the full image in
+    the background when the user zooms past that. Very large images are
+    converted to tiles by load_tiles(), also in the background.
+    """
+
+    def __init__(self, radius=2, max_workers=2, max_bytes=768 * 1024 * 1024):
+        self.radius = radius
+        self.fit_size = None
+        self.cache = ByteBudgetCache(max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending = {}  # image_path -> Future
+        self._lock = threading.Lock()
+
+    def _load(self, image_path, label_path):
+        try:
+            entry = PrefetchedImage(image_path, label_path, self.fit_size)
+            self.cache.put(image_path, entry)
+            return entry
+        finally:
+            with self._lock:
+                self._pending.pop(image_path, None)
+
+    def get(self, image_path, label_path):
+        """Return the PrefetchedImage for image_path, decoding it if needed."""
+        entry = self.cache.get(image_path)
+        if entry is None:
+            with self._lock:
+                future = self._pending.get(image_path)
+            if future is not None:
+                if future.cancel():
+                    # Still queued; decoding here is faster than waiting for the pool
+                    with self._lock:
+                        self._pending.pop(image_path, None)
+                else:
+                    try:
+                        entry = future.result()
+                    except Exception:
+                        entry = None
+
+        if entry is not None and entry.image_mtime != _mtime(image_path):
+            self.cache.discard(image_path)
+            entry = None
+
+        if entry is None:
+            entry = PrefetchedImage(image_path, label_path, self.fit_size)
+            self.cache.put(image_path, entry)
+        elif entry.label_path != label_path or entry.label_mtime != _mtime(label_path):
+            entry.label_path = label_path
+            entry.load_labels()
+        return entry
+
+    def prefetch_around(self, images_list, index, label_path_for):
+        """
+        Schedule decoding of the radius images before and after index.
+        Pending decodes that fell out of the window are cancelled.
+        """
+        lo = max(0, index - self.radius)
+        hi = min(len(images_list), index + self.radius + 1)
+        # Nearest neighbours first, the next image before the previous one
+        order = []
+        for step in range(1, self.radius + 1):
+            for i in (index + step, index - step):
+                if lo <= i < hi:
+                    order.append(images_list[i])
+        wanted = set(order)
+
+        with self._lock:
+            for path, future in list(self._pending.items()):
+                if path not in wanted and future.cancel():
+                    del self._pending[path]
+
+            for path in order:
+                if path in self._pending or path in self.cache:
+                    continue
+                self._pending[path] = self.executor.submit(self._load, path, label_path_for(path))
+
+    def load_full(self, image_path):
+        """Future of the full resolution decode of image_path (a PIL image)."""
+        return self.executor.submit(lambda: decode_image(image_path)[0])
+
+    def upgrade(self, entry, image):
+        """Replace a reduced entry's pixels by the full image; the cache re-counts its size."""
+        if self.cache.get(entry.image_path) is entry:
+            self.cache.discard(entry.image_path)
+            entry.pil_image = image
+            self.cache.put(entry.image_path, entry)
+        else:
+            entry.pil_image = image
+
+    def load_tiles(self, image_path):
+        """Future of the TileStore of image_path, converting the image if needed."""
+        return self.executor.submit(TileStore.open, image_path)
+
+    def attach_tiles(self, entry, store):
+        """Replace a tiled entry's preview by its converted TileStore."""
+        entry.tiles = store
+        self.upgrade(entry, None)
+
+    def invalidate(self, image_path):
+        self.cache.discard(image_path)
+
+    def shutdown(self):
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,275 @@
+import math
+import tkinter as tk
+from collections import OrderedDict
+from PIL import Image, ImageTk
+
+from instrumentation import Instrumentation
+from tile_store import TiledImage
+
+# Resampling used while the user is zooming/panning and after things settle
+FAST_RESAMPLE = Image.NEAREST
+FINAL_RESAMPLE = Image.LANCZOS
+
+# Delay (ms) after the last wheel/pan event before the LANCZOS refinement runs
+REFINE_DELAY_MS = 150
+
+# Smallest side a pyramid level may have
+MIN_LEVEL_SIZE = 64
+
+
+def image_nbytes(image):
+    """Approximate in-memory size of a PIL image."""
+    return image.width * image.height * len(image.getbands())
+
+
+class PyramidCache:
+    """Memory-bounded LRU of pyramid levels shared by all images."""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if key in self._entries:
+            self.current_bytes -= image_nbytes(self._entries.pop(key))
+        self._entries[key] = image
+        self.current_bytes += image_nbytes(image)
+        # Evict least recently used levels, but never the one just added
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= image_nbytes(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+
+class ImagePyramid:
+    """
+    Power-of-two reductions of a source image, built lazily on first use.
+
+    Level 0 is the source itself, level n is the source reduced by 2**n.
+    Reduced levels are kept in a shared PyramidCache under (key, level) so
+    returning to a recently viewed image does not rebuild them.
+
+    The base image may be a reduced decode of an image of full_size; it
+    then stands in for level base_level, and the levels below it are only
+    available after set_full() (see needs_full()).
+    """
+
+    def __init__(self, base_image, key, cache, full_size=None):
+        self.key = key
+        self.cache = cache
+        self.full_size = full_size or base_image.size
+
+        self.max_level = 0
+        w, h = self.full_size
+        while min(w, h) // 2 >= MIN_LEVEL_SIZE:
+            w, h = w // 2, h // 2
+            self.max_level += 1
+        self._set_base(base_image)
+
+    def _set_base(self, image):
+        self.base = image
+        ratio = self.full_size[0] / max(1, image.width)
+        self.base_level = min(self.max_level, max(0, int(round(math.log2(ratio))))) if ratio > 1 else 0
+
+    @property
+    def size(self):
+        return self.full_size
+
+    @property
+    def reduced(self):
+        return self.base_level > 0
+
+    def _level_for_zoom(self, zoom):
+        level = 0
+        while level < self.max_level and zoom <= 0.5 ** (level + 1):
+            level += 1
+        return level
+
+    def level_for_zoom(self, zoom):
+        """Smallest available level that is still at least as large as the displayed image."""
+        return max(self.base_level, self._level_for_zoom(zoom))
+
+    def needs_full(self, zoom):
+        """True if zoom shows the image larger than the reduced base can."""
+        return self._level_for_zoom(zoom) < self.base_level
+
+    def set_full(self, image):
+        """Replace a reduced base by the full resolution image."""
+        self._set_base(image)
+
+    def get_level(self, level):
+        if level <= self.base_level:
+            return self.base
+        image = self.cache.get((self.key, level))
+        if image is None:
+            image = self.get_level(level - 1).reduce(2)
+            self.cache.put((self.key, level), image)
+        return image
+
+
+class ViewportRenderer:
+    """
+    Draws the image layer of the annotation editor.
+
+    Only the part of the source image that is visible inside the canvas is
+    cropped and resampled, so the cost of a redraw depends on the canvas size
+    rather than on the image size or the zoom level. Annotation overlays live
+    on separate canvas items and are never touched by this class.
+
+    When an ImagePyramid is given, zoomed-out views are resampled from the
+    nearest larger pyramid level instead of the full resolution source. A
+    TiledImage source is read tile by tile from the matching level.
+    Interactive renders use FAST_RESAMPLE and schedule a FINAL_RESAMPLE
+    refinement once no new render has been requested for REFINE_DELAY_MS.
+
+    Resampling and PhotoImage creation are timed as stages of the given
+    Instrumentation.
+    """
+
+    def __init__(self, canvas, instruments=None):
+        self.canvas = canvas
+        self.instruments = instruments or Instrumentation()
+        self.source = None
+        self.image_item = None
+        self.photo_image = None
+        self._last_key = None
+        self._refine_job = None
+
+    def reset(self):
+        """Forget the canvas item (e.g. after canvas.delete("all"))."""
+        self.cancel_refine()
+        self.image_item = None
+        self.photo_image = None
+        self._last_key = None
+
+    def invalidate(self):
+        """Redraw on the next render even if the visible region did not change."""
+        self._last_key = None
+
+    def set_image(self, source):
+        """Use a new source (PIL image, ImagePyramid or TiledImage) for the image layer."""
+        self.cancel_refine()
+        self.source = source
+        self._last_key = None
+        if self.image_item is None:
+            self.image_item = self.canvas.create_image(0, 0, anchor=tk.NW, tags=("image",))
+
+    def canvas_size(self):
+        """Return the current canvas size, falling back to the requested size before mapping."""
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            width = self.canvas.winfo_reqwidth()
+            height = self.canvas.winfo_reqheight()
+        return max(1, width), max(1, height)
+
+    def visible_region(self, zoom, pan_x, pan_y):
+        """
+        Compute the visible part of the image for the given zoom and pan.
+
+        Returns (source_box, dest_origin, dest_size) or None if the image is
+        completely outside the canvas. source_box is in source pixels and is
+        snapped outwards to whole pixels; dest_origin/dest_size describe where
+        that box lands on the canvas.
+        """
+        if self.source is None or zoom <= 0:
+            return None
+
+        img_w, img_h = self.source.size
+        canvas_w, canvas_h = self.canvas_size()
+
+        # Visible rectangle in display (zoomed) coordinates
+        left = max(0.0, -pan_x)
+        top = max(0.0, -pan_y)
+        right = min(img_w * zoom, canvas_w - pan_x)
+        bottom = min(img_h * zoom, canvas_h - pan_y)
+        if right <= left or bottom <= top:
+            return None
+
+        sx1 = max(0, int(math.floor(left / zoom)))
+        sy1 = max(0, int(math.floor(top / zoom)))
+        sx2 = min(img_w, int(math.ceil(right / zoom)))
+        sy2 = min(img_h, int(math.ceil(bottom / zoom)))
+        if sx2 <= sx1 or sy2 <= sy1:
+            return None
+
+        dest_x = int(round(pan_x + sx1 * zoom))
+        dest_y = int(round(pan_y + sy1 * zoom))
+        dest_w = max(1, int(round((sx2 - sx1) * zoom)))
+        dest_h = max(1, int(round((sy2 - sy1) * zoom)))
+        return (sx1, sy1, sx2, sy2), (dest_x, dest_y), (dest_w, dest_h)
+
+    def cancel_refine(self):
+        if self._refine_job is not None:
+            self.canvas.after_cancel(self._refine_job)
+            self._refine_job = None
+
+    def render(self, zoom, pan_x, pan_y, interactive=False):
+        """
+        Redraw the image layer if the visible region changed.
+
+        With interactive=True the fast resampler is used and a high quality
+        refinement is scheduled for when the interaction goes idle.
+        """
+        if self.image_item is None:
+            return
+
+        self.cancel_refine()
+        resample = FAST_RESAMPLE if interactive else FINAL_RESAMPLE
+        region = self.visible_region(zoom, pan_x, pan_y)
+        key = (region, resample)
+        if key == self._last_key or (region is not None and self._last_key == (region, FINAL_RESAMPLE)):
+            return
+        self._last_key = key
+
+        if region is None:
+            self.canvas.itemconfig(self.image_item, state=tk.HIDDEN)
+            return
+
+        box, (dest_x, dest_y), (dest_w, dest_h) = region
+        with self.instruments.stage('render.resample'):
+            visible = self._resample(zoom, box, (dest_w, dest_h), resample)
+
+        with self.instruments.stage('render.photoimage'):
+            self.photo_image = ImageTk.PhotoImage(visible)
+        self.canvas.itemconfig(self.image_item, image=self.photo_image, state=tk.NORMAL)
+        self.canvas.coords(self.image_item, dest_x, dest_y)
+        self.canvas.tag_lower(self.image_item)
+
+        if interactive:
+            self._refine_job = self.canvas.after(REFINE_DELAY_MS, self._refine, zoom, pan_x, pan_y)
+
+    def _refine(self, zoom, pan_x, pan_y):
+        self._refine_job = None
+        self.render(zoom, pan_x, pan_y)
+
+    def _resample(self, zoom, box, dest_size, resample):
+        """Resample a source box (full resolution pixels) to dest_size."""
+        if isinstance(self.source, TiledImage):
+            image, box = self.source.crop(self.source.level_for_zoom(zoom), box)
+            return image.resize(dest_size, resample, box=box)
+        if isinstance(self.source, ImagePyramid):
+            level = self.source.level_for_zoom(zoom)
+            image = self.source.get_level(level)
+            if image.size != self.source.size:
+                base_w, base_h = self.source.size
+                fx = image.width / base_w
+                fy = image.height / base_h
+                box = (box[0] * fx, box[1] * fy, box[2] * fx, box[3] * fy)
+                return image.resize(dest_size, resample, box=box)
+        else:
+            image = self.source
+
+        if dest_size == (box[2] - box[0], box[3] - box[1]):
+            return image.crop(box)
+        return image.resize(dest_size, resample, box=box)
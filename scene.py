@@ -0,0 +1,109 @@
+import tkinter as tk
+
+# Label tag drawn above each box (screen pixels)
+LABEL_HEIGHT = 20
+LABEL_CHAR_WIDTH = 8
+
+
+class AnnotationScene:
+    """
+    Retained-mode annotation layer on a Tk canvas.
+
+    Every annotation owns a stable (rectangle, label background, text) item
+    triple that is created once and then only updated: sync() compares each
+    annotation with what was drawn last and issues coords/itemconfig calls for
+    the items that actually changed. A pure pan moves the whole layer with a
+    single canvas.move(). Entries are (box, color, label, outline_width) with
+    the box in image pixels.
+    """
+
+    def __init__(self, canvas, tag="annotation"):
+        self.canvas = canvas
+        self.tag = tag
+        self.items = []  # per annotation: (rect_id, bg_id, text_id)
+        self.drawn = []  # per annotation: entry the items currently show
+        self.transform = None  # (zoom, pan_x, pan_y) the items were drawn with
+
+    def reset(self):
+        """Forget all items, e.g. after the canvas was cleared with delete('all')."""
+        self.items = []
+        self.drawn = []
+        self.transform = None
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.reset()
+
+    def _coords(self, box, label):
+        zoom, pan_x, pan_y = self.transform
+        x1 = box[0] * zoom + pan_x
+        y1 = box[1] * zoom + pan_y
+        x2 = box[2] * zoom + pan_x
+        y2 = box[3] * zoom + pan_y
+        return ((x1, y1, x2, y2),
+                (x1, y1 - LABEL_HEIGHT, x1 + len(label) * LABEL_CHAR_WIDTH, y1),
+                (x1 + 5, y1 - LABEL_HEIGHT / 2))
+
+    def _create(self, entry):
+        box, color, label, outline_width = entry
+        rect, bg, text = self._coords(box, label)
+        self.items.append((
+            self.canvas.create_rectangle(*rect, outline=color, width=outline_width, tags=self.tag),
+            self.canvas.create_rectangle(*bg, fill=color, outline="", tags=self.tag),
+            self.canvas.create_text(*text, text=label, fill="white", anchor=tk.W, tags=self.tag),
+        ))
+        self.drawn.append(entry)
+
+    def _update(self, index, entry, coords_stale=False):
+        old_box, old_color, old_label, old_width = self.drawn[index]
+        box, color, label, outline_width = entry
+        rect_id, bg_id, text_id = self.items[index]
+        if coords_stale or box != old_box or len(label) != len(old_label):
+            rect, bg, text = self._coords(box, label)
+            self.canvas.coords(rect_id, *rect)
+            self.canvas.coords(bg_id, *bg)
+            self.canvas.coords(text_id, *text)
+        if color != old_color or outline_width != old_width:
+            self.canvas.itemconfig(rect_id, outline=color, width=outline_width)
+        if color != old_color:
+            self.canvas.itemconfig(bg_id, fill=color)
+        if label != old_label:
+            self.canvas.itemconfig(text_id, text=label)
+        self.drawn[index] = entry
+
+    def sync(self, entries, zoom, pan_x, pan_y):
+        """Bring the canvas in line with entries (one per annotation, in order)."""
+        transform = (zoom, pan_x, pan_y)
+        coords_stale = False
+        if self.transform is not None and transform != self.transform:
+            if zoom == self.transform[0]:
+                self.canvas.move(self.tag, pan_x - self.transform[1], pan_y - self.transform[2])
+            else:
+                coords_stale = True
+        self.transform = transform
+
+        for item_ids in self.items[len(entries):]:
+            for item_id in item_ids:
+                self.canvas.delete(item_id)
+        del self.items[len(entries):]
+        del self.drawn[len(entries):]
+
+        for i, entry in enumerate(entries):
+            if i < len(self.items):
+                self._update(i, entry, coords_stale)
+            else:
+                self._create(entry)
+
+    def update(self, index, entry):
+        """Redraw a single annotation (e.g. the one being dragged)."""
+        if self.transform is None or index >= len(self.items):
+            return
+        self._update(index, entry)
+
+    def remove(self, index):
+        """Delete one annotation's items; later annotations shift down by one."""
+        if index >= len(self.items):
+            return
+        for item_id in self.items.pop(index):
+            self.canvas.delete(item_id)
+        del self.drawn[index]
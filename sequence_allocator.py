@@ -0,0 +1,98 @@
+import os
+
+
+def discard_placeholder(path):
+    """
+    Remove the empty file allocate() reserved for path if it was never
+    written (e.g. the write failed), so no zero-byte image stays behind.
+    """
+    try:
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+class SequenceAllocator:
+    """
+    Hands out zero-padded, sequential file names (00001.jpg, 00002.jpg, ...) for one folder.
+
+    The folder is scanned at most once, when no sidecar counter file exists
+    yet. After that the next number is read from/written to the small
+    sidecar file, so allocating a name does not depend on the folder size.
+
+    Every name is reserved by creating the file with O_CREAT | O_EXCL, so two
+    processes writing into the same folder can never get the same name: the
+    loser of a race simply moves on to the next number. The reserved file is
+    empty until the caller writes the real content into it; callers whose
+    write fails should call discard_placeholder(). A crash between the two
+    can leave zero-byte files, which are safe to delete.
+    """
+
+    def __init__(self, folder_path, num_digits, extension=".jpg"):
+        self.folder_path = folder_path
+        self.num_digits = num_digits
+        self.extension = extension
+        self.pattern = f"{{:0{num_digits}d}}{extension}"
+        self.counter_path = os.path.join(folder_path, f".next_{num_digits}{extension.replace('.', '_')}")
+        os.makedirs(folder_path, exist_ok=True)
+        stored = self._read_counter()
+        self.next_number = stored if stored is not None else self._scan_next_number()
+
+    def _scan_next_number(self):
+        """One-time fallback: highest existing number + 1."""
+        n = self.num_digits
+        highest = 0
+        for f in os.listdir(self.folder_path):
+            if f.endswith(self.extension) and len(f) == n + len(self.extension) and f[:n].isdigit():
+                highest = max(highest, int(f[:n]))
+        return highest + 1
+
+    def _read_counter(self):
+        try:
+            with open(self.counter_path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _write_counter(self):
+        tmp_path = f"{self.counter_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(str(self.next_number))
+            os.replace(tmp_path, self.counter_path)
+        except OSError:
+            # The counter is only a hint; O_EXCL reservation keeps names unique without it
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def allocate(self):
+        """Reserve and return the next free file name (name only, not the full path)."""
+        # Another process may have advanced the shared counter since our last allocation
+        stored = self._read_counter()
+        if stored is not None and stored > self.next_number:
+            self.next_number = stored
+
+        while True:
+            name = self.pattern.format(self.next_number)
+            try:
+                fd = os.open(os.path.join(self.folder_path, name), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self.next_number += 1
+                continue
+            os.close(fd)
+            self.next_number += 1
+            self._write_counter()
+            return name
+
+    def release(self, name):
+        """Give back the most recently allocated name (e.g. after an undo) so it is reused."""
+        try:
+            number = int(name[:self.num_digits])
+        except ValueError:
+            return
+        if number == self.next_number - 1 and self._read_counter() in (None, self.next_number):
+            self.next_number = number
+            self._write_counter()
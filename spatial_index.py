@@ -0,0 +1,109 @@
+import math
+
+
+class GridIndex:
+    """
+    Uniform grid over axis-aligned boxes in image pixel space.
+
+    Each box is registered in every cell it overlaps, so a point query only
+    looks at the few boxes of one cell. Boxes covering more than
+    MAX_CELLS_PER_BOX cells (e.g. a box over the whole image) are kept in a
+    small separate list instead of being copied into hundreds of cells.
+
+    Keys are annotation indices. delete_index() removes one index and shifts
+    the keys above it down by one, mirroring `del annotations[i]`.
+    """
+
+    MAX_CELLS_PER_BOX = 256
+
+    def __init__(self, width, height, cell_size=None):
+        if cell_size is None:
+            # About 64 cells along the longer side, but not smaller than 16 px
+            cell_size = max(16, int(math.ceil(max(width, height) / 64.0)))
+        self.cell_size = cell_size
+        self.cells = {}   # (cx, cy) -> set of keys
+        self.boxes = {}   # key -> (x1, y1, x2, y2)
+        self.large = set()
+
+    def _cell_range(self, x1, y1, x2, y2):
+        cs = self.cell_size
+        return int(x1 // cs), int(y1 // cs), int(x2 // cs), int(y2 // cs)
+
+    def insert(self, key, x1, y1, x2, y2):
+        if key in self.boxes:
+            self.remove(key)
+        self.boxes[key] = (x1, y1, x2, y2)
+        cx1, cy1, cx2, cy2 = self._cell_range(x1, y1, x2, y2)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > self.MAX_CELLS_PER_BOX:
+            self.large.add(key)
+            return
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self.cells.setdefault((cx, cy), set()).add(key)
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        if key in self.large:
+            self.large.discard(key)
+            return
+        cx1, cy1, cx2, cy2 = self._cell_range(*box)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+    def update(self, key, x1, y1, x2, y2):
+        """Move a box; cheap when it stays within the same cells."""
+        old = self.boxes.get(key)
+        if old is not None and key not in self.large and \
+                self._cell_range(*old) == self._cell_range(x1, y1, x2, y2):
+            self.boxes[key] = (x1, y1, x2, y2)
+            return
+        self.insert(key, x1, y1, x2, y2)
+
+    def delete_index(self, index):
+        """Remove key `index` and renumber all larger keys down by one."""
+        self.remove(index)
+        shifted = {}
+        for key, box in self.boxes.items():
+            shifted[key - 1 if key > index else key] = box
+        self.boxes = shifted
+        self.large = {k - 1 if k > index else k for k in self.large}
+        for pos, cell in self.cells.items():
+            if any(k > index for k in cell):
+                self.cells[pos] = {k - 1 if k > index else k for k in cell}
+
+    def clear(self):
+        self.cells.clear()
+        self.boxes.clear()
+        self.large.clear()
+
+    def query_point(self, x, y):
+        """Keys of all boxes containing (x, y)."""
+        cs = self.cell_size
+        candidates = self.cells.get((int(x // cs), int(y // cs)), ())
+        hits = []
+        for key in list(candidates) + list(self.large):
+            x1, y1, x2, y2 = self.boxes[key]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                hits.append(key)
+        return hits
+
+    def smallest_at(self, x, y):
+        """
+        Key of the smallest box containing (x, y), or None.
+        Equal areas are resolved in favour of the topmost (highest key) box.
+        """
+        best = None
+        best_area = None
+        for key in self.query_point(x, y):
+            x1, y1, x2, y2 = self.boxes[key]
+            area = (x2 - x1) * (y2 - y1)
+            if best is None or area < best_area or (area == best_area and key > best):
+                best, best_area = key, area
+        return best
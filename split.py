@@ -1,10 +1,11 @@
 import os
-import shutil
+import json
 import random
 import math
-
-# Add this line to see the current directory (debugging purposes, can remove later)
-print("Current working directory:", os.getcwd())
+from dataset_index import DatasetIndex
+from file_ops import parallel_transfer, TransferManifest
+from stratify import stratified_split, format_split_report
+from label_cache import open_label_cache
 
 # Define source directories
 # 'ekran_goruntusu' klasörünün altında doğrudan 'images' ve 'labels' olduğunu varsayarak yolları güncelledik.
@@ -20,6 +21,32 @@ train_ratio = 0.7
 val_ratio = 0.3
 test_ratio = 0
 
+# Stratified split: keep every class's share of images close to the split ratios
+# (so rare classes are not missing from val/test). False = plain random shuffle.
+stratify = True
+
+# Seed for the shuffle/stratification; set an int for a reproducible split
+random_seed = None
+
+# How files are placed in the destination: 'copy', 'hardlink', 'reflink' or 'symlink'.
+# Link modes take no extra disk space and fall back to copying where unsupported.
+link_mode = 'copy'
+
+# Number of parallel copy/link workers
+num_workers = 8
+
+# Resume an interrupted run: reuse the saved split plan and skip finished files.
+# Both files are removed again once a run completes without errors.
+resume = True
+plan_file_name = '.split_plan.json'
+manifest_file_name = '.split_manifest.jsonl'
+
+# Keep a packed, memory-mapped copy of all labels beside the labels folder
+# (.label_cache/); only changed label files are re-read on the next run.
+use_label_cache = True
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
 # Ensure ratios sum to 1 (or very close due to floating point precision)
 if not (abs(train_ratio + val_ratio + test_ratio - 1.0) < 1e-6):
     print("Warning: Split ratios do not sum to 1. Adjusting test ratio.")
@@ -34,142 +61,272 @@ def create_dirs(base_dir):
     os.makedirs(os.path.join(base_dir, 'labels', 'val'), exist_ok=True)
     os.makedirs(os.path.join(base_dir, 'labels', 'test'), exist_ok=True)
 
-create_dirs(destination_base_dir)
-
-# Get list of image files and extract base names
-try:
-    # List files in the updated source image directory
-    image_files = [f for f in os.listdir(source_images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff'))] # Yaygın görsel formatlarını ekledik
-    base_names = [os.path.splitext(f)[0] for f in image_files]
-except FileNotFoundError:
-    print(f"Error: Source directory not found: {source_images_dir}")
-    print("Please ensure the 'ekran_goruntusu/images' folder exists relative to the script location.")
-    exit() # Scripti durdur
-
-# Optional: Verify that each image has a corresponding label
-missing_labels = [name for name in base_names if not os.path.exists(os.path.join(source_labels_dir, name + '.txt'))]
-if missing_labels:
-    print(f"Warning: The following base names are missing corresponding label (.txt) files: {missing_labels}")
-    # Skipping files without matching labels
-    base_names = [name for name in base_names if name not in missing_labels]
-
-if not base_names:
-    print("No matching image and label files found. Exiting.")
-    exit()
-
-# Shuffle the base names
-random.shuffle(base_names)
-
-# Calculate split sizes using the improved distribution method
-total_files = len(base_names)
-
-# Calculate train count
-train_count = math.floor(total_files * train_ratio)
-
-# Calculate remaining files after train split
-remaining_files = total_files - train_count
-
-# Calculate val and test counts from remaining files
-val_test_ratio_sum = val_ratio + test_ratio
-if val_test_ratio_sum == 0:
-     val_count = 0
-     test_count = remaining_files
-elif remaining_files == 0:
-     val_count = 0
-     test_count = 0
-else:
-    # Calculate val count from remaining files based on its proportion of the remaining
-    val_count = math.floor(remaining_files * (val_ratio / val_test_ratio_sum))
-    test_count = remaining_files - val_count # Test gets the rest
-
-
-# Ensure the counts add up to total_files (should be guaranteed by the calculation logic)
-if train_count + val_count + test_count != total_files:
-     print("Warning: File counts do not sum up, adjusting test count.")
-     test_count = total_files - train_count - val_count
-
-
-print(f"Total files found: {total_files}")
-print(f"Train set size: {train_count}")
-print(f"Validation set size: {val_count}")
-print(f"Test set size: {test_count}")
-
-# Split base names
-train_files = base_names[:train_count]
-val_files = base_names[train_count : train_count + val_count]
-test_files = base_names[train_count + val_count :]
+def list_source_files(index, images_dir=None, labels_dir=None):
+    """
+    Resolves every image's file name once from a single listing of the source
+    images folder, and the set of available label files. The folders default
+    to source_images_dir and source_labels_dir.
+
+    Returns ({base_name: image_file_name}, set_of_label_file_names).
+    """
+    images_dir = images_dir or source_images_dir
+    labels_dir = labels_dir or source_labels_dir
+    image_files = {}
+    for f in index.list_images(images_dir):
+        base, ext = os.path.splitext(f)
+        if base in image_files:
+            # Aynı isimde birden çok uzantı varsa IMAGE_EXTENSIONS sırasındaki ilki seçilir
+            current_ext = os.path.splitext(image_files[base])[1]
+            if IMAGE_EXTENSIONS.index(ext.lower()) >= IMAGE_EXTENSIONS.index(current_ext.lower()):
+                continue
+        image_files[base] = f
+    label_files = set(index.list_files(labels_dir, ['.txt']))
+    return image_files, label_files
+
+def compute_split_counts(total_files, ratios=None):
+    """Returns (train_count, val_count, test_count) for ratios (default: the configured ratios)."""
+    train_share, val_share, test_share = ratios or (train_ratio, val_ratio, test_ratio)
+    # Calculate train count
+    train_count = math.floor(total_files * train_share)
+
+    # Calculate remaining files after train split
+    remaining_files = total_files - train_count
+
+    # Calculate val and test counts from remaining files
+    val_test_ratio_sum = val_share + test_share
+    if val_test_ratio_sum == 0:
+         val_count = 0
+         test_count = remaining_files
+    elif remaining_files == 0:
+         val_count = 0
+         test_count = 0
+    else:
+        # Calculate val count from remaining files based on its proportion of the remaining
+        val_count = math.floor(remaining_files * (val_share / val_test_ratio_sum))
+        test_count = remaining_files - val_count # Test gets the rest
+
+    # Ensure the counts add up to total_files (should be guaranteed by the calculation logic)
+    if train_count + val_count + test_count != total_files:
+         print("Warning: File counts do not sum up, adjusting test count.")
+         test_count = total_files - train_count - val_count
+
+    return train_count, val_count, test_count
 
 # Function to copy files
-def copy_files(file_list, data_type, split_type):
+def copy_files(file_list, data_type, split_type, image_files=None, mode=None, jobs=None, manifest=None, progress=None,
+               images_dir=None, labels_dir=None, dest_base_dir=None):
     """
-    Copies files from source to destination.
+    Copies (or links) files from source to destination in parallel.
 
     Args:
         file_list (list): List of base filenames.
         data_type (str): 'images' or 'labels'.
         split_type (str): 'train', 'val', or 'test'.
+        image_files (dict): {base_name: image_file_name} from list_source_files.
+            Required for images; avoids probing every extension per file.
+        mode (str): One of file_ops.LINK_MODES, defaults to link_mode.
+        jobs (int): Number of workers, defaults to num_workers.
+        manifest (TransferManifest): Optional log used to resume interrupted runs.
+        progress (callable): Optional progress(done, total) called as files finish.
+        images_dir, labels_dir, dest_base_dir (str): Default to source_images_dir,
+            source_labels_dir and destination_base_dir.
     """
-    source_dir = source_images_dir if data_type == 'images' else source_labels_dir
-    dest_dir = os.path.join(destination_base_dir, data_type, split_type)
-    # Belirli bir uzantı yerine, base_name'e uygun uzantıyı bulmaya çalışalım (sadece görüntüler için geçerli)
-    # Etiketler için uzantı her zaman '.txt'
-    extension = '.txt' if data_type == 'labels' else None # Görseller için uzantıyı henüz bilmiyoruz
+    if data_type == 'images':
+        source_dir = images_dir or source_images_dir
+    else:
+        source_dir = labels_dir or source_labels_dir
+    dest_dir = os.path.join(dest_base_dir or destination_base_dir, data_type, split_type)
 
     # Ensure destination directory exists
     os.makedirs(dest_dir, exist_ok=True)
 
+    pairs = []
     for base_name in file_list:
         if data_type == 'images':
-            # Find the correct image extension by checking files in the source images directory
-            found_extension = None
-            for img_ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']: # Kontrol edilecek yaygın uzantılar
-                 potential_source_path = os.path.join(source_dir, base_name + img_ext)
-                 if os.path.exists(potential_source_path):
-                     source_path = potential_source_path
-                     extension = img_ext
-                     found_extension = True
-                     break
-            if not found_extension:
+            file_name = image_files.get(base_name) if image_files else None
+            if file_name is None:
                  print(f"Error: Image file not found with common extensions for base name: {base_name}")
                  continue # Bu dosyayı atla
         else: # data_type == 'labels'
-             source_path = os.path.join(source_dir, base_name + '.txt')
-             extension = '.txt'
-
-
-        destination_path = os.path.join(dest_dir, base_name + extension)
-        try:
-            shutil.copy2(source_path, destination_path)
-        except FileNotFoundError:
+             file_name = base_name + '.txt'
+        pairs.append((os.path.join(source_dir, file_name), os.path.join(dest_dir, file_name)))
+
+    total = len(pairs)
+    result = parallel_transfer(pairs, mode or link_mode, jobs or num_workers, manifest,
+                               (lambda done: progress(done, total)) if progress else None)
+    for source_path, error in result['failed']:
+        if isinstance(error, FileNotFoundError):
             print(f"Error: Source file not found - {source_path}")
-        except Exception as e:
-            print(f"Error copying file {source_path} to {destination_path}: {e}")
-
-
-# Copy files to their respective directories
-print("Copying train files...")
-copy_files(train_files, 'images', 'train')
-copy_files(train_files, 'labels', 'train')
-
-print("Copying validation files...")
-copy_files(val_files, 'images', 'val')
-copy_files(val_files, 'labels', 'val')
-
-print("Copying test files...")
-copy_files(test_files, 'images', 'test')
-copy_files(test_files, 'labels', 'test')
-
-print("\nFile splitting and copying complete!")
-print(f"Dataset created in: {destination_base_dir}")
-
-# Print final counts in destination folders (Optional verification)
-print("\nVerifying counts in destination folders:")
-try:
-    print(f"Train Images: {len(os.listdir(os.path.join(destination_base_dir, 'images', 'train')))}")
-    print(f"Val Images: {len(os.listdir(os.path.join(destination_base_dir, 'images', 'val')))}")
-    print(f"Test Images: {len(os.listdir(os.path.join(destination_base_dir, 'images', 'test')))}")
-    print(f"Train Labels: {len(os.listdir(os.path.join(destination_base_dir, 'labels', 'train')))}")
-    print(f"Val Labels: {len(os.listdir(os.path.join(destination_base_dir, 'labels', 'val')))}")
-    print(f"Test Labels: {len(os.listdir(os.path.join(destination_base_dir, 'labels', 'test')))}")
-except FileNotFoundError:
-    print("Error: Destination directories not found during verification.")
\ No newline at end of file
+        else:
+            print(f"Error copying file {source_path} to {dest_dir}: {error}")
+    if result['skipped']:
+        print(f"  {data_type}/{split_type}: {result['skipped']} files already done in a previous run, skipped.")
+    return result
+
+def load_or_create_plan(base_names, label_cache, dest_base_dir, labels_dir, ratios, stratified, seed, resume_run):
+    """
+    Returns {'train': [...], 'val': [...], 'test': [...]}. A plan saved in
+    dest_base_dir by an interrupted run is reused when resume_run is set, so
+    files keep their split. With a LabelCache the stratification reads the
+    labels from the cache.
+    """
+    plan_path = os.path.join(dest_base_dir, plan_file_name)
+    if resume_run and os.path.exists(plan_path):
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        available = set(base_names)
+        plan = {split: [name for name in names if name in available] for split, names in plan.items()}
+        print(f"Resuming with the split plan saved in {plan_path}")
+        return plan
+
+    if stratified:
+        label_paths = [os.path.join(labels_dir, name + '.txt') for name in base_names]
+        assignment, class_names, per_fold_counts = stratified_split(
+            label_paths, list(ratios), seed=seed, label_cache=label_cache)
+        plan = {'train': [], 'val': [], 'test': []}
+        fold_names = ['train', 'val', 'test']
+        for name, fold in zip(base_names, assignment):
+            plan[fold_names[fold]].append(name)
+        print("Images per class and split:")
+        print(format_split_report(class_names, per_fold_counts, fold_names))
+    else:
+        # Shuffle the base names
+        random.Random(seed).shuffle(base_names)
+
+        # Calculate split sizes using the improved distribution method
+        train_count, val_count, test_count = compute_split_counts(len(base_names), ratios)
+
+        # Split base names
+        plan = {
+            'train': base_names[:train_count],
+            'val': base_names[train_count : train_count + val_count],
+            'test': base_names[train_count + val_count :],
+        }
+    with open(plan_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
+    return plan
+
+def main(progress=None, source_dir=None, dest_dir=None, ratios=None, stratified=None, seed=None,
+         mode=None, jobs=None, resume_run=None, cache_labels=None):
+    """
+    Runs the split. progress(stage, done, total) is called while files are
+    transferred, stage being e.g. 'images/train'.
+
+    Every other argument overrides one of the settings above for this call
+    only: source_dir (with images/ and labels/ inside) source_base_dir,
+    dest_dir destination_base_dir, ratios (train, val, test) the three
+    ratios, stratified stratify, seed random_seed, mode link_mode, jobs
+    num_workers, resume_run resume and cache_labels use_label_cache.
+
+    Returns True if every file was transferred, False if some failed (the
+    plan is kept for a resume). Raises ValueError if there is nothing to
+    split; the destination is not touched then.
+    """
+    if source_dir is None:
+        source_dir, images_dir, labels_dir = source_base_dir, source_images_dir, source_labels_dir
+    else:
+        images_dir, labels_dir = os.path.join(source_dir, 'images'), os.path.join(source_dir, 'labels')
+    dest_dir = dest_dir or destination_base_dir
+    ratios = tuple(ratios) if ratios is not None else (train_ratio, val_ratio, test_ratio)
+    stratified = stratify if stratified is None else stratified
+    seed = random_seed if seed is None else seed
+    mode = mode or link_mode
+    jobs = jobs or num_workers
+    resume_run = resume if resume_run is None else resume_run
+    cache_labels = use_label_cache if cache_labels is None else cache_labels
+
+    # Add this line to see the current directory (debugging purposes, can remove later)
+    print("Current working directory:", os.getcwd())
+
+    # Get list of image files and extract base names
+    if not os.path.isdir(images_dir):
+        raise ValueError(f"Source directory not found: {images_dir}")
+
+    # Dosya listeleri kalıcı indeksten gelir; sadece değişen klasörler yeniden taranır
+    dataset_index = DatasetIndex(source_dir)
+    image_files, label_files = list_source_files(dataset_index, images_dir, labels_dir)
+    dataset_index.close()
+    base_names = sorted(image_files)
+
+    # Label names (and later the classes for stratification) come from the packed cache
+    label_cache = open_label_cache(labels_dir, jobs) if cache_labels else None
+    if label_cache is not None:
+        label_files = label_cache.label_names()
+
+    # Optional: Verify that each image has a corresponding label
+    missing_labels = [name for name in base_names if name + '.txt' not in label_files]
+    if missing_labels:
+        print(f"Warning: The following base names are missing corresponding label (.txt) files: {missing_labels}")
+        # Skipping files without matching labels
+        missing_set = set(missing_labels)
+        base_names = [name for name in base_names if name not in missing_set]
+
+    if not base_names:
+        raise ValueError(f"No matching image and label files found in {source_dir}")
+
+    create_dirs(dest_dir)
+    plan = load_or_create_plan(base_names, label_cache, dest_dir, labels_dir, ratios, stratified, seed, resume_run)
+
+    print(f"Total files found: {len(base_names)}")
+    print(f"Train set size: {len(plan['train'])}")
+    print(f"Validation set size: {len(plan['val'])}")
+    print(f"Test set size: {len(plan['test'])}")
+    print(f"Transfer mode: {mode}, workers: {jobs}")
+
+    manifest_path = os.path.join(dest_dir, manifest_file_name)
+    if not resume_run and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    manifest = TransferManifest(manifest_path)
+
+    def transfer(split_type, data_type):
+        return copy_files(plan[split_type], data_type, split_type, image_files if data_type == 'images' else None,
+                          mode=mode, jobs=jobs, manifest=manifest,
+                          progress=(lambda done, total: progress(f"{data_type}/{split_type}", done, total))
+                          if progress else None,
+                          images_dir=images_dir, labels_dir=labels_dir, dest_base_dir=dest_dir)
+
+    # Copy files to their respective directories
+    results = []
+    try:
+        print("Copying train files...")
+        results.append(transfer('train', 'images'))
+        results.append(transfer('train', 'labels'))
+
+        print("Copying validation files...")
+        results.append(transfer('val', 'images'))
+        results.append(transfer('val', 'labels'))
+
+        print("Copying test files...")
+        results.append(transfer('test', 'images'))
+        results.append(transfer('test', 'labels'))
+    finally:
+        manifest.close()
+
+    # A complete run needs no resume state; the next run starts a fresh split
+    complete = not any(result['failed'] for result in results)
+    if complete:
+        os.remove(manifest_path)
+        os.remove(os.path.join(dest_dir, plan_file_name))
+
+    print("\nFile splitting and copying complete!")
+    print(f"Dataset created in: {dest_dir}")
+
+    # Print final counts in destination folders (Optional verification)
+    print("\nVerifying counts in destination folders:")
+    try:
+        print(f"Train Images: {len(os.listdir(os.path.join(dest_dir, 'images', 'train')))}")
+        print(f"Val Images: {len(os.listdir(os.path.join(dest_dir, 'images', 'val')))}")
+        print(f"Test Images: {len(os.listdir(os.path.join(dest_dir, 'images', 'test')))}")
+        print(f"Train Labels: {len(os.listdir(os.path.join(dest_dir, 'labels', 'train')))}")
+        print(f"Val Labels: {len(os.listdir(os.path.join(dest_dir, 'labels', 'val')))}")
+        print(f"Test Labels: {len(os.listdir(os.path.join(dest_dir, 'labels', 'test')))}")
+    except FileNotFoundError:
+        print("Error: Destination directories not found during verification.")
+    return complete
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ValueError as e:
+        print(f"Error: {e}")
+        print("Please ensure the 'ekran_goruntusu/images' and 'labels' folders exist relative to the script location.")
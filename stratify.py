@@ -0,0 +1,157 @@
+import numpy as np
+
+from yolo_labels import read_labels, iter_label_batches, report_errors
+
+
+def read_label_classes(label_path):
+    """Class ids (first column) of every well-formed line of a YOLO label file."""
+    return read_labels(label_path).class_ids.tolist()
+
+
+def build_label_matrix(label_paths, class_index=None, label_cache=None):
+    """
+    Reads the label files in batches and builds a sparse (CSR) image x class
+    presence matrix.
+
+    Memory grows with the number of distinct (image, class) pairs, not with
+    images x classes, so a million label files stay cheap. With a
+    label_cache.LabelCache the label files are not opened at all.
+
+    Returns (class_names, indptr, indices): the classes present in image i are
+    indices[indptr[i]:indptr[i + 1]], as positions into class_names.
+    """
+    class_index = dict(class_index or {})
+    indptr = np.zeros(len(label_paths) + 1, dtype=np.int64)
+    chunks = []
+    first = 0
+    batches = label_cache.iter_batches(label_paths) if label_cache else iter_label_batches(label_paths)
+    for batch in batches:
+        report_errors(batch.errors)
+        names, local_codes = np.unique(batch.class_ids, return_inverse=True)
+        for name in names.tolist():
+            class_index.setdefault(name, len(class_index))
+        codes = np.array([class_index[name] for name in names.tolist()], dtype=np.int64)[local_codes.reshape(-1)]
+
+        # Presence only: every (image, class) pair is kept once
+        num_classes = max(len(class_index), 1)
+        rows = np.repeat(np.arange(len(batch.paths), dtype=np.int64), np.diff(batch.offsets))
+        pairs = np.unique(rows * num_classes + codes)
+        counts = np.bincount(pairs // num_classes, minlength=len(batch.paths))
+
+        indptr[first + 1:first + len(batch.paths) + 1] = indptr[first] + np.cumsum(counts)
+        chunks.append((pairs % num_classes).astype(np.int32))
+        first += len(batch.paths)
+    indices = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+
+    class_names = [None] * len(class_index)
+    for cid, pos in class_index.items():
+        class_names[pos] = cid
+    return class_names, indptr, indices
+
+
+def _allocate(total, weights):
+    """Split an integer total over folds proportionally to weights (largest remainder)."""
+    weights = np.clip(weights, 0, None).astype(np.float64)
+    if weights.sum() <= 0:
+        weights = np.ones_like(weights)
+    exact = total * weights / weights.sum()
+    counts = np.floor(exact).astype(np.int64)
+    remainder = total - counts.sum()
+    if remainder:
+        order = np.argsort(-(exact - counts), kind='stable')
+        counts[order[:remainder]] += 1
+    return counts
+
+
+def iterative_stratification(indptr, indices, num_classes, ratios, seed=None):
+    """
+    Iterative stratification (Sechidis et al., 2011) over a CSR presence matrix.
+
+    Classes are processed rarest first. All still unassigned images that
+    contain the class are shuffled and distributed over the folds in
+    proportion to how many examples of that class each fold still wants;
+    the wanted counts of every class those images contain are then reduced
+    in one vectorized step. Images without labels are distributed last by
+    the folds' remaining total size.
+
+    Returns an int8 array with the fold index of each image.
+    """
+    rng = np.random.default_rng(seed)
+    num_images = len(indptr) - 1
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    num_folds = len(ratios)
+
+    rows = np.repeat(np.arange(num_images), np.diff(indptr))
+    class_counts = np.bincount(indices, minlength=num_classes)
+
+    # Images of each class (CSC view of the matrix)
+    order = np.argsort(indices, kind='stable')
+    images_by_class = rows[order]
+    class_ptr = np.concatenate([[0], np.cumsum(class_counts)])
+
+    desired_per_class = np.outer(class_counts, ratios)  # classes x folds
+    desired_total = num_images * ratios
+    assignment = np.full(num_images, -1, dtype=np.int8)
+    remaining = class_counts.astype(np.int64)
+
+    while True:
+        candidates = np.flatnonzero(remaining > 0)
+        if len(candidates) == 0:
+            break
+        cls = candidates[np.argmin(remaining[candidates])]
+
+        imgs = images_by_class[class_ptr[cls]:class_ptr[cls + 1]]
+        imgs = imgs[assignment[imgs] < 0]
+        imgs = rng.permutation(imgs)
+
+        weights = desired_per_class[cls]
+        if weights.max() <= 0:
+            weights = desired_total
+        counts = _allocate(len(imgs), weights)
+        folds = np.repeat(np.arange(num_folds, dtype=np.int8), counts)
+        assignment[imgs] = folds
+
+        # Every class in the newly assigned images is now less wanted in that fold
+        starts = indptr[imgs]
+        lengths = indptr[imgs + 1] - starts
+        member = np.repeat(np.arange(len(imgs)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        member_classes = indices[positions]
+        member_folds = folds[member]
+        np.subtract.at(desired_per_class, (member_classes, member_folds), 1)
+        np.subtract.at(remaining, member_classes, 1)
+        desired_total -= np.bincount(folds, minlength=num_folds)
+
+    unlabeled = rng.permutation(np.flatnonzero(assignment < 0))
+    if len(unlabeled):
+        counts = _allocate(len(unlabeled), desired_total)
+        assignment[unlabeled] = np.repeat(np.arange(num_folds, dtype=np.int8), counts)
+
+    return assignment
+
+
+def stratified_split(label_paths, ratios, seed=None, class_index=None, label_cache=None):
+    """
+    Assigns every label file to a fold so each class keeps the given ratios.
+
+    Returns (assignment, class_names, per_fold_counts) where per_fold_counts
+    is a classes x folds array of how many images of each class ended up in
+    each fold.
+    """
+    class_names, indptr, indices = build_label_matrix(label_paths, class_index, label_cache)
+    assignment = iterative_stratification(indptr, indices, len(class_names), ratios, seed)
+
+    rows = np.repeat(np.arange(len(label_paths)), np.diff(indptr))
+    per_fold_counts = np.zeros((len(class_names), len(ratios)), dtype=np.int64)
+    np.add.at(per_fold_counts, (indices, assignment[rows]), 1)
+    return assignment, class_names, per_fold_counts
+
+
+def format_split_report(class_names, per_fold_counts, fold_names):
+    """Human-readable per-class table of a split."""
+    lines = ["class".ljust(20) + "".join(name.rjust(10) for name in fold_names)]
+    for name, counts in sorted(zip(class_names, per_fold_counts), key=lambda x: str(x[0])):
+        lines.append(str(name).ljust(20) + "".join(str(int(c)).rjust(10) for c in counts))
+    return "\n".join(lines)
@@ -0,0 +1,372 @@
+import io
+import os
+import math
+import queue
+import hashlib
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, ImageOps, ImageTk
+
+from file_ops import atomic_write
+from yolo_labels import read_labels
+
+THUMB_CACHE_DIRNAME = '.thumb_cache'
+
+# Longest side of a thumbnail in pixels
+THUMB_SIZE = 128
+
+# Part of the cache key; bump when make_thumbnail changes so old entries are not reused
+THUMB_VERSION = 2
+
+# Thumbnails kept as PhotoImages in memory (a few screens worth)
+MAX_PHOTOS = 600
+
+# How often finished thumbnails are picked up on the Tk thread (ms)
+POLL_MS = 30
+
+
+class ThumbnailCache:
+    """
+    On-disk cache of thumbnails, one JPEG per image keyed by the image's
+    absolute path, size and mtime, so a changed image simply gets a new
+    entry. Files are spread over 256 subfolders. Without a writable cache
+    folder thumbnails are still made, just not kept.
+    """
+
+    def __init__(self, cache_dir, size=THUMB_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.writable = True
+        except OSError:
+            self.writable = False
+
+    def entry_path(self, image_path, st):
+        key = f"{os.path.abspath(image_path)}|{st.st_size}|{st.st_mtime_ns}|{self.size}|{THUMB_VERSION}"
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.jpg')
+
+    def load(self, image_path):
+        """Thumbnail (RGB PIL image) of image_path, from the cache or made and stored now."""
+        st = os.stat(image_path)
+        entry = self.entry_path(image_path, st)
+        try:
+            with Image.open(entry) as cached:
+                cached.load()
+                return cached
+        except (OSError, ValueError):
+            pass
+
+        thumb = make_thumbnail(image_path, self.size)
+        if self.writable:
+            try:
+                os.makedirs(os.path.dirname(entry), exist_ok=True)
+                buffer = io.BytesIO()
+                thumb.save(buffer, format='JPEG', quality=85)
+                atomic_write(entry, buffer.getvalue())
+            except OSError:
+                pass
+        return thumb
+
+
+def make_thumbnail(image_path, size=THUMB_SIZE):
+    """
+    Decode image_path at reduced size (JPEG draft mode where possible) into
+    an RGB thumbnail, turned by its EXIF orientation like the editor shows it.
+    """
+    with Image.open(image_path) as image:
+        # JPEGs are decoded directly at 1/2, 1/4 or 1/8 scale
+        image.draft('RGB', (size, size))
+        if image.getexif().get(0x0112, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        image.thumbnail((size, size), Image.BILINEAR)
+        return image
+
+
+def draw_box_overlay(thumb, labels, color_for):
+    """Copy of thumb with the label boxes drawn on it (normalized YOLO boxes)."""
+    if not len(labels.class_ids):
+        return thumb
+    image = thumb.copy()
+    draw = ImageDraw.Draw(image)
+    w, h = image.size
+    boxes = labels.boxes
+    x1 = (boxes[:, 0] - boxes[:, 2] / 2) * w
+    y1 = (boxes[:, 1] - boxes[:, 3] / 2) * h
+    x2 = (boxes[:, 0] + boxes[:, 2] / 2) * w
+    y2 = (boxes[:, 1] + boxes[:, 3] / 2) * h
+    colors = {}
+    for cid, a, b, c, d in zip(labels.class_ids.tolist(), x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist()):
+        color = colors.get(cid)
+        if color is None:
+            color = colors[cid] = tuple(color_for(cid))
+        draw.rectangle((a, b, c, d), outline=color)
+    return image
+
+
+class ThumbnailLoader:
+    """
+    Makes thumbnails with overlays on a worker pool. request() queues one
+    image; results are collected from the Tk thread with poll(). Requests
+    that scrolled out of view are cancelled with keep_only().
+    """
+
+    def __init__(self, cache, label_path_for, color_for, workers=4):
+        self.cache = cache
+        self.label_path_for = label_path_for
+        self.color_for = color_for
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbs")
+        self.results = queue.Queue()
+        self._pending = {}  # index -> Future
+        self._lock = threading.Lock()
+
+    def _work(self, index, image_path):
+        try:
+            thumb = self.cache.load(image_path)
+            label_path = self.label_path_for(image_path)
+            if label_path:
+                thumb = draw_box_overlay(thumb, read_labels(label_path), self.color_for)
+            self.results.put((index, image_path, thumb))
+        except Exception:
+            self.results.put((index, image_path, None))
+        finally:
+            with self._lock:
+                self._pending.pop(index, None)
+
+    def request(self, index, image_path):
+        with self._lock:
+            if index not in self._pending:
+                self._pending[index] = self.executor.submit(self._work, index, image_path)
+
+    def keep_only(self, wanted):
+        """Cancel queued requests whose index is not in wanted."""
+        with self._lock:
+            for index, future in list(self._pending.items()):
+                if index not in wanted and future.cancel():
+                    del self._pending[index]
+
+    def poll(self):
+        """Finished (index, image_path, thumbnail or None) tuples."""
+        done = []
+        while True:
+            try:
+                done.append(self.results.get_nowait())
+            except queue.Empty:
+                return done
+
+    def shutdown(self):
+        self.keep_only(())
+        self.executor.shutdown(wait=False)
+
+
+class ThumbnailGrid(tk.Frame):
+    """
+    Scrollable grid of thumbnails for an image list.
+
+    Only the cells in view (plus one row above and below) have canvas
+    items; the items are reused as cells scroll in and out, so a folder of
+    100k images costs no more to show than a screenful. Thumbnails are
+    loaded by a ThumbnailLoader and kept as PhotoImages in a small LRU;
+    the photos of cells in view are never evicted. Nothing is loaded or
+    polled unless the grid is shown with set_active(True).
+    on_select(index) is called when a cell is clicked.
+    """
+
+    def __init__(self, parent, on_select, label_path_for, color_for, columns=2, size=THUMB_SIZE, workers=4):
+        super().__init__(parent)
+        self.on_select = on_select
+        self.label_path_for = label_path_for
+        self.color_for = color_for
+        self.columns = columns
+        self.size = size
+        self.workers = workers
+        self.cell_w = size + 8
+        self.cell_h = size + 22
+        self.images = []
+        self.current = -1
+        self.loader = None
+        self.photos = OrderedDict()  # index -> PhotoImage
+        self.cells = {}  # index -> (image item, text item)
+        self.free_cells = []
+        self.active = False
+        self._poll_job = None
+
+        self.canvas = tk.Canvas(self, width=columns * self.cell_w, bg='#303030', highlightthickness=0,
+                                yscrollincrement=self.cell_h // 2)
+        scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._yview)
+        self.canvas.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.highlight = self.canvas.create_rectangle(0, 0, 0, 0, outline='yellow', width=2, state=tk.HIDDEN)
+
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", self._on_wheel)
+        self.canvas.bind("<Button-5>", self._on_wheel)
+
+    # -- content ---------------------------------------------------------------------
+
+    def set_images(self, images, cache_dir):
+        """Show a new image list; thumbnails are cached in cache_dir."""
+        if self.loader is not None:
+            self.loader.shutdown()
+        self.loader = ThumbnailLoader(ThumbnailCache(cache_dir, self.size), self.label_path_for,
+                                      self.color_for, self.workers)
+        self.images = list(images)
+        self.current = -1
+        self.photos.clear()
+        for index in list(self.cells):
+            self._release(index)
+        rows = math.ceil(len(self.images) / self.columns)
+        self.canvas.config(scrollregion=(0, 0, self.columns * self.cell_w, rows * self.cell_h))
+        self.canvas.yview_moveto(0)
+        self.redraw()
+
+    def set_active(self, active):
+        """Start (shown) or stop (hidden) loading thumbnails and polling for them."""
+        self.active = active
+        if active:
+            self.redraw()
+            if self._poll_job is None:
+                self._poll_job = self.after(POLL_MS, self._poll)
+        else:
+            if self._poll_job is not None:
+                self.after_cancel(self._poll_job)
+                self._poll_job = None
+            if self.loader is not None:
+                self.loader.keep_only(set())
+
+    def refresh(self, image_path):
+        """Reload one thumbnail, e.g. after its labels were saved."""
+        try:
+            index = self.images.index(image_path)
+        except ValueError:
+            return
+        self.photos.pop(index, None)
+        if self.active and index in self.cells:
+            self.loader.request(index, image_path)
+
+    def set_current(self, index):
+        """Highlight the cell of the shown image and scroll it into view."""
+        self.current = index
+        if not 0 <= index < len(self.images):
+            self.canvas.itemconfig(self.highlight, state=tk.HIDDEN)
+            return
+        x, y = self._cell_origin(index)
+        self.canvas.coords(self.highlight, x + 1, y + 1, x + self.cell_w - 1, y + self.cell_h - 1)
+        self.canvas.itemconfig(self.highlight, state=tk.NORMAL)
+        self.canvas.tag_raise(self.highlight)
+
+        rows = math.ceil(len(self.images) / self.columns)
+        top, bottom = self.canvas.yview()
+        row = index // self.columns
+        if rows and not (top <= row / rows and (row + 1) / rows <= bottom):
+            visible_rows = max(1, (bottom - top) * rows)
+            self.canvas.yview_moveto(max(0.0, (row - (visible_rows - 1) / 2) / rows))
+        self.redraw()
+
+    # -- virtualization --------------------------------------------------------------
+
+    def _cell_origin(self, index):
+        return (index % self.columns) * self.cell_w, (index // self.columns) * self.cell_h
+
+    def _visible_indices(self):
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), self.cell_h)
+        first_row = max(0, int(top // self.cell_h) - 1)
+        last_row = int((top + height) // self.cell_h) + 1
+        return range(first_row * self.columns, min(len(self.images), (last_row + 1) * self.columns))
+
+    def _release(self, index):
+        image_item, text_item = self.cells.pop(index)
+        self.canvas.itemconfig(image_item, image='', state=tk.HIDDEN)
+        self.canvas.itemconfig(text_item, state=tk.HIDDEN)
+        self.free_cells.append((image_item, text_item))
+
+    def redraw(self):
+        """Bind canvas items to the cells in view and request their thumbnails."""
+        if self.loader is None or not self.active:
+            return
+        visible = self._visible_indices()
+        for index in [i for i in self.cells if i not in visible]:
+            self._release(index)
+        for index in visible:
+            if index in self.cells:
+                continue
+            if self.free_cells:
+                image_item, text_item = self.free_cells.pop()
+            else:
+                image_item = self.canvas.create_image(0, 0, anchor=tk.CENTER)
+                text_item = self.canvas.create_text(0, 0, anchor=tk.N, fill='white', font=("Arial", 8))
+            x, y = self._cell_origin(index)
+            self.canvas.coords(image_item, x + self.cell_w / 2, y + 4 + self.size / 2)
+            self.canvas.coords(text_item, x + self.cell_w / 2, y + self.size + 6)
+            name = os.path.basename(self.images[index])
+            self.canvas.itemconfig(text_item, text=name if len(name) <= 22 else name[:10] + "…" + name[-10:],
+                                   state=tk.NORMAL)
+            photo = self.photos.get(index)
+            if photo is not None:
+                self.photos.move_to_end(index)
+                self.canvas.itemconfig(image_item, image=photo, state=tk.NORMAL)
+            else:
+                self.canvas.itemconfig(image_item, image='', state=tk.NORMAL)
+                self.loader.request(index, self.images[index])
+            self.cells[index] = (image_item, text_item)
+        self.loader.keep_only(set(visible))
+        self.canvas.tag_raise(self.highlight)
+
+    def _trim_photos(self):
+        """Evict least recently used photos beyond MAX_PHOTOS, except those shown in a cell."""
+        excess = len(self.photos) - MAX_PHOTOS
+        if excess <= 0:
+            return
+        for index in [i for i in self.photos if i not in self.cells][:excess]:
+            del self.photos[index]
+
+    def _poll(self):
+        self._poll_job = self.after(POLL_MS, self._poll)
+        if self.loader is None:
+            return
+        for index, image_path, thumb in self.loader.poll():
+            if thumb is None or index >= len(self.images) or self.images[index] != image_path:
+                continue
+            photo = ImageTk.PhotoImage(thumb)
+            self.photos[index] = photo
+            self.photos.move_to_end(index)
+            cell = self.cells.get(index)
+            if cell is not None:
+                self.canvas.itemconfig(cell[0], image=photo)
+            self._trim_photos()
+
+    # -- input -----------------------------------------------------------------------
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, 'units')
+        else:
+            self.canvas.yview_scroll(1, 'units')
+        self.redraw()
+
+    def _on_click(self, event):
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        column = int(x // self.cell_w)
+        if column >= self.columns:
+            return
+        index = int(y // self.cell_h) * self.columns + column
+        if 0 <= index < len(self.images):
+            self.on_select(index)
+
+    def destroy(self):
+        if self.loader is not None:
+            self.loader.shutdown()
+        super().destroy()
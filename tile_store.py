@@ -0,0 +1,239 @@
+import os
+import json
+import math
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+TILE_CACHE_DIRNAME = '.tile_cache'
+
+# Side of a square tile in pixels
+TILE_SIZE = 512
+
+# Images with at least this many pixels are shown from a tile store instead of being decoded whole
+TILED_MIN_PIXELS = 64 * 1024 * 1024
+
+META_FILE = 'meta.json'
+
+# Image.MAX_IMAGE_PIXELS is process wide; it is lifted only while a source header is read
+_pixel_limit_lock = threading.Lock()
+
+
+def open_source(image_path):
+    """Image.open without the decompression bomb limit (orthomosaics are far beyond it)."""
+    with _pixel_limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(image_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+
+def needs_tiles(image_path):
+    """True if image_path is large enough to be shown through a TileStore."""
+    try:
+        with open_source(image_path) as image:
+            width, height = image.size
+    except (OSError, ValueError):
+        return False
+    return width * height >= TILED_MIN_PIXELS
+
+
+def level_sizes(width, height, tile_size=TILE_SIZE):
+    """Sizes of the power-of-two levels, down to the first one that fits in one tile."""
+    sizes = [(width, height)]
+    while max(width, height) > tile_size:
+        width, height = (width + 1) // 2, (height + 1) // 2
+        sizes.append((width, height))
+    return sizes
+
+
+class TileStore:
+    """
+    An image converted once into raw RGB tiles, one memory-mapped .npy file
+    per pyramid level with shape (tile rows, tile cols, T, T, 3), so a tile
+    is one contiguous block on disk. Nothing is read until tile() is used.
+
+    Stores live in .tile_cache/ beside the image, keyed by the image's
+    absolute path, size and mtime.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.tile_size = meta['tile_size']
+        self.levels = [tuple(size) for size in meta['levels']]
+        self._arrays = [np.load(os.path.join(directory, f"level{n}.npy"), mmap_mode='r')
+                        for n in range(len(self.levels))]
+
+    @property
+    def size(self):
+        return self.levels[0]
+
+    def tile(self, level, row, col):
+        """Tile (T x T x 3 uint8, padded at the right/bottom edge) as a read-only array."""
+        return self._arrays[level][row, col]
+
+    @classmethod
+    def open(cls, image_path, cache_dir=None, tile_size=TILE_SIZE):
+        """
+        TileStore of image_path, converting the image first if it has no
+        current store. Converting takes minutes for the largest images; call
+        this off the GUI thread.
+        """
+        directory = store_directory(image_path, cache_dir, tile_size)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            convert(image_path, directory, tile_size)
+        return cls(directory)
+
+    @classmethod
+    def cached(cls, image_path, cache_dir=None, tile_size=TILE_SIZE):
+        """TileStore of image_path if it was already converted, otherwise None."""
+        directory = store_directory(image_path, cache_dir, tile_size)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            return None
+        return cls(directory)
+
+
+def store_directory(image_path, cache_dir=None, tile_size=TILE_SIZE):
+    """Directory of image_path's store, keyed by its absolute path, size and mtime."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(image_path)), TILE_CACHE_DIRNAME)
+    st = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{st.st_size}|{st.st_mtime_ns}|{tile_size}"
+    return os.path.join(cache_dir, hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest())
+
+
+def convert(image_path, directory, tile_size=TILE_SIZE):
+    """
+    Write the tiled levels of image_path into directory. The work happens in
+    a temporary folder that is renamed at the end, so an interrupted or
+    concurrent conversion never leaves a half-written store behind.
+
+    The source is decoded once (PIL cannot decode most formats in parts);
+    level 0 is copied out in bands of one tile row and every further level is
+    reduced band by band from the memory map of the level above it.
+    """
+    tmp_dir = f"{directory}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        with open_source(image_path) as source:
+            # exif_transpose copies the image even without an orientation tag
+            orientation = source.getexif().get(0x0112, 1)
+            image = ImageOps.exif_transpose(source) if orientation != 1 else source
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            sizes = level_sizes(image.width, image.height, tile_size)
+            above = _write_level(tmp_dir, 0, sizes[0], tile_size,
+                                 lambda y0, y1: np.asarray(image.crop((0, y0, image.width, y1))))
+            del image
+
+        for n in range(1, len(sizes)):
+            above = _write_level(tmp_dir, n, sizes[n], tile_size,
+                                 lambda y0, y1, src=above, size=sizes[n - 1]: _reduce_band(src, size, y0, y1))
+
+        meta = {'source': os.path.abspath(image_path), 'tile_size': tile_size, 'levels': sizes}
+        with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        del above
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            if not os.path.exists(os.path.join(directory, META_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _write_level(tmp_dir, level, size, tile_size, read_band):
+    """Fill level{level}.npy from read_band(y0, y1) -> (y1 - y0, width, 3) arrays."""
+    width, height = size
+    rows, cols = math.ceil(height / tile_size), math.ceil(width / tile_size)
+    tiles = np.lib.format.open_memmap(os.path.join(tmp_dir, f"level{level}.npy"), mode='w+',
+                                      dtype=np.uint8, shape=(rows, cols, tile_size, tile_size, 3))
+    band = np.zeros((tile_size, cols * tile_size, 3), dtype=np.uint8)
+    for row in range(rows):
+        y0 = row * tile_size
+        y1 = min(height, y0 + tile_size)
+        band[:] = 0
+        band[:y1 - y0, :width] = read_band(y0, y1)
+        tiles[row] = band.reshape(tile_size, cols, tile_size, 3).transpose(1, 0, 2, 3)
+    tiles.flush()
+    return tiles
+
+
+def _reduce_band(tiles, size, y0, y1):
+    """Rows y0:y1 of the next level, reduced 2x from rows 2*y0:2*y1 of a level's tiles."""
+    width, height = size
+    tile_size = tiles.shape[2]
+    top, bottom = 2 * y0, min(height, 2 * y1)
+    first, last = top // tile_size, (bottom - 1) // tile_size
+    # Stitch the tile rows back into one strip of the level above
+    strip = tiles[first:last + 1].transpose(0, 2, 1, 3, 4).reshape(-1, tiles.shape[1] * tile_size, 3)
+    strip = strip[top - first * tile_size:bottom - first * tile_size, :width]
+    return np.asarray(Image.fromarray(np.ascontiguousarray(strip)).reduce(2))
+
+
+class TiledImage:
+    """
+    Image source for the ViewportRenderer backed by a TileStore. Only the
+    tiles under the visible region are read; they are kept as PIL images in
+    a memory-bounded LRU (a PyramidCache shared by all tiled images), so
+    memory stays constant whatever the image size.
+    """
+
+    def __init__(self, store, cache):
+        self.store = store
+        self.cache = cache
+        self.max_level = len(store.levels) - 1
+
+    @property
+    def size(self):
+        return self.store.size
+
+    @property
+    def reduced(self):
+        return False
+
+    def level_for_zoom(self, zoom):
+        """Smallest level that is still at least as large as the displayed image."""
+        level = 0
+        while level < self.max_level and zoom <= 0.5 ** (level + 1):
+            level += 1
+        return level
+
+    def needs_full(self, zoom):
+        return False
+
+    def _tile(self, level, row, col):
+        key = (self.store.directory, level, row, col)
+        image = self.cache.get(key)
+        if image is None:
+            image = Image.fromarray(np.array(self.store.tile(level, row, col)))
+            self.cache.put(key, image)
+        return image
+
+    def crop(self, level, box):
+        """
+        The part of level covering box (full resolution pixels), assembled
+        from tiles. Returns (image, box) with box in that image's pixels.
+        """
+        full_w, full_h = self.size
+        level_w, level_h = self.store.levels[level]
+        fx, fy = level_w / full_w, level_h / full_h
+        lbox = (box[0] * fx, box[1] * fy, box[2] * fx, box[3] * fy)
+        x1, y1 = int(math.floor(lbox[0])), int(math.floor(lbox[1]))
+        x2 = min(level_w, max(x1 + 1, int(math.ceil(lbox[2]))))
+        y2 = min(level_h, max(y1 + 1, int(math.ceil(lbox[3]))))
+
+        t = self.store.tile_size
+        region = Image.new('RGB', (x2 - x1, y2 - y1))
+        for row in range(y1 // t, (y2 - 1) // t + 1):
+            for col in range(x1 // t, (x2 - 1) // t + 1):
+                region.paste(self._tile(level, row, col), (col * t - x1, row * t - y1))
+        return region, (lbox[0] - x1, lbox[1] - y1, lbox[2] - x1, lbox[3] - y1)
@@ -0,0 +1,174 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from file_ops import atomic_write
+
+# Parsed label file: class ids (str array), (n, 4) float64 boxes
+# (x_center, y_center, width, height) and a list of MalformedLine.
+LabelArrays = namedtuple('LabelArrays', ['class_ids', 'boxes', 'errors'])
+
+# Several files parsed together: rows of file i are offsets[i]:offsets[i + 1]
+LabelBatch = namedtuple('LabelBatch', ['paths', 'class_ids', 'boxes', 'offsets', 'errors'])
+
+LINE_FORMAT = "%s %.6f %.6f %.6f %.6f\n"
+
+
+class MalformedLine(namedtuple('MalformedLine', ['path', 'line_no', 'text', 'reason'])):
+    """A label line that was skipped while parsing."""
+
+    def __str__(self):
+        return f"{self.path or '<labels>'}:{self.line_no}: {self.reason}: {self.text.strip()!r}"
+
+
+def _empty(errors=None):
+    return LabelArrays(np.empty(0, dtype=str), np.empty((0, 4), dtype=np.float64), errors or [])
+
+
+def _tokenize(text, path, errors):
+    """Class tokens and the four numeric tokens of every well-formed line."""
+    class_ids = []
+    values = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) < 5:
+            errors.append(MalformedLine(path, line_no, line, f"expected 5 fields, got {len(parts)}"))
+            continue
+        class_ids.append(parts[0])
+        values.extend(parts[1:5])
+    return class_ids, values
+
+
+def _parse_slow(text, path, errors):
+    """Line-by-line float conversion, used only when a file has bad numbers."""
+    class_ids = []
+    rows = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if len(parts) < 5:
+            continue  # Already reported by _tokenize
+        try:
+            rows.append([float(v) for v in parts[1:5]])
+        except ValueError:
+            errors.append(MalformedLine(path, line_no, line, "non-numeric coordinate"))
+            continue
+        class_ids.append(parts[0])
+    return class_ids, rows
+
+
+def parse_labels(text, path=None):
+    """
+    Parse the text of a YOLO label file.
+
+    Lines with fewer than five fields or non-numeric coordinates are
+    skipped and reported in .errors with their line numbers; fields after
+    the fifth are ignored. Values are returned as written (not clamped).
+    """
+    errors = []
+    class_ids, values = _tokenize(text, path, errors)
+    try:
+        boxes = np.array(values, dtype=np.float64).reshape(-1, 4)
+    except ValueError:
+        class_ids, rows = _parse_slow(text, path, errors)
+        boxes = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        errors.sort(key=lambda error: error.line_no)
+    return LabelArrays(np.array(class_ids, dtype=str), boxes, errors)
+
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def read_labels(path):
+    """Parse one label file; a missing file gives empty arrays."""
+    try:
+        text = _read_text(path)
+    except FileNotFoundError:
+        return _empty()
+    return parse_labels(text, path)
+
+
+def _read_tokens(path):
+    errors = []
+    try:
+        text = _read_text(path)
+    except FileNotFoundError:
+        return [], [], errors
+    class_ids, values = _tokenize(text, path, errors)
+    return class_ids, values, errors
+
+
+def read_label_batch(paths, workers=8):
+    """
+    Parse many label files in one pass.
+
+    Files are read on a thread pool (the work is I/O bound) and all numbers
+    of the batch are converted to float64 with a single NumPy call. Missing
+    files count as empty. For very large datasets use iter_label_batches so
+    only one batch of tokens is held in memory.
+    """
+    paths = list(paths)
+    if workers and workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            tokenized = list(pool.map(_read_tokens, paths))
+    else:
+        tokenized = [_read_tokens(path) for path in paths]
+
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(class_ids) for class_ids, _, _ in tokenized], out=offsets[1:])
+    class_ids = [cid for ids, _, _ in tokenized for cid in ids]
+    errors = [error for _, _, errs in tokenized for error in errs]
+    try:
+        boxes = np.array([v for _, values, _ in tokenized for v in values], dtype=np.float64).reshape(-1, 4)
+    except ValueError:
+        # Some file has a bad number; parse file by file to find and skip it
+        parsed = [read_labels(path) for path in paths]
+        np.cumsum([len(p.class_ids) for p in parsed], out=offsets[1:])
+        class_ids = [cid for p in parsed for cid in p.class_ids.tolist()]
+        boxes = np.concatenate([p.boxes for p in parsed]) if parsed else np.empty((0, 4))
+        errors = [error for p in parsed for error in p.errors]
+    return LabelBatch(paths, np.array(class_ids, dtype=str), boxes, offsets, errors)
+
+
+def iter_label_batches(paths, batch_size=10000, workers=8):
+    """Yield a LabelBatch for every batch_size paths."""
+    paths = list(paths)
+    for start in range(0, len(paths), batch_size):
+        yield read_label_batch(paths[start:start + batch_size], workers)
+
+
+def format_labels(class_ids, boxes, clip=True):
+    """Label file text for class ids and (n, 4) boxes, fields clipped to [0, 1] by default."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if clip:
+        boxes = np.clip(boxes, 0.0, 1.0)
+    rows = np.empty((len(boxes), 5), dtype=object)
+    rows[:, 0] = [str(cid) for cid in class_ids]
+    rows[:, 1:] = boxes
+    return (LINE_FORMAT * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def write_labels(path, class_ids, boxes, clip=True, atomic=False):
+    """
+    Write a label file with one buffered write. With atomic=True the text
+    goes to a temporary file that is renamed over path, so readers never
+    see a half written file.
+    """
+    text = format_labels(class_ids, boxes, clip)
+    if atomic:
+        atomic_write(path, text.encode('utf-8'))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def report_errors(errors, limit=20, printer=print):
+    """Print up to limit malformed lines and a count of the rest."""
+    for error in errors[:limit]:
+        printer(f"Warning: skipped malformed label line {error}")
+    if len(errors) > limit:
+        printer(f"Warning: {len(errors) - limit} more malformed label lines skipped")